@@ -115,6 +115,9 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
+# Загруженные файлы (файлы задач импорта)
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -122,4 +125,60 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_REDIRECT_URL = 'pages:home'
 LOGIN_URL = 'login'
-LOGOUT_REDIRECT_URL = 'pages:home'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'pages:home'
+
+# Кэш: сводка флота, версии справочников и данные графиков. Кэш общий
+# для веб-процесса, обработчика очереди импорта и команд управления:
+# версии данных, измененные одним процессом, видны остальным. Для
+# нескольких серверов - общий кэш (Redis и т.п.). С LocMemCache
+# (память одного процесса) данные графиков не кэшируются
+# (см. monitoring.caching)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# Monitoring
+# Число строк, записываемых одной пачкой bulk_create при импорте замеров
+MONITORING_IMPORT_BATCH_SIZE = 1000
+
+# Запуск задач импорта: 'thread' - пул потоков веб-процесса,
+# 'queue' - команда process_import_jobs, 'sync' - прямо в запросе
+MONITORING_IMPORT_MODE = 'thread'
+MONITORING_IMPORT_WORKERS = 2
+
+# Максимальный размер файла импорта и размер части при загрузке частями
+MONITORING_IMPORT_MAX_FILE_SIZE = 2 * 1024 * 1024 * 1024
+MONITORING_UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Срок жизни сводки флота в кэше, с; при записи данных она сбрасывается
+MONITORING_SUMMARY_CACHE_TIMEOUT = 300
+
+# Компактный режим: замеры дополнительно хранят значения массивом
+# float64, графики читают ряды из него без join (monitoring.packed).
+# После включения выполнить pack_measurements для старых замеров
+MONITORING_PACKED_VALUES = False
+
+# Каталог архива старых замеров (команда archive_measurements)
+MONITORING_ARCHIVE_ROOT = BASE_DIR / 'archive'
+
+# Наибольший возраст справочников в памяти процесса (monitoring.registry),
+# с: изменения из других процессов видны не позже, даже без общего кэша
+MONITORING_REGISTRY_TTL = 30
+
+# Срок жизни данных графика в кэше, с; устаревшие данные не отдаются
+# и раньше - запись замеров двигателя меняет версию его данных
+MONITORING_CHART_CACHE_TIMEOUT = 600
+
+# Наибольшее число строк выгрузки в Excel: книга собирается целиком
+# до отправки ответа, большие выгрузки - в CSV (потоком)
+MONITORING_XLSX_EXPORT_MAX_ROWS = 100_000
+
+# Проверка новых значений на нарушения пределов и аномалии при записи
+# (monitoring.alarms); историю проверяет команда detect_alarms
+MONITORING_ALARMS = True
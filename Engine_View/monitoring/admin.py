@@ -1,5 +1,15 @@
 from django.contrib import admin
-from .models import Vessel, Engine, Measurement, ParameterType, ParameterValue
+from .models import (
+    Alarm,
+    ImportJob,
+    IngestToken,
+    Vessel,
+    Engine,
+    Measurement,
+    ParameterType,
+    ParameterValue,
+    RetentionPolicy,
+)
 
 
 class ParameterValueInline(admin.TabularInline):
@@ -94,3 +104,58 @@ class ParameterValueAdmin(admin.ModelAdmin):
 
     def has_change_permission(self, request, obj=None):
         return False  # Запрещаем изменение через админку
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = [
+        'original_name', 'engine', 'status', 'rows_count', 'imported_count',
+        'error_count', 'created_by', 'created_at', 'finished_at'
+    ]
+    list_filter = ['status', 'engine__vessel']
+    search_fields = ['original_name', 'engine__name']
+    list_select_related = ['engine', 'engine__vessel', 'created_by']
+    readonly_fields = [
+        'status', 'total_bytes', 'processed_bytes', 'rows_count',
+        'imported_count', 'values_count', 'error_count', 'errors',
+        'created_parameters', 'elapsed', 'message', 'started_at',
+        'finished_at',
+    ]
+    list_per_page = 50
+
+
+@admin.register(IngestToken)
+class IngestTokenAdmin(admin.ModelAdmin):
+    list_display = ['name', 'user', 'is_active', 'created_at', 'last_used_at']
+    list_filter = ['is_active']
+    search_fields = ['name', 'user__username']
+    list_editable = ['is_active']
+    readonly_fields = ['key_digest', 'created_at', 'last_used_at']
+    list_select_related = ['user']
+
+    def has_add_permission(self, request):
+        return False  # Токены создаются командой create_ingest_token
+
+
+@admin.register(RetentionPolicy)
+class RetentionPolicyAdmin(admin.ModelAdmin):
+    list_display = ['engine', 'parameter_type', 'raw_days', 'is_active',
+                    'created_at']
+    list_filter = ['is_active', 'engine__vessel']
+    list_editable = ['raw_days', 'is_active']
+    list_select_related = ['engine__vessel', 'parameter_type']
+
+
+@admin.register(Alarm)
+class AlarmAdmin(admin.ModelAdmin):
+    list_display = ['timestamp', 'engine', 'parameter_type', 'kind', 'value',
+                    'score']
+    list_filter = ['kind', 'engine__vessel', 'parameter_type']
+    date_hierarchy = 'timestamp'
+    list_select_related = ['engine__vessel', 'parameter_type']
+    readonly_fields = ['engine', 'parameter_type', 'kind', 'timestamp',
+                       'value', 'score', 'created_at']
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False  # Тревоги создает проверка значений (monitoring.alarms)
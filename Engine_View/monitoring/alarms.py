@@ -0,0 +1,236 @@
+"""
+Обнаружение нарушений пределов и аномалий в рядах параметров.
+
+Правила считаются векторно NumPy сразу для всех точек ряда:
+
+- выход за min_value/max_value типа параметра;
+- z-оценка: отклонение от среднего ALARM_WINDOW предыдущих значений
+  больше ZSCORE_THRESHOLD стандартных отклонений окна;
+- скачок: модуль скорости изменения больше RATE_FACTOR медиан модулей
+  скорости на предыдущих ALARM_WINDOW интервалах.
+
+При записи замеров (services.record_batches и сигнал сохранения
+ParameterValue) проверяются только новые значения: хвосты из
+ALARM_WINDOW предыдущих значений всех затронутых пар двигатель/параметр
+читаются одним запросом. Команда detect_alarms проверяет историю
+целиком. Тревоги пишутся bulk_create с ignore_conflicts, поэтому
+повторная проверка тех же значений их не дублирует.
+
+Импорт и прием от регистраторов сохраняют значения вне min/max
+как есть, и нарушения пределов отмечаются тревогами; жестко пределы
+проверяются только при ручном вводе замера (services.record_measurement).
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .models import Alarm, ParameterValue
+from .registry import get_registry
+
+# Число предыдущих значений, по которым оценивается новое
+ALARM_WINDOW = 60
+
+# Порог модуля z-оценки
+ZSCORE_THRESHOLD = 4.0
+
+# Во сколько раз скорость изменения должна превысить обычную (медиану)
+RATE_FACTOR = 10.0
+
+# Насколько далеко в прошлое ищется хвост окна при записи
+ALARM_LOOKBACK = timedelta(days=7)
+
+# Точек ряда, проверяемых за один проход (ограничивает память окон)
+DETECT_CHUNK_SIZE = 100_000
+
+
+def alarms_enabled():
+    """Проверка новых значений при записи, MONITORING_ALARMS."""
+    return getattr(settings, 'MONITORING_ALARMS', True)
+
+
+def detect(timestamps, values, parameter_type, start=0,
+           window=ALARM_WINDOW):
+    """
+    Нарушения в точках ряда начиная с индекса start.
+
+    Точки до start служат только окном для оценки последующих.
+
+    Args:
+        timestamps: Метки времени (мс UTC) по возрастанию
+        values: Значения float64
+        parameter_type: Тип параметра с пределами
+        start: Первая проверяемая точка
+        window: Размер окна
+
+    Returns:
+        list: Тройки (вид тревоги, индекс точки, оценка) по видам
+            и возрастанию индекса
+    """
+    found = []
+    for chunk_start in range(start, len(values), DETECT_CHUNK_SIZE):
+        # Окну z-оценки нужны window точек перед куском, окну скорости -
+        # window интервалов, то есть на одну точку больше
+        offset = max(chunk_start - window - 1, 0)
+        end = chunk_start + DETECT_CHUNK_SIZE
+        found.extend(
+            (kind, offset + index, score)
+            for kind, index, score in _detect_chunk(
+                timestamps[offset:end], values[offset:end], parameter_type,
+                chunk_start - offset, window,
+            )
+        )
+    return found
+
+
+def _detect_chunk(timestamps, values, parameter_type, start, window):
+    found = []
+    checked = values[start:]
+    for kind, limit, breached in (
+        (Alarm.KIND_LOW, parameter_type.min_value, np.less),
+        (Alarm.KIND_HIGH, parameter_type.max_value, np.greater),
+    ):
+        if limit is not None:
+            found.extend(
+                (kind, start + index, limit)
+                for index in np.flatnonzero(breached(checked, limit))
+            )
+
+    # Окно точки i - значения [i - window, i)
+    first = max(start, window)
+    if len(values) > first:
+        previous = sliding_window_view(values[:-1], window)[first - window:]
+        mean = previous.mean(axis=1)
+        std = previous.std(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = (values[first:] - mean) / std
+        hits = np.flatnonzero((std > 0) & (np.abs(scores) > ZSCORE_THRESHOLD))
+        found.extend(
+            (Alarm.KIND_ZSCORE, first + index, float(scores[index]))
+            for index in hits
+        )
+
+    # Скорость точки i - от точки i - 1, в единицах в минуту; окно -
+    # модули скоростей [i - 1 - window, i - 1)
+    first = max(start, window + 1)
+    if len(values) > first:
+        intervals = np.diff(timestamps) / 60_000
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = np.where(intervals > 0, np.diff(values) / intervals, 0.0)
+        magnitudes = np.abs(rates)
+        usual = np.median(
+            sliding_window_view(magnitudes[:-1], window)[first - 1 - window:],
+            axis=1,
+        )
+        current = rates[first - 1:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = current / usual
+        hits = np.flatnonzero((usual > 0) & (np.abs(scores) > RATE_FACTOR))
+        found.extend(
+            (Alarm.KIND_RATE, first + index, float(scores[index]))
+            for index in hits
+        )
+    return found
+
+
+def _from_ms(timestamp):
+    return datetime.fromtimestamp(int(timestamp) / 1000, tz=dt_timezone.utc)
+
+
+def series_alarms(engine_id, parameter_type, timestamps, values, start=0):
+    """Несохраненные тревоги ряда двигателя, см. detect."""
+    return [
+        Alarm(
+            engine_id=engine_id, parameter_type_id=parameter_type.pk,
+            kind=kind, timestamp=_from_ms(timestamps[index]),
+            value=float(values[index]), score=score,
+        )
+        for kind, index, score in detect(
+            timestamps, values, parameter_type, start
+        )
+    ]
+
+
+def save_alarms(alarms, batch_size=None):
+    """Запись тревог (уже записанные пропускаются); возвращает их число."""
+    Alarm.objects.bulk_create(
+        alarms, batch_size=batch_size, ignore_conflicts=True
+    )
+    return len(alarms)
+
+
+def _tails(first_timestamps):
+    """
+    Хвосты окон: до ALARM_WINDOW + 1 последних значений каждой пары
+    перед ее первым новым значением, одним запросом.
+
+    Returns:
+        dict: {(id двигателя, id параметра): [(время, значение), ...]}
+            по возрастанию времени
+    """
+    condition = Q()
+    for (engine_id, parameter_type_id), first in first_timestamps.items():
+        condition |= Q(
+            measurement__engine_id=engine_id,
+            parameter_type_id=parameter_type_id,
+            measurement__timestamp__lt=first,
+            measurement__timestamp__gte=first - ALARM_LOOKBACK,
+        )
+    rows = ParameterValue.objects.filter(condition).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=[F('measurement__engine_id'), F('parameter_type_id')],
+            order_by=F('measurement__timestamp').desc(),
+        )
+    ).filter(position__lte=ALARM_WINDOW + 1).values_list(
+        'measurement__engine_id', 'parameter_type_id',
+        'measurement__timestamp', 'value',
+    )
+    tails = {}
+    for engine_id, parameter_type_id, timestamp, value in rows:
+        tails.setdefault((engine_id, parameter_type_id), []).append(
+            (timestamp, value)
+        )
+    for tail in tails.values():
+        tail.sort(key=lambda point: point[0])
+    return tails
+
+
+def detect_new_values(rows):
+    """
+    Проверка только что записанных значений по хвостам их рядов.
+
+    Args:
+        rows: Последовательность (id двигателя, id типа параметра,
+            время, значение)
+
+    Returns:
+        int: Число найденных тревог
+    """
+    new_points = {}
+    for engine_id, parameter_type_id, timestamp, value in rows:
+        new_points.setdefault((engine_id, parameter_type_id), []).append(
+            (timestamp, value)
+        )
+    if not new_points:
+        return 0
+
+    for points in new_points.values():
+        points.sort(key=lambda point: point[0])
+    tails = _tails({key: points[0][0] for key, points in new_points.items()})
+
+    parameters = get_registry().parameters_by_id
+    alarms = []
+    for (engine_id, parameter_type_id), points in new_points.items():
+        tail = tails.get((engine_id, parameter_type_id), [])
+        timestamps, values = zip(*(tail + points))
+        alarms.extend(series_alarms(
+            engine_id, parameters[parameter_type_id],
+            pd.DatetimeIndex(timestamps).as_unit('ms').asi8,
+            np.asarray(values, dtype=np.float64), start=len(tail),
+        ))
+    return save_alarms(alarms)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MonitoringConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'monitoring'
+
+    def ready(self):
+        # Подключение обработчиков сигналов
+        from . import signals  # pylint: disable=unused-import,import-outside-toplevel
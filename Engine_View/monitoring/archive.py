@@ -0,0 +1,446 @@
+"""
+Архив старых замеров: месяцы двигателя в столбцовых файлах NumPy.
+
+Месяц (UTC) двигателя переносится из таблиц замеров в каталог
+MONITORING_ARCHIVE_ROOT/<id двигателя>/<ГГГГ-ММ>-<суффикс>/:
+timestamps.npy - метки времени замеров (мс UTC, int64) по возрастанию
+и <id типа параметра>.npy - значения float64 в том же порядке,
+NaN там, где параметра в замере нет. Каталог месяца описывает строка
+ArchivedMonth, а Engine.archived_until - граница, до которой замеры
+двигателя могли быть перенесены.
+
+Агрегаты (monitoring.rollups) и текущие значения при переносе
+не меняются, поэтому графики за длинные периоды строятся как раньше.
+Сырые ряды (fetch_series) дополняются значениями из архива, если
+период захватывает архивные месяцы; файлы открываются через
+np.load(mmap_mode='r'), и с диска читаются только нужные срезы.
+
+Замеры, пришедшие в уже архивный месяц, остаются в базе и видны
+графикам вместе с архивом; повторный перенос дописывает их в новый
+каталог месяца. Примечания и авторы замеров в архив не попадают.
+"""
+import heapq
+import shutil
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from functools import partial
+from operator import itemgetter
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+
+from .models import ArchivedMonth, Measurement, ParameterValue
+from .registry import get_registry
+from .stats import invalidate_fleet_summary
+
+TIMESTAMPS_FILE = 'timestamps.npy'
+
+# Lookup-ы по Measurement, которые можно применить к архиву
+_ARCHIVE_LOOKUPS = {
+    'engine_id', 'engine__vessel_id',
+    'timestamp__gte', 'timestamp__gt', 'timestamp__lt', 'timestamp__lte',
+}
+
+
+def get_archive_root():
+    """Каталог архива, MONITORING_ARCHIVE_ROOT."""
+    return Path(getattr(
+        settings, 'MONITORING_ARCHIVE_ROOT', settings.BASE_DIR / 'archive'
+    ))
+
+
+def month_start(timestamp):
+    """Начало месяца (UTC), в который попадает timestamp."""
+    timestamp = timestamp.astimezone(dt_timezone.utc)
+    return datetime(timestamp.year, timestamp.month, 1, tzinfo=dt_timezone.utc)
+
+
+def next_month(start):
+    """Начало следующего месяца."""
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def _to_ms(timestamps):
+    return pd.DatetimeIndex(timestamps).as_unit('ms').asi8
+
+
+def _from_ms(timestamp):
+    return datetime.fromtimestamp(int(timestamp) / 1000, tz=dt_timezone.utc)
+
+
+def _read_columns(path, parameter_ids):
+    """Полное чтение каталога месяца: (метки времени, {id: значения})."""
+    return np.load(path / TIMESTAMPS_FILE), {
+        parameter_type_id: np.load(path / f'{parameter_type_id}.npy')
+        for parameter_type_id in parameter_ids
+    }
+
+
+def _month_columns(engine, start, end, last_pk):
+    """
+    Значения замеров месяца в виде столбцов.
+
+    Returns:
+        tuple: (метки времени мс, {id типа параметра: значения})
+    """
+    rows = list(ParameterValue.objects.filter(
+        measurement__engine=engine,
+        measurement__timestamp__gte=start,
+        measurement__timestamp__lt=end,
+        measurement_id__lte=last_pk,
+    ).order_by('measurement__timestamp', 'measurement_id').values_list(
+        'measurement_id', 'measurement__timestamp', 'parameter_type_id',
+        'value',
+    ))
+    if not rows:
+        return np.empty(0, dtype=np.int64), {}
+
+    measurement_ids, timestamps, parameter_ids, values = zip(*rows)
+    measurement_ids = np.asarray(measurement_ids)
+    # Номер замера для каждой строки: строки одного замера идут подряд
+    starts = np.r_[True, measurement_ids[1:] != measurement_ids[:-1]]
+    positions = np.cumsum(starts) - 1
+    parameter_ids = np.asarray(parameter_ids)
+    values = np.asarray(values, dtype=np.float64)
+
+    columns = {}
+    for parameter_type_id in np.unique(parameter_ids):
+        mask = parameter_ids == parameter_type_id
+        column = np.full(starts.sum(), np.nan)
+        column[positions[mask]] = values[mask]
+        columns[int(parameter_type_id)] = column
+    return _to_ms(timestamps)[starts], columns
+
+
+def _merge_columns(first, second):
+    """Объединение двух наборов столбцов с упорядочиванием по времени."""
+    timestamps = np.concatenate([first[0], second[0]])
+    order = np.argsort(timestamps, kind='stable')
+    columns = {}
+    for parameter_type_id in first[1].keys() | second[1].keys():
+        parts = [
+            part[1].get(
+                parameter_type_id, np.full(len(part[0]), np.nan)
+            )
+            for part in (first, second)
+        ]
+        columns[parameter_type_id] = np.concatenate(parts)[order]
+    return timestamps[order], columns
+
+
+def archive_month(engine, start):
+    """
+    Перенос замеров двигателя за месяц в архив.
+
+    Файлы пишутся в новый каталог; строки замеров удаляются и каталог
+    регистрируется в одной транзакции, старый каталог месяца удаляется
+    после ее фиксации.
+
+    Args:
+        engine: Двигатель
+        start: Начало месяца (UTC)
+
+    Returns:
+        int: Число перенесенных замеров
+    """
+    start = month_start(start)
+    end = next_month(start)
+    root = get_archive_root()
+
+    with transaction.atomic():
+        measurements = Measurement.objects.filter(
+            engine=engine, timestamp__gte=start, timestamp__lt=end
+        )
+        # Замеры, записанные во время переноса, остаются в базе
+        last_pk = measurements.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first()
+        if last_pk is None:
+            return 0
+        measurements = measurements.filter(pk__lte=last_pk)
+        measurement_count = measurements.count()
+        columns = _month_columns(engine, start, end, last_pk)
+
+        previous = ArchivedMonth.objects.select_for_update().filter(
+            engine=engine, month=start.date()
+        ).first()
+        if previous is not None:
+            columns = _merge_columns(_read_columns(
+                root / previous.path, previous.parameter_ids
+            ), columns)
+
+        timestamps, values = columns
+        relative = Path(str(engine.pk)) / (
+            f'{start:%Y-%m}-{uuid.uuid4().hex[:8]}'
+        )
+        path = root / relative
+        path.mkdir(parents=True)
+        try:
+            np.save(path / TIMESTAMPS_FILE, timestamps)
+            for parameter_type_id, column in values.items():
+                np.save(path / f'{parameter_type_id}.npy', column)
+
+            # Удаление в обход сигналов: иначе агрегаты и текущие
+            # значения пересчитались бы по оставшимся сырым данным
+            for queryset in (
+                ParameterValue.objects.filter(measurement__in=measurements),
+                measurements,
+            ):
+                queryset._raw_delete(queryset.db)
+
+            if len(timestamps):
+                ArchivedMonth.objects.update_or_create(
+                    engine=engine, month=start.date(), defaults={
+                        'path': str(relative),
+                        'parameter_ids': sorted(values),
+                        'first_timestamp': _from_ms(timestamps[0]),
+                        'last_timestamp': _from_ms(timestamps[-1]),
+                        'measurement_count': len(timestamps),
+                        'value_count': int(sum(
+                            np.count_nonzero(~np.isnan(column))
+                            for column in values.values()
+                        )),
+                    },
+                )
+
+            if engine.archived_until is None or engine.archived_until < end:
+                engine.archived_until = end
+                engine.save(update_fields=['archived_until'])
+        except BaseException:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+
+        if previous is not None:
+            transaction.on_commit(partial(
+                shutil.rmtree, root / previous.path, ignore_errors=True
+            ))
+        # Версии данных графиков не меняются: ряды читают базу вместе
+        # с архивом, а агрегаты остаются прежними
+        transaction.on_commit(invalidate_fleet_summary)
+    return measurement_count
+
+
+def _archived_engines(measurement_filters):
+    """Двигатели фильтра, у которых период может захватывать архив."""
+    engines = get_registry().filter_engines(measurement_filters)
+    start = (measurement_filters.get('timestamp__gte')
+             or measurement_filters.get('timestamp__gt'))
+    return [
+        engine.pk for engine in engines
+        if engine.archived_until is not None
+        and (start is None or start < engine.archived_until)
+    ]
+
+
+def _bounds(timestamps, measurement_filters):
+    """Границы среза отсортированных меток времени по фильтрам периода."""
+    low, high = 0, len(timestamps)
+    for key, side in (('timestamp__gte', 'left'), ('timestamp__gt', 'right')):
+        if key in measurement_filters:
+            low = max(low, int(np.searchsorted(
+                timestamps, _to_ms([measurement_filters[key]])[0], side
+            )))
+    for key, side in (('timestamp__lt', 'left'), ('timestamp__lte', 'right')):
+        if key in measurement_filters:
+            high = min(high, int(np.searchsorted(
+                timestamps, _to_ms([measurement_filters[key]])[0], side
+            )))
+    return low, high
+
+
+def _archived_months(measurement_filters):
+    """
+    Архивные месяцы, пересекающиеся с периодом фильтра.
+
+    Returns:
+        QuerySet: ArchivedMonth или None, если период не захватывает
+            архив (или фильтр к архиву не применяется)
+    """
+    if not measurement_filters.keys() <= _ARCHIVE_LOOKUPS:
+        return None
+    engine_ids = _archived_engines(measurement_filters)
+    if not engine_ids:
+        return None
+
+    months = ArchivedMonth.objects.filter(engine_id__in=engine_ids)
+    for key, lookup in (('timestamp__gte', 'last_timestamp__gte'),
+                        ('timestamp__gt', 'last_timestamp__gt'),
+                        ('timestamp__lt', 'first_timestamp__lt'),
+                        ('timestamp__lte', 'first_timestamp__lte')):
+        if key in measurement_filters:
+            months = months.filter(**{lookup: measurement_filters[key]})
+    return months
+
+
+def archived_series(parameter_type, measurement_filters=None):
+    """
+    Значения параметра из архива за период фильтра.
+
+    Args:
+        parameter_type: Тип параметра (объект или id)
+        measurement_filters: Словарь lookup-ов по Measurement
+
+    Returns:
+        tuple: (метки времени мс UTC, значения) по возрастанию времени
+            или None, если период не захватывает архив (или фильтр
+            к архиву не применяется)
+    """
+    measurement_filters = measurement_filters or {}
+    months = _archived_months(measurement_filters)
+    if months is None:
+        return None
+
+    parameter_type_id = getattr(parameter_type, 'pk', parameter_type)
+    root = get_archive_root()
+    chunks = []
+    for path, parameter_ids in months.values_list('path', 'parameter_ids'):
+        if parameter_type_id not in parameter_ids:
+            continue
+        path = root / path
+        timestamps = np.load(path / TIMESTAMPS_FILE, mmap_mode='r')
+        low, high = _bounds(timestamps, measurement_filters)
+        values = np.load(path / f'{parameter_type_id}.npy', mmap_mode='r')
+        values = np.asarray(values[low:high])
+        present = ~np.isnan(values)
+        chunks.append((np.asarray(timestamps[low:high])[present],
+                       values[present]))
+
+    if not chunks:
+        return None
+    timestamps = np.concatenate([chunk[0] for chunk in chunks])
+    values = np.concatenate([chunk[1] for chunk in chunks])
+    order = np.argsort(timestamps, kind='stable')
+    return timestamps[order], values[order]
+
+
+def archived_values(engine_id, start, end, parameter_type_ids=None):
+    """
+    Значения двигателя из архива за [start, end) по параметрам.
+
+    Нужны для пересчета агрегатов архивных интервалов
+    (monitoring.rollups): сырых строк за эти месяцы в базе нет.
+
+    Args:
+        engine_id: Двигатель
+        start: Начало периода
+        end: Конец периода (не включается)
+        parameter_type_ids: Параметры (по умолчанию - все из архива)
+
+    Returns:
+        dict: {id типа параметра: значения float64 без пропусков}
+    """
+    filters = {'timestamp__gte': start, 'timestamp__lt': end}
+    root = get_archive_root()
+    result = {}
+    for path, parameter_ids in ArchivedMonth.objects.filter(
+        engine_id=engine_id, last_timestamp__gte=start,
+        first_timestamp__lt=end,
+    ).values_list('path', 'parameter_ids'):
+        path = root / path
+        timestamps = np.load(path / TIMESTAMPS_FILE, mmap_mode='r')
+        low, high = _bounds(timestamps, filters)
+        if low >= high:
+            continue
+        for parameter_type_id in parameter_ids:
+            if (parameter_type_ids is not None
+                    and parameter_type_id not in parameter_type_ids):
+                continue
+            values = np.asarray(np.load(
+                path / f'{parameter_type_id}.npy', mmap_mode='r'
+            )[low:high])
+            values = values[~np.isnan(values)]
+            if len(values):
+                result[parameter_type_id] = np.concatenate([
+                    result.get(parameter_type_id, values[:0]), values
+                ])
+    return result
+
+
+def archived_parameter_ids(measurement_filters=None):
+    """Id типов параметров, значения которых есть в архиве периода."""
+    months = _archived_months(measurement_filters or {})
+    if months is None:
+        return set()
+    return {
+        parameter_type_id
+        for parameter_ids in months.values_list('parameter_ids', flat=True)
+        for parameter_type_id in parameter_ids
+    }
+
+
+def archived_measurement_count(measurement_filters=None):
+    """
+    Число архивных замеров периода без чтения файлов: оценка сверху,
+    месяцы на границах периода считаются целиком.
+    """
+    months = _archived_months(measurement_filters or {})
+    if months is None:
+        return 0
+    return sum(months.values_list('measurement_count', flat=True))
+
+
+def archived_measurements(measurement_filters=None, chunk_size=5000):
+    """
+    Замеры из архива за период фильтра по возрастанию времени.
+
+    Месяцы читаются через mmap кусками по chunk_size замеров, поэтому
+    в памяти одновременно только один кусок каждого двигателя.
+
+    Yields:
+        tuple: (время, id двигателя, {id типа параметра: значение})
+    """
+    measurement_filters = measurement_filters or {}
+    months = _archived_months(measurement_filters)
+    if months is None:
+        return
+    engine_months = {}
+    for engine_id, path, parameter_ids in months.order_by(
+        'month'
+    ).values_list('engine_id', 'path', 'parameter_ids'):
+        engine_months.setdefault(engine_id, []).append((path, parameter_ids))
+
+    # Месяцы одного двигателя идут подряд, двигатели сливаются по времени
+    yield from heapq.merge(*(
+        _engine_measurements(
+            engine_id, paths, measurement_filters, chunk_size
+        )
+        for engine_id, paths in engine_months.items()
+    ), key=itemgetter(0))
+
+
+def _engine_measurements(engine_id, months, measurement_filters, chunk_size):
+    for path, parameter_ids in months:
+        yield from _month_measurements(
+            engine_id, path, parameter_ids, measurement_filters, chunk_size
+        )
+
+
+def _month_measurements(engine_id, path, parameter_ids, measurement_filters,
+                        chunk_size):
+    path = get_archive_root() / path
+    timestamps = np.load(path / TIMESTAMPS_FILE, mmap_mode='r')
+    low, high = _bounds(timestamps, measurement_filters)
+    columns = {
+        parameter_type_id: np.load(
+            path / f'{parameter_type_id}.npy', mmap_mode='r'
+        )
+        for parameter_type_id in parameter_ids
+    }
+    for start in range(low, high, chunk_size):
+        stop = min(start + chunk_size, high)
+        chunk = {
+            parameter_type_id: column[start:stop].tolist()
+            for parameter_type_id, column in columns.items()
+        }
+        for index, timestamp in enumerate(timestamps[start:stop].tolist()):
+            yield _from_ms(timestamp), engine_id, {
+                parameter_type_id: values[index]
+                for parameter_type_id, values in chunk.items()
+                # NaN - параметра в замере нет
+                if values[index] == values[index]
+            }
@@ -0,0 +1,112 @@
+"""
+Кэш данных графиков с версиями по двигателям.
+
+Ключ ответа включает версии всех двигателей, попадающих в фильтр.
+Любая запись замера или значения двигателя увеличивает его версию
+(см. monitoring.signals и импорт), поэтому старые ответы больше не
+находятся и вытесняются бэкендом кэша (LRU/TTL), а не удаляются явно.
+
+Если версия двигателя вытеснена из кэша, новая начинается со времени
+в наносекундах, а не с единицы, - так она не совпадет ни с одной
+версией, под которой мог быть сохранен старый ответ.
+
+Версии меняют и другие процессы (обработчик очереди импорта, команды
+управления), поэтому кэш графиков работает только с общим для
+процессов бэкендом. С LocMemCache версии, измененные в другом
+процессе, здесь не видны, и графики строятся без кэша.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from .downsampling import MINMAX
+from .registry import get_registry
+from .series import DEFAULT_MAX_POINTS, build_chart_data
+
+ENGINE_VERSION_KEY = 'monitoring:engine_version:{}'
+CHART_CACHE_KEY = 'monitoring:chart:{}'
+
+
+def get_chart_timeout():
+    """Срок жизни данных графика в кэше, MONITORING_CHART_CACHE_TIMEOUT."""
+    return getattr(settings, 'MONITORING_CHART_CACHE_TIMEOUT', 600)
+
+
+def chart_cache_enabled():
+    """Кэш общий для процессов (не память одного процесса)."""
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def engine_versions(engine_ids):
+    """
+    Текущие версии данных двигателей одним запросом к кэшу.
+
+    Returns:
+        dict: {engine_id: версия}
+    """
+    keys = {ENGINE_VERSION_KEY.format(engine_id): engine_id
+            for engine_id in engine_ids}
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        # add не перезапишет версию, которую успел создать другой процесс
+        for key, version in missing.items():
+            cache.add(key, version, None)
+        versions.update(cache.get_many(missing))
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def bump_engine_versions(engine_ids):
+    """Новая версия данных двигателей после записи их замеров."""
+    for engine_id in set(engine_ids):
+        key = ENGINE_VERSION_KEY.format(engine_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def _filter_engine_ids(measurement_filters):
+    if 'engine_id' in measurement_filters:
+        return [measurement_filters['engine_id']]
+    return [
+        engine.pk
+        for engine in get_registry().filter_engines(measurement_filters)
+    ]
+
+
+def chart_cache_key(parameter_type, measurement_filters, max_points, method):
+    """Ключ данных графика: параметры запроса и версии двигателей."""
+    versions = engine_versions(_filter_engine_ids(measurement_filters))
+    filters = sorted(
+        (key, str(value)) for key, value in measurement_filters.items()
+    )
+    parts = [
+        parameter_type.pk, parameter_type.name, parameter_type.unit,
+        max_points, method, filters, sorted(versions.items()),
+    ]
+    digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+    return CHART_CACHE_KEY.format(digest)
+
+
+def cached_chart_data(parameter_type, measurement_filters=None,
+                      max_points=DEFAULT_MAX_POINTS, method=MINMAX):
+    """build_chart_data с кэшированием результата до записи данных."""
+    measurement_filters = measurement_filters or {}
+    if not chart_cache_enabled():
+        return build_chart_data(
+            parameter_type, measurement_filters, max_points, method
+        )
+    key = chart_cache_key(
+        parameter_type, measurement_filters, max_points, method
+    )
+    data = cache.get(key)
+    if data is None:
+        data = build_chart_data(
+            parameter_type, measurement_filters, max_points, method
+        )
+        cache.set(key, data, get_chart_timeout())
+    return data
@@ -0,0 +1,121 @@
+"""
+Прореживание временных рядов на сервере перед отправкой в Chart.js.
+
+Оба алгоритма сохраняют первую и последнюю точки ряда:
+- LTTB (Largest-Triangle-Three-Buckets) выбирает в каждой корзине точку,
+  образующую наибольший треугольник с соседними корзинами - лучше всего
+  передает форму кривой, но оставляет лишь один выброс на корзину;
+- min/max оставляет в каждой корзине минимум и максимум в порядке времени,
+  поэтому гарантированно не теряет скачки температуры и давления.
+"""
+import numpy as np
+
+LTTB = 'lttb'
+MINMAX = 'minmax'
+METHODS = (LTTB, MINMAX)
+
+# Меньше точек прореживать бессмысленно: первая, последняя и корзина
+MIN_POINTS = 4
+
+
+def downsample(timestamps, values, max_points, method=MINMAX):
+    """
+    Прореживание ряда до не более чем max_points точек.
+
+    Args:
+        timestamps: Массив меток времени (int64)
+        values: Массив значений (float64)
+        max_points: Максимальное число точек в результате; меньше
+            MIN_POINTS не бывает
+        method: Алгоритм - 'lttb' или 'minmax'
+
+    Returns:
+        tuple: (timestamps, values) прореженного ряда
+    """
+    if method not in METHODS:
+        raise ValueError(f"Неизвестный метод прореживания: {method}")
+    max_points = max(max_points, MIN_POINTS)
+    if len(values) <= max_points:
+        return timestamps, values
+
+    if method == MINMAX:
+        # Две точки на корзину плюс первая и последняя точки ряда
+        indices = minmax_indices(values, (max_points - 2) // 2)
+    else:
+        indices = lttb_indices(timestamps, values, max_points)
+    return timestamps[indices], values[indices]
+
+
+def _bucket_edges(start, stop, buckets):
+    """Границы корзин примерно равного размера на отрезке [start, stop)."""
+    return np.linspace(start, stop, buckets + 1).astype(np.int64)
+
+
+def minmax_indices(values, buckets):
+    """
+    Индексы минимума и максимума каждой корзины в порядке времени.
+
+    Полностью векторизовано: минимумы и максимумы ищутся через reduceat,
+    позиции - по первому совпадению внутри корзины.
+    """
+    count = len(values)
+    edges = _bucket_edges(0, count, buckets)
+    starts = edges[:-1]
+    sizes = np.diff(edges)
+    bucket_of = np.repeat(np.arange(buckets), sizes)
+
+    first_min = _first_match(
+        values == np.repeat(np.minimum.reduceat(values, starts), sizes),
+        bucket_of,
+    )
+    first_max = _first_match(
+        values == np.repeat(np.maximum.reduceat(values, starts), sizes),
+        bucket_of,
+    )
+    indices = np.union1d(first_min, first_max)
+    return np.union1d(indices, [0, count - 1])
+
+
+def _first_match(mask, bucket_of):
+    """Первая позиция True в каждой корзине."""
+    positions = np.flatnonzero(mask)
+    _, first = np.unique(bucket_of[positions], return_index=True)
+    return positions[first]
+
+
+def lttb_indices(timestamps, values, threshold):
+    """
+    Индексы точек, выбранных алгоритмом LTTB.
+
+    Выбор в корзине зависит от точки, выбранной в предыдущей, поэтому цикл
+    идет по корзинам (не более threshold итераций), а площади внутри
+    корзины считаются векторно.
+    """
+    x = timestamps.astype(np.float64)
+    y = values
+    count = len(y)
+    edges = _bucket_edges(1, count - 1, threshold - 2)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = count - 1
+    previous = 0
+
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        # Среднее следующей корзины (для последней - последняя точка)
+        if bucket + 2 < len(edges):
+            next_start, next_stop = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_start, next_stop = count - 1, count
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (avg_y - y[previous])
+        )
+        previous = start + int(area.argmax())
+        selected[bucket + 1] = previous
+
+    return selected
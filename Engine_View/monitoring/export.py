@@ -0,0 +1,236 @@
+"""
+Потоковая выгрузка замеров в широком формате (CSV и Excel .xlsx).
+
+Строка выгрузки - замер: время, судно, двигатель и по колонке на каждый
+код параметра. Значения читаются одним запросом к ParameterValue,
+отсортированным по (время, замер), через iterator(chunk_size=...):
+в PostgreSQL это серверный курсор, поэтому в памяти одновременно
+находится только пачка строк и собираемый замер. Названия судов
+и двигателей берутся из справочников в памяти (monitoring.registry).
+
+Месяцы, перенесенные в архив (monitoring.archive), читаются из его
+файлов кусками, а период сжатия (monitoring.retention) выгружается
+по строке на минуту двигателя со средними значениями минутных
+агрегатов. Все источники сливаются по времени (heapq.merge).
+
+CSV отдается кусками по мере чтения. Книга xlsx буферизуется:
+openpyxl в режиме write-only пишет строки во временный файл, и первый
+байт ответа уходит только после записи последней строки. Поэтому
+число строк xlsx ограничено MONITORING_XLSX_EXPORT_MAX_ROWS
+(см. export_row_count), большие выгрузки делаются в CSV. При
+превышении лимита строк листа Excel начинается новый лист.
+"""
+import csv
+import heapq
+import io
+import tempfile
+from operator import itemgetter
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .archive import (
+    archived_measurement_count,
+    archived_measurements,
+    archived_parameter_ids,
+)
+from .models import Measurement, ParameterType, ParameterValue
+from .registry import get_registry
+from .retention import (
+    compacted_measurement_count,
+    compacted_measurements,
+    compacted_parameter_ids,
+)
+
+CSV = 'csv'
+XLSX = 'xlsx'
+FORMATS = (CSV, XLSX)
+
+CONTENT_TYPES = {
+    CSV: 'text/csv; charset=utf-8',
+    XLSX: 'application/vnd.openxmlformats-officedocument'
+          '.spreadsheetml.sheet',
+}
+
+# Размер пачки строк при чтении из курсора
+EXPORT_CHUNK_SIZE = 5000
+
+# Примерный размер куска ответа, байт
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Строк на листе Excel, включая заголовок
+XLSX_MAX_ROWS = 1_048_576
+
+# Служебные колонки перед параметрами; импорт их пропускает
+SERVICE_COLUMNS = ['timestamp', 'vessel', 'engine']
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def get_xlsx_max_rows():
+    """Наибольшее число строк xlsx, MONITORING_XLSX_EXPORT_MAX_ROWS."""
+    return getattr(settings, 'MONITORING_XLSX_EXPORT_MAX_ROWS', 100_000)
+
+
+def export_row_count(measurement_filters=None, limit=None):
+    """
+    Число строк выгрузки без их чтения, не больше limit (с точностью
+    до архивных месяцев на границах периода, см.
+    archived_measurement_count).
+    """
+    measurement_filters = measurement_filters or {}
+    measurements = Measurement.objects.filter(**measurement_filters)
+    count = (
+        measurements[:limit] if limit is not None else measurements
+    ).count()
+    count += archived_measurement_count(measurement_filters)
+    count += compacted_measurement_count(measurement_filters, limit)
+    return count if limit is None else min(count, limit)
+
+
+def export_parameters(measurement_filters=None):
+    """Типы параметров, у которых есть значения в выбранных замерах."""
+    lookups = {
+        f'measurement__{key}': value
+        for key, value in (measurement_filters or {}).items()
+    }
+    ids_with_data = set(ParameterType.objects.filter(Exists(
+        ParameterValue.objects.filter(parameter_type=OuterRef('pk'), **lookups)
+    )).values_list('pk', flat=True))
+    ids_with_data |= archived_parameter_ids(measurement_filters)
+    ids_with_data |= compacted_parameter_ids(measurement_filters)
+    return [
+        param for param in get_registry().parameters
+        if param.pk in ids_with_data
+    ]
+
+
+def export_header(parameters):
+    """Заголовок выгрузки: служебные колонки и коды параметров."""
+    return SERVICE_COLUMNS + [param.code for param in parameters]
+
+
+def export_rows(measurement_filters, parameters):
+    """
+    Строки выгрузки по одному замеру, вместе с архивом и сжатым периодом.
+
+    Args:
+        measurement_filters: Словарь lookup-ов по Measurement
+        parameters: Типы параметров в порядке колонок
+
+    Yields:
+        list: [время, судно, двигатель, значения...]; пустая строка
+            там, где параметра в замере нет
+    """
+    registry = get_registry()
+    columns = {param.pk: index for index, param in enumerate(parameters)}
+    measurements = heapq.merge(
+        database_measurements(measurement_filters),
+        archived_measurements(measurement_filters, EXPORT_CHUNK_SIZE),
+        compacted_measurements(measurement_filters, EXPORT_CHUNK_SIZE),
+        key=itemgetter(0),
+    )
+    for timestamp, engine_id, values in measurements:
+        engine = registry.engines_by_id[engine_id]
+        row = [
+            timezone.localtime(timestamp).strftime(TIMESTAMP_FORMAT),
+            engine.vessel.name,
+            engine.serial_number,
+        ] + [''] * len(columns)
+        for parameter_type_id, value in values.items():
+            index = columns.get(parameter_type_id)
+            if index is not None:
+                row[len(SERVICE_COLUMNS) + index] = value
+        yield row
+
+
+def database_measurements(measurement_filters=None):
+    """
+    Замеры из базы по возрастанию времени, одним запросом к значениям.
+
+    Yields:
+        tuple: (время, id двигателя, {id типа параметра: значение})
+    """
+    lookups = {
+        f'measurement__{key}': value
+        for key, value in (measurement_filters or {}).items()
+    }
+    values = ParameterValue.objects.filter(**lookups).order_by(
+        'measurement__timestamp', 'measurement_id'
+    ).values_list(
+        'measurement_id', 'measurement__timestamp', 'measurement__engine_id',
+        'parameter_type_id', 'value',
+    )
+
+    current_id = None
+    measurement = None
+    for measurement_id, timestamp, engine_id, parameter_type_id, value in (
+        values.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    ):
+        if measurement_id != current_id:
+            if measurement is not None:
+                yield measurement
+            current_id = measurement_id
+            measurement = (timestamp, engine_id, {})
+        measurement[2][parameter_type_id] = value
+    if measurement is not None:
+        yield measurement
+
+
+def csv_chunks(header, rows):
+    """Куски CSV-файла (str) примерно по STREAM_CHUNK_SIZE."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM, чтобы Excel открывал файл в UTF-8
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= STREAM_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def xlsx_chunks(header, rows):
+    """Куски книги Excel (bytes), собранной во временном файле."""
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = XLSX_MAX_ROWS
+    for row in rows:
+        if sheet_rows >= XLSX_MAX_ROWS:
+            sheet = workbook.create_sheet(
+                f'Замеры {len(workbook.worksheets) + 1}'
+            )
+            sheet.append(header)
+            sheet_rows = 1
+        sheet.append([
+            None if value == '' else value for value in row
+        ])
+        sheet_rows += 1
+    if sheet is None:
+        workbook.create_sheet('Замеры 1').append(header)
+
+    with tempfile.TemporaryFile() as file:
+        workbook.save(file)
+        file.seek(0)
+        while chunk := file.read(STREAM_CHUNK_SIZE):
+            yield chunk
+
+
+def export_chunks(export_format, measurement_filters=None):
+    """
+    Куски файла выгрузки в формате export_format (CSV или XLSX).
+
+    Параметры колонок выбираются сразу, строки читаются по мере
+    отправки ответа.
+    """
+    parameters = export_parameters(measurement_filters)
+    header = export_header(parameters)
+    rows = export_rows(measurement_filters, parameters)
+    if export_format == XLSX:
+        return xlsx_chunks(header, rows)
+    return csv_chunks(header, rows)
@@ -0,0 +1,60 @@
+"""
+Фильтры замеров, общие для списков, графиков и API.
+
+Даты из форм превращаются в полуоткрытые интервалы [начало дня, начало
+следующего дня) в текущем часовом поясе. Условие остается сравнением
+самого столбца timestamp, поэтому база использует индексы по времени,
+а не вычисляет дату для каждой строки, как timestamp__date.
+"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+# Поля MeasurementFilterForm, превращаемые в условия
+FILTER_FIELDS = ('vessel', 'engine', 'date_from', 'date_to')
+
+
+def day_start(day):
+    """Начало дня в текущем часовом поясе (с учетом перехода на летнее время)."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def measurement_lookups(vessel=None, engine=None, date_from=None,
+                        date_to=None):
+    """
+    Словарь lookup-ов по Measurement для фильтров списка и графиков.
+
+    Args:
+        vessel: Судно (объект или id)
+        engine: Двигатель (объект или id)
+        date_from: Первый день периода (включительно)
+        date_to: Последний день периода (включительно)
+
+    Returns:
+        dict: Например, {'engine_id': 1, 'timestamp__gte': dt,
+            'timestamp__lt': dt}
+    """
+    lookups = {}
+    if vessel:
+        lookups['engine__vessel_id'] = getattr(vessel, 'pk', vessel)
+    if engine:
+        lookups['engine_id'] = getattr(engine, 'pk', engine)
+    if date_from:
+        lookups['timestamp__gte'] = day_start(date_from)
+    if date_to:
+        lookups['timestamp__lt'] = day_start(date_to + timedelta(days=1))
+    return lookups
+
+
+def form_lookups(filter_form):
+    """Lookup-ы из MeasurementFilterForm; поля с ошибками пропускаются."""
+    filter_form.is_valid()
+    cleaned_data = getattr(filter_form, 'cleaned_data', {})
+    return measurement_lookups(**{
+        field: cleaned_data.get(field) for field in FILTER_FIELDS
+    })
+
+
+def filter_measurements(measurements, filter_form):
+    """Применение фильтров MeasurementFilterForm к запросу замеров."""
+    return measurements.filter(**form_lookups(filter_form))
@@ -1,5 +1,70 @@
+from datetime import date
+
 from django import forms
-from .models import Vessel, Engine, Measurement, ParameterType, ParameterValue
+from django.forms.models import ModelChoiceIterator
+
+from .models import (
+    ChunkedUpload,
+    Engine,
+    Measurement,
+    ParameterType,
+    ParameterValue,
+    Vessel,
+)
+from .registry import get_registry
+from .uploads import get_max_file_size
+
+
+class ReferenceChoiceIterator(ModelChoiceIterator):
+    """Варианты выбора из снимка справочников, а не из queryset."""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for obj in self.field.get_objects():
+            yield self.choice(obj)
+
+    def __len__(self):
+        return (len(self.field.get_objects())
+                + (self.field.empty_label is not None))
+
+    def __bool__(self):
+        return (self.field.empty_label is not None
+                or bool(self.field.get_objects()))
+
+
+class ReferenceChoiceField(forms.ModelChoiceField):
+    """
+    Выбор судна, двигателя или параметра без запросов к базе.
+
+    Args:
+        objects: Функция, возвращающая список объектов из ReferenceData,
+            например lambda registry: registry.engines
+    """
+    iterator = ReferenceChoiceIterator
+
+    def __init__(self, model, objects, **kwargs):
+        self.objects = objects
+        super().__init__(queryset=model.objects.none(), **kwargs)
+
+    def get_objects(self):
+        return self.objects(get_registry())
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            pk = int(getattr(value, 'pk', value))
+        except (TypeError, ValueError):
+            pk = None
+        for obj in self.get_objects():
+            if obj.pk == pk:
+                return obj
+        raise forms.ValidationError(
+            self.error_messages['invalid_choice'],
+            code='invalid_choice',
+            params={'value': value},
+        )
 
 
 class ParameterTypeForm(forms.ModelForm):
@@ -43,10 +108,15 @@ class MeasurementWithParametersForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.fields['engine'] = ReferenceChoiceField(
+            Engine, lambda registry: registry.engines,
+            label=self.fields['engine'].label,
+            widget=self.fields['engine'].widget,
+        )
 
-        active_parameters = ParameterType.objects.filter(is_active=True)
-
-        for param in active_parameters:
+        # Активные параметры, для которых в форме есть поля
+        self.active_parameters = get_registry().active_parameters
+        for param in self.active_parameters:
             field_name = f'param_{param.code}'
 
             self.fields[field_name] = forms.FloatField(
@@ -60,16 +130,24 @@ class MeasurementWithParametersForm(forms.ModelForm):
                 })
             )
 
+    def parameter_values(self):
+        """Указанные в форме значения: {тип параметра: значение}."""
+        return {
+            param: self.cleaned_data[f'param_{param.code}']
+            for param in self.active_parameters
+            if self.cleaned_data.get(f'param_{param.code}') is not None
+        }
+
 
 class MeasurementFilterForm(forms.Form):
-    vessel = forms.ModelChoiceField(
-        queryset=Vessel.objects.all(),
+    vessel = ReferenceChoiceField(
+        Vessel, lambda registry: registry.vessels,
         required=False,
         label="Судно",
         empty_label="Все суда"
     )
-    engine = forms.ModelChoiceField(
-        queryset=Engine.objects.all(),
+    engine = ReferenceChoiceField(
+        Engine, lambda registry: registry.engines,
         required=False,
         label="Двигатель",
         empty_label="Все двигатели"
@@ -91,24 +169,46 @@ class MeasurementFilterForm(forms.Form):
         if 'vessel' in self.data:
             try:
                 vessel_id = int(self.data.get('vessel'))
-                self.fields['engine'].queryset = Engine.objects.filter(vessel_id=vessel_id)
+                self.fields['engine'].objects = (
+                    lambda registry: registry.vessel_engines(vessel_id)
+                )
             except (ValueError, TypeError):
                 pass
 
+    def clean(self):
+        """
+        Граничные даты календаря не принимаются: период превращается
+        в полуоткрытый интервал со следующим днем (monitoring.filters),
+        а сдвиг часового пояса выводит их за пределы datetime.
+        """
+        cleaned_data = super().clean()
+        if cleaned_data.get('date_from') == date.min:
+            self.add_error('date_from', "Дата вне допустимого диапазона")
+        if cleaned_data.get('date_to') == date.max:
+            self.add_error('date_to', "Дата вне допустимого диапазона")
+        return cleaned_data
+
 
 class CSVImportForm(forms.Form):
     csv_file = forms.FileField(
-        label="CSV файл с данными",
-        help_text="Поддерживаются только файлы с расширением .csv",
-        widget=forms.FileInput(attrs={'accept': '.csv'})
+        label="CSV или Excel файл с данными",
+        help_text=(
+            "Поддерживаются файлы .csv и .xlsx. В книге Excel каждый лист - "
+            "отдельный двигатель (название листа - название или серийный "
+            "номер двигателя)"
+        ),
+        required=False,
+        widget=forms.FileInput(attrs={'accept': '.csv,.xlsx'})
     )
-    vessel = forms.ModelChoiceField(
-        queryset=Vessel.objects.all(),
+    # Файл, заранее загруженный частями через API загрузок
+    upload_id = forms.IntegerField(required=False, widget=forms.HiddenInput)
+    vessel = ReferenceChoiceField(
+        Vessel, lambda registry: registry.vessels,
         label="Судно",
         required=True
     )
-    engine = forms.ModelChoiceField(
-        queryset=Engine.objects.all(),
+    engine = ReferenceChoiceField(
+        Engine, lambda registry: registry.engines,
         label="Двигатель",
         required=True
     )
@@ -132,22 +232,71 @@ class CSVImportForm(forms.Form):
         label="Разделитель колонок"
     )
 
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+
     def clean_csv_file(self):
         """Валидация CSV файла."""
         csv_file = self.cleaned_data.get('csv_file')
 
-        if not csv_file:
-            raise forms.ValidationError("Файл не выбран")
+        if csv_file:
+            validate_import_file(csv_file.name, csv_file.size)
 
-        # Проверяем расширение файла
-        if not csv_file.name.endswith('.csv'):
-            raise forms.ValidationError("Файл должен иметь расширение .csv")
+        return csv_file
 
-        # Проверяем размер файла (макс 10MB)
-        if csv_file.size > 10 * 1024 * 1024:
-            raise forms.ValidationError("Размер файла не должен превышать 10MB")
+    def clean_upload_id(self):
+        """Загрузка частями должна принадлежать пользователю и быть завершена."""
+        upload_id = self.cleaned_data.get('upload_id')
+        if not upload_id:
+            return None
 
-        return csv_file
+        upload = ChunkedUpload.objects.filter(
+            pk=upload_id, created_by=self.user
+        ).first()
+        if upload is None:
+            raise forms.ValidationError("Загрузка файла не найдена")
+        if not upload.is_complete:
+            raise forms.ValidationError("Файл загружен не полностью")
+        return upload
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('csv_file') and not cleaned_data.get('upload_id'):
+            if 'csv_file' not in self.errors and 'upload_id' not in self.errors:
+                self.add_error('csv_file', "Файл не выбран")
+        return cleaned_data
+
+
+IMPORT_EXTENSIONS = ('.csv', '.xlsx')
+
+
+def validate_import_file(name, size):
+    """Проверка расширения и размера файла импорта."""
+    # Проверяем расширение файла
+    if not name.lower().endswith(IMPORT_EXTENSIONS):
+        raise forms.ValidationError(
+            "Файл должен иметь расширение .csv или .xlsx"
+        )
+
+    # Проверяем размер файла
+    max_size = get_max_file_size()
+    if size > max_size:
+        raise forms.ValidationError(
+            f"Размер файла не должен превышать {max_size // (1024 * 1024)}MB"
+        )
+
+
+class ChunkedUploadForm(forms.Form):
+    """Начало загрузки файла импорта частями."""
+    filename = forms.CharField(max_length=255)
+    size = forms.IntegerField(min_value=1)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if 'filename' in cleaned_data and 'size' in cleaned_data:
+            validate_import_file(cleaned_data['filename'], cleaned_data['size'])
+        return cleaned_data
 
 
 class ParameterTypeForm(forms.ModelForm):
@@ -0,0 +1,331 @@
+"""
+Пакетный импорт замеров из табличных файлов (CSV и Excel .xlsx).
+
+Строки читаются потоком и обрабатываются пачками: типы параметров
+сопоставляются с колонками один раз, а замеры и значения каждой пачки
+записываются record_measurements (bulk_create) в отдельной транзакции. Так прогресс
+импорта виден другим соединениям, а блокировка записи не держится
+на все время разбора файла. Значения вне min/max параметра
+импортируются как есть - их отмечают тревоги (monitoring.alarms).
+"""
+import csv
+import time
+from datetime import date, datetime
+from io import TextIOWrapper
+
+from django.conf import settings
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from .models import ParameterType
+from .registry import get_registry
+from .services import record_measurements
+
+# Названия колонок с временем замера (в порядке приоритета)
+TIME_KEYS = ['timestamp', 'time', 'время', 'дата', 'date']
+
+# Колонки выгрузки (monitoring.export), которые не являются параметрами
+SKIP_KEYS = ['vessel', 'engine']
+
+# Сколько сообщений об ошибках строк хранится в памяти; остальные
+# только подсчитываются, чтобы испорченный файл не раздувал процесс
+MAX_ERROR_ROWS = 1000
+
+# Значения ячеек, которые считаются пустыми
+EMPTY_VALUES = {'null', 'none', ''}
+
+# Единица измерения для параметров, созданных без единиц, но с числами
+DEFAULT_UNIT = 'ед.'
+
+# Подсказки для угадывания единиц измерения новых параметров
+UNIT_HINTS = [
+    (('temp', 'temperature', 'темп'), '°C'),
+    (('press', 'pressure', 'давлен'), 'бар'),
+    (('rpm', 'оборот', 'speed'), 'об/мин'),
+    (('fuel', 'топлив'), 'л/ч'),
+]
+
+
+def get_batch_size():
+    """Размер пачки записи, настраивается через MONITORING_IMPORT_BATCH_SIZE."""
+    return getattr(settings, 'MONITORING_IMPORT_BATCH_SIZE', 1000)
+
+
+def parse_number(value_str):
+    """Число из ячейки, допускается запятая как десятичный разделитель."""
+    return float(value_str.replace(',', '.').strip())
+
+
+def guess_unit(header_lower, value_str):
+    """Угадывание единицы измерения нового параметра по названию колонки."""
+    try:
+        parse_number(value_str)
+    except ValueError:
+        return '', 'text'
+
+    for words, unit in UNIT_HINTS:
+        if any(word in header_lower for word in words):
+            return unit, 'number'
+    return '', 'number'
+
+
+class ImportResult:
+    """Итог импорта: счетчики, ошибки по строкам и скорость."""
+
+    def __init__(self):
+        self.imported_count = 0
+        self.rows_count = 0
+        self.values_count = 0
+        self.error_count = 0
+        self.error_rows = []
+        self.created_parameters = []
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        if not self.elapsed:
+            return 0.0
+        return self.rows_count / self.elapsed
+
+    def add_error(self, message):
+        self.error_count += 1
+        if len(self.error_rows) < MAX_ERROR_ROWS:
+            self.error_rows.append(message)
+
+
+class MeasurementImporter:
+    """
+    Импорт строк вида {колонка: значение} в замеры одного двигателя.
+
+    Args:
+        engine: Двигатель, к которому относятся замеры
+        user: Пользователь, выполняющий импорт
+        timestamp_format: Формат времени для strptime
+        batch_size: Число строк в одной пачке bulk_create
+        progress_callback: Функция, вызываемая с ImportResult после
+            записи каждой пачки
+    """
+
+    def __init__(self, engine, user, timestamp_format, batch_size=None,
+                 progress_callback=None):
+        self.engine = engine
+        self.user = user
+        self.timestamp_format = timestamp_format
+        self.batch_size = batch_size or get_batch_size()
+        self.progress_callback = progress_callback
+        self.result = ImportResult()
+
+        # Активные параметры берутся из справочника один раз на весь импорт
+        self.parameter_mapping = {}
+        for param in get_registry().active_parameters:
+            self.parameter_mapping[param.code.lower()] = param
+            self.parameter_mapping[param.name.lower()] = param
+
+        self._pending = []
+        self._started = None
+
+    def import_file(self, file, filename, delimiter=','):
+        """Импорт файла, формат определяется по расширению имени."""
+        if filename.lower().endswith('.xlsx'):
+            return self.import_xlsx(file)
+        return self.import_csv(file, delimiter)
+
+    def import_csv(self, file, delimiter=','):
+        """Импорт из бинарного файла CSV в кодировке UTF-8."""
+        reader = csv.DictReader(
+            TextIOWrapper(file, encoding='utf-8-sig'), delimiter=delimiter
+        )
+        return self.import_rows(enumerate(reader, start=2))
+
+    def import_xlsx(self, file):
+        """
+        Импорт книги Excel, прочитанной openpyxl в потоковом режиме.
+
+        Каждый лист содержит замеры одного двигателя судна: название листа
+        совпадает с названием или серийным номером двигателя. Книга
+        из одного листа с другим названием импортируется в self.engine.
+        """
+        default_engine = self.engine
+        engines = {}
+        for engine in get_registry().vessel_engines(default_engine.vessel_id):
+            engines[engine.name.strip().lower()] = engine
+            engines[engine.serial_number.strip().lower()] = engine
+
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            sheets = workbook.worksheets
+            for sheet in sheets:
+                engine = engines.get(sheet.title.strip().lower())
+                if engine is None:
+                    if len(sheets) > 1:
+                        self.result.add_error(
+                            f"Лист '{sheet.title}': не найден двигатель "
+                            f"с таким названием или серийным номером"
+                        )
+                        continue
+                    engine = default_engine
+
+                self.engine = engine
+                self.import_rows(_sheet_rows(sheet))
+        finally:
+            workbook.close()
+            self.engine = default_engine
+        return self.result
+
+    def import_rows(self, numbered_rows):
+        """
+        Импорт последовательности (номер строки, словарь значений).
+
+        Returns:
+            ImportResult: Итог импорта
+        """
+        if self._started is None:
+            self._started = time.perf_counter()
+        for row_num, row in numbered_rows:
+            self.result.rows_count += 1
+            self._process_row(row_num, row)
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+        self._flush()
+        self.result.elapsed = time.perf_counter() - self._started
+        return self.result
+
+    def _process_row(self, row_num, row):
+        add_error = self.result.add_error
+        try:
+            raw_timestamp = None
+            for key in TIME_KEYS:
+                if key in row and row.get(key):
+                    raw_timestamp = row[key]
+                    break
+
+            if not raw_timestamp:
+                add_error(f"Строка {row_num}: Не найдена колонка времени")
+                return
+
+            timestamp = self._parse_timestamp(raw_timestamp)
+            if timezone.is_naive(timestamp):
+                timestamp = timezone.make_aware(timestamp)
+
+            values = {}
+            for header, value in row.items():
+                if header is None:
+                    continue
+                header_lower = header.lower().strip()
+                value_str = str(value).strip() if value is not None else ''
+                if (
+                    header_lower in TIME_KEYS or
+                    header_lower in SKIP_KEYS or
+                    value_str.lower() in EMPTY_VALUES
+                ):
+                    continue
+
+                param_type = self._resolve_parameter(
+                    header, header_lower, value_str
+                )
+                try:
+                    param_value = parse_number(value_str)
+                except ValueError:
+                    if param_type.unit:
+                        add_error(
+                            f"Строка {row_num}: Неверное значение "
+                            f"'{value_str}' для параметра '{header}'"
+                        )
+                    else:
+                        add_error(
+                            f"Строка {row_num}: Текст "
+                            f"'{value_str}' для '{header}'"
+                        )
+                    continue
+
+                if not param_type.unit:
+                    # Числовой параметр без единиц измерения
+                    param_type.unit = DEFAULT_UNIT
+                    param_type.save(update_fields=['unit'])
+
+                if param_type.pk in values:
+                    add_error(
+                        f"Строка {row_num}: Повторное значение параметра "
+                        f"'{param_type.name}' в колонке '{header}'"
+                    )
+                    continue
+                values[param_type.pk] = param_value
+
+            if values:
+                self._pending.append((timestamp, values))
+
+        except ValueError as e:
+            add_error(f"Строка {row_num}: Неправильный формат - {str(e)}")
+        except Exception as e:  # pylint: disable=broad-except
+            add_error(f"Строка {row_num}: Неожиданная ошибка - {str(e)}")
+
+    def _parse_timestamp(self, raw_timestamp):
+        """Время из ячейки: строка в timestamp_format или дата Excel."""
+        if isinstance(raw_timestamp, datetime):
+            return raw_timestamp
+        if isinstance(raw_timestamp, date):
+            return datetime.combine(raw_timestamp, datetime.min.time())
+        return datetime.strptime(
+            str(raw_timestamp).strip(), self.timestamp_format
+        )
+
+    def _resolve_parameter(self, header, header_lower, value_str):
+        """Тип параметра для колонки; неизвестные колонки создаются один раз."""
+        param_type = self.parameter_mapping.get(header_lower)
+        if param_type is not None:
+            return param_type
+
+        unit, data_type = guess_unit(header_lower, value_str)
+        param_type, created = ParameterType.objects.get_or_create(
+            name=header.title(),
+            code=header_lower.replace(' ', '_').replace('-', '_'),
+            defaults={
+                'unit': unit,
+                'description': (
+                    f'Авто-создание из импорта. Тип: {data_type}'
+                ),
+                'is_active': True,
+            }
+        )
+        self.parameter_mapping[header_lower] = param_type
+        if created:
+            self.result.created_parameters.append(param_type)
+        return param_type
+
+    def _flush(self):
+        """Запись накопленной пачки замеров и значений."""
+        if not self._pending:
+            return
+
+        measurements = record_measurements(
+            self.engine, self._pending, self.user,
+            batch_size=self.batch_size,
+        )
+        self.result.imported_count += len(measurements)
+        self.result.values_count += sum(
+            len(values) for _, values in self._pending
+        )
+
+        self._pending = []
+        if self.progress_callback is not None:
+            self.result.elapsed = time.perf_counter() - self._started
+            self.progress_callback(self.result)
+
+
+def _sheet_rows(sheet):
+    """
+    Строки листа Excel в виде (номер строки, словарь значений).
+
+    Первая строка листа - заголовки колонок, пустые строки пропускаются.
+    """
+    rows = sheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return
+    headers = [
+        str(title).strip() if title is not None else None for title in header
+    ]
+    for row_num, values in enumerate(rows, start=2):
+        if all(value is None for value in values):
+            continue
+        yield f"{row_num} (лист {sheet.title})", dict(zip(headers, values))
@@ -0,0 +1,270 @@
+"""
+Прием замеров от судовых регистраторов данных по HTTP.
+
+Регистратор отправляет пачку записей
+{"engine": "<серийный номер>", "timestamp": "<ISO 8601>",
+"values": {"<код параметра>": число}} в одном из форматов:
+
+- application/json - массив записей или {"measurements": [...]};
+- application/x-ndjson - по записи в строке, читается потоком,
+  можно сжать gzip (Content-Encoding: gzip).
+
+Запрос подписывается заголовком Authorization: Token <ключ>
+(IngestToken). Записи проверяются по справочникам в памяти
+(monitoring.registry) и копятся; как только накопится пачка, замеры
+всех двигателей записываются record_batches - общими bulk_create
+в одной транзакции. Ошибочные записи пропускаются и попадают
+в ответ, остальные сохраняются; значения вне min/max типа параметра
+тоже сохраняются, по ним создаются тревоги (monitoring.alarms).
+"""
+import gzip
+import hashlib
+import json
+import math
+import secrets
+import time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .importers import ImportResult, get_batch_size
+from .models import IngestToken
+from .registry import get_registry
+from .services import record_batches
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/jsonl')
+
+# Ограничения одного запроса: записей, размера JSON и строки NDJSON
+# (после распаковки), байт
+MAX_RECORDS = 100_000
+MAX_JSON_SIZE = 20 * 1024 * 1024
+MAX_LINE_SIZE = 1024 * 1024
+
+
+class IngestError(Exception):
+    """Запрос нельзя разобрать целиком (формат, сжатие, ограничения)."""
+
+
+def hash_key(key):
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def create_token(user, name):
+    """
+    Новый токен регистратора.
+
+    Returns:
+        tuple: (IngestToken, ключ) - ключ больше нигде не хранится
+    """
+    key = secrets.token_urlsafe(32)
+    token = IngestToken.objects.create(
+        user=user, name=name, key_digest=hash_key(key)
+    )
+    return token, key
+
+
+def authenticate_token(request):
+    """Активный токен из заголовка Authorization или None."""
+    scheme, _, key = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'token' or not key.strip():
+        return None
+    token = IngestToken.objects.select_related('user').filter(
+        key_digest=hash_key(key.strip()), is_active=True,
+        user__is_active=True,
+    ).first()
+    if token is not None:
+        IngestToken.objects.filter(pk=token.pk).update(
+            last_used_at=timezone.now()
+        )
+    return token
+
+
+def read_records(stream, content_type, content_encoding=''):
+    """
+    Записи тела запроса по одной.
+
+    Args:
+        stream: Файлоподобный объект тела запроса (байты)
+        content_type: Тип содержимого без параметров
+        content_encoding: Значение Content-Encoding
+
+    Yields:
+        tuple: (номер записи, запись)
+
+    Raises:
+        IngestError: Неизвестное сжатие, неверный JSON или превышены
+            ограничения запроса
+    """
+    if content_encoding == 'gzip':
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    elif content_encoding not in ('', 'identity'):
+        raise IngestError(f'Неподдерживаемое сжатие: {content_encoding}')
+
+    try:
+        if content_type in NDJSON_CONTENT_TYPES:
+            records = _ndjson_records(stream)
+        else:
+            records = _json_records(stream)
+        for number, record in enumerate(records, start=1):
+            if number > MAX_RECORDS:
+                raise IngestError(
+                    f'Больше {MAX_RECORDS} записей в одном запросе'
+                )
+            yield number, record
+    except (OSError, EOFError, UnicodeDecodeError) as error:
+        raise IngestError(f'Не удалось прочитать тело запроса: {error}') \
+            from error
+
+
+def _json_records(stream):
+    data = stream.read(MAX_JSON_SIZE + 1)
+    if len(data) > MAX_JSON_SIZE:
+        raise IngestError(
+            f'JSON больше {MAX_JSON_SIZE} байт, используйте NDJSON'
+        )
+    try:
+        data = json.loads(data)
+    except ValueError as error:
+        raise IngestError(f'Неверный JSON: {error}') from error
+    if isinstance(data, dict):
+        data = data.get('measurements')
+    if not isinstance(data, list):
+        raise IngestError(
+            'Ожидается массив записей или {"measurements": [...]}'
+        )
+    return data
+
+
+def _ndjson_records(stream):
+    # Строки читаются байтами: HttpRequest дает readline, но не полный
+    # интерфейс файла для TextIOWrapper; json.loads сам декодирует UTF-8
+    while line := stream.readline(MAX_LINE_SIZE + 1):
+        if len(line) > MAX_LINE_SIZE:
+            raise IngestError(f'Строка NDJSON длиннее {MAX_LINE_SIZE} байт')
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            # Испорченная строка не мешает разбирать следующие
+            yield _InvalidRecord(f'Неверный JSON - {error}')
+
+
+class _InvalidRecord:
+    """Строка NDJSON, которую не удалось разобрать."""
+
+    def __init__(self, message):
+        self.message = message
+
+
+class MeasurementIngestor:
+    """
+    Проверка записей регистраторов и запись их пачками.
+
+    Args:
+        user: Владелец токена - автор замеров
+        batch_size: Число замеров, после которого накопленные записи
+            сохраняются
+    """
+
+    def __init__(self, user, batch_size=None):
+        self.user = user
+        self.batch_size = batch_size or get_batch_size()
+        self.result = ImportResult()
+        self.registry = get_registry()
+        self._pending = {}
+        self._pending_count = 0
+
+    def ingest(self, records):
+        """
+        Прием последовательности (номер, запись).
+
+        Returns:
+            ImportResult: Итог приема
+        """
+        started = time.perf_counter()
+        try:
+            try:
+                for number, record in records:
+                    self.result.rows_count += 1
+                    error = self._add(record)
+                    if error:
+                        self.result.add_error(f'Запись {number}: {error}')
+                    if self._pending_count >= self.batch_size:
+                        self._flush()
+            except IngestError:
+                # Тело не дочитано: проверенные до ошибки записи
+                # сохраняются. Ошибка записи пачки сюда не попадает -
+                # ее транзакция откатывается, и пачка не пишется повторно
+                self._flush()
+                raise
+            self._flush()
+        finally:
+            self.result.elapsed = time.perf_counter() - started
+        return self.result
+
+    def _add(self, record):
+        """Проверка записи и постановка в очередь; возвращает ошибку."""
+        if isinstance(record, _InvalidRecord):
+            return record.message
+        if not isinstance(record, dict):
+            return 'Запись должна быть объектом'
+
+        engine = self.registry.engines_by_serial.get(
+            str(record.get('engine', ''))
+        )
+        if engine is None:
+            return f"Неизвестный двигатель: {record.get('engine')}"
+
+        timestamp = record.get('timestamp')
+        try:
+            timestamp = parse_datetime(timestamp) if isinstance(
+                timestamp, str
+            ) else None
+        except ValueError:
+            timestamp = None
+        if timestamp is None:
+            return f"Неверное время: {record.get('timestamp')}"
+        if timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp)
+
+        raw_values = record.get('values')
+        if not isinstance(raw_values, dict) or not raw_values:
+            return 'Нет значений параметров'
+        values = {}
+        for code, value in raw_values.items():
+            parameter_type = self.registry.parameters_by_code.get(code)
+            if parameter_type is None:
+                return f'Неизвестный параметр: {code}'
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return f'Значение {code} должно быть числом'
+            try:
+                value = float(value)
+            except OverflowError:
+                value = math.inf
+            # json.loads пропускает NaN и Infinity, а база их не примет
+            if not math.isfinite(value):
+                return f'Значение {code} должно быть конечным числом'
+            # Выход за пределы не ошибка записи: такое значение отмечает
+            # тревога (monitoring.alarms)
+            values[parameter_type.pk] = value
+
+        self._pending.setdefault(engine, []).append((timestamp, values))
+        self._pending_count += 1
+        return None
+
+    def _flush(self):
+        if not self._pending:
+            return
+        # Все двигатели пачки - одной транзакцией
+        measurements = record_batches(
+            list(self._pending.items()), self.user,
+            batch_size=self.batch_size,
+        )
+        self.result.imported_count += len(measurements)
+        self.result.values_count += sum(
+            len(values)
+            for rows in self._pending.values() for _, values in rows
+        )
+        self._pending = {}
+        self._pending_count = 0
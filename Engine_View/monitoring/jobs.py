@@ -0,0 +1,141 @@
+"""
+Выполнение задач импорта вне HTTP-запроса.
+
+Режим запуска задается настройкой MONITORING_IMPORT_MODE:
+- 'thread' - пул потоков внутри процесса веб-сервера (по умолчанию);
+- 'queue' - задача только ставится в очередь, ее выполняет команда
+  process_import_jobs, запущенная отдельным процессом;
+- 'sync' - задача выполняется сразу в запросе (для тестов и отладки).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .importers import MeasurementImporter
+from .models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+MODE_THREAD = 'thread'
+MODE_QUEUE = 'queue'
+MODE_SYNC = 'sync'
+
+_executor = None
+
+
+def get_import_mode():
+    return getattr(settings, 'MONITORING_IMPORT_MODE', MODE_THREAD)
+
+
+def _get_executor():
+    global _executor  # pylint: disable=global-statement
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'MONITORING_IMPORT_WORKERS', 2),
+            thread_name_prefix='import-job',
+        )
+    return _executor
+
+
+def enqueue_import_job(job):
+    """Запуск задачи импорта в соответствии с MONITORING_IMPORT_MODE."""
+    mode = get_import_mode()
+    if mode == MODE_SYNC:
+        run_import_job(job.pk)
+    elif mode == MODE_THREAD:
+        # Поток должен увидеть уже сохраненную задачу
+        transaction.on_commit(
+            lambda: _get_executor().submit(_run_in_thread, job.pk)
+        )
+
+
+def _run_in_thread(job_id):
+    close_old_connections()
+    try:
+        run_import_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def claim_next_job():
+    """Захват самой старой задачи из очереди, None если очередь пуста."""
+    for job_id in ImportJob.objects.filter(
+        status=ImportJob.STATUS_PENDING
+    ).order_by('created_at').values_list('pk', flat=True)[:10]:
+        if _claim(job_id):
+            return job_id
+    return None
+
+
+def _claim(job_id):
+    """Перевод задачи в статус выполнения; False если ее уже забрали."""
+    return ImportJob.objects.filter(
+        pk=job_id, status=ImportJob.STATUS_PENDING
+    ).update(
+        status=ImportJob.STATUS_RUNNING, started_at=timezone.now()
+    ) == 1
+
+
+def run_import_job(job_id, claimed=False):
+    """
+    Выполнение задачи импорта с сохранением прогресса после каждой пачки.
+
+    Args:
+        job_id: Идентификатор ImportJob
+        claimed: Задача уже переведена в статус выполнения
+    """
+    if not claimed and not _claim(job_id):
+        return
+
+    job = ImportJob.objects.select_related('engine', 'created_by').get(
+        pk=job_id
+    )
+    progress_fields = [
+        'processed_bytes', 'rows_count', 'imported_count', 'values_count',
+        'error_count', 'errors', 'elapsed',
+    ]
+
+    try:
+        with job.file.open('rb') as file:
+            job.total_bytes = job.file.size
+
+            def on_progress(result):
+                job.processed_bytes = file.tell()
+                _copy_result(job, result)
+                job.save(update_fields=progress_fields)
+
+            importer = MeasurementImporter(
+                job.engine, job.created_by, job.timestamp_format,
+                progress_callback=on_progress,
+            )
+            result = importer.import_file(
+                file, job.original_name, job.delimiter
+            )
+
+        _copy_result(job, result)
+        job.processed_bytes = job.total_bytes
+        job.created_parameters = [
+            {'name': param.name, 'code': param.code, 'unit': param.unit}
+            for param in result.created_parameters
+        ]
+        job.status = ImportJob.STATUS_DONE
+        job.file.delete(save=False)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.exception('Import job %s failed', job_id)
+        job.status = ImportJob.STATUS_FAILED
+        job.message = f'Ошибка чтения файла: {str(e)}'
+
+    job.finished_at = timezone.now()
+    job.save()
+
+
+def _copy_result(job, result):
+    job.rows_count = result.rows_count
+    job.imported_count = result.imported_count
+    job.values_count = result.values_count
+    job.error_count = result.error_count
+    job.errors = result.error_rows[:ImportJob.MAX_STORED_ERRORS]
+    job.elapsed = result.elapsed
@@ -0,0 +1,122 @@
+"""
+Текущее состояние двигателей: последнее значение каждого параметра.
+
+Таблица LatestValue хранит по одной строке на пару двигатель-параметр,
+поэтому "текущие показания" читаются за O(двигатели × параметры) без
+просмотра истории замеров. Новые значения применяются так же, как
+к агрегатам (см. monitoring.rollups): импорт передает пачку целиком,
+единичные записи - сигналы post_save. При удалении или изменении
+значений последнее значение пары ищется заново по индексам замеров.
+"""
+from django.db import transaction
+
+from .models import Engine, LatestValue, ParameterValue
+from .upsert import REPLACE, upsert
+
+
+def apply_latest(rows):
+    """
+    Обновление текущих значений только что записанными значениями.
+
+    Значение заменяет текущее, если оно не старше его; при равном
+    времени побеждает более поздняя запись.
+
+    Args:
+        rows: Последовательность (engine_id, parameter_type_id,
+            timestamp, value)
+    """
+    newest = {}
+    for engine_id, parameter_type_id, timestamp, value in rows:
+        key = (engine_id, parameter_type_id)
+        current = newest.get(key)
+        if current is None or timestamp >= current[0]:
+            newest[key] = (timestamp, value)
+    if not newest:
+        return
+
+    # Условие "не старше текущего" проверяет сама база: параллельная
+    # запись более старого значения не заменит более новое
+    upsert(
+        LatestValue, ('engine', 'parameter_type', 'timestamp', 'value'),
+        (key + newest_value for key, newest_value in newest.items()),
+        ('engine', 'parameter_type'),
+        {'timestamp': REPLACE, 'value': REPLACE}, order_field='timestamp',
+    )
+
+
+def refresh_latest(engine_id, parameter_type_ids, timestamps=None):
+    """
+    Поиск последних значений параметров двигателя по сырым данным.
+
+    Args:
+        engine_id: Двигатель
+        parameter_type_ids: Параметры, значения которых удалены
+            или изменены
+        timestamps: Моменты удаленных значений; если заданы,
+            пересчитываются только текущие значения с этими моментами
+    """
+    parameter_type_ids = set(parameter_type_ids)
+    with transaction.atomic():
+        if timestamps is not None:
+            # Удаление более старого значения текущее не меняет
+            parameter_type_ids = set(LatestValue.objects.filter(
+                engine_id=engine_id,
+                parameter_type_id__in=parameter_type_ids,
+                timestamp__in=timestamps,
+            ).values_list('parameter_type_id', flat=True))
+        for parameter_type_id in parameter_type_ids:
+            row = ParameterValue.objects.filter(
+                measurement__engine_id=engine_id,
+                parameter_type_id=parameter_type_id,
+            ).order_by(
+                '-measurement__timestamp', '-measurement_id'
+            ).values_list('measurement__timestamp', 'value').first()
+
+            if row is None:
+                LatestValue.objects.filter(
+                    engine_id=engine_id, parameter_type_id=parameter_type_id
+                ).delete()
+                continue
+            LatestValue.objects.update_or_create(
+                engine_id=engine_id, parameter_type_id=parameter_type_id,
+                defaults={'timestamp': row[0], 'value': row[1]},
+            )
+
+
+def current_state(**engine_filters):
+    """
+    Текущие показания двигателей, сгруппированные по судам.
+
+    Два запроса: двигатели с судами и текущие значения с параметрами.
+
+    Args:
+        engine_filters: Lookup-ы по Engine (например, vessel_id=1)
+
+    Returns:
+        list: Словари по судам {'vessel', 'engines'}, где engines -
+            словари {'engine', 'last_timestamp', 'values'}, а values -
+            список LatestValue, отсортированный по названию параметра
+    """
+    engines = Engine.objects.filter(
+        **engine_filters
+    ).select_related('vessel').order_by('vessel__name', 'name')
+
+    values = {}
+    for latest in LatestValue.objects.filter(
+        engine__in=engines
+    ).select_related('parameter_type').order_by('parameter_type__name'):
+        values.setdefault(latest.engine_id, []).append(latest)
+
+    state = []
+    for engine in engines:
+        engine_values = values.get(engine.pk, [])
+        if not state or state[-1]['vessel'].pk != engine.vessel_id:
+            state.append({'vessel': engine.vessel, 'engines': []})
+        state[-1]['engines'].append({
+            'engine': engine,
+            'last_timestamp': max(
+                (latest.timestamp for latest in engine_values), default=None
+            ),
+            'values': engine_values,
+        })
+    return state
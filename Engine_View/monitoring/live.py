@@ -0,0 +1,177 @@
+"""
+Живое обновление графиков трендов: рассылка новых значений внутри процесса.
+
+Страница трендов открывает поток server-sent events (views.live_trends)
+по паре двигатель/параметр. Поток - асинхронный генератор, который
+ждет сообщений в своей asyncio.Queue и не обращается к базе. Новые
+значения публикуются после фиксации транзакции записи
+(services.record_batches, сигнал сохранения ParameterValue): сообщение
+для пары сериализуется один раз и раскладывается по очередям всех ее
+подписчиков через loop.call_soon_threadsafe, поэтому сотни открытых
+страниц не опрашивают базу и почти не нагружают запись.
+
+Рассылка работает в пределах одного процесса: потоки доступны только
+под ASGI-сервером (например, uvicorn Engine_View.asgi:application),
+и значения, принятые другим процессом, в них не попадают.
+"""
+import asyncio
+import json
+import threading
+
+from .series import format_labels
+
+# Сообщений в очереди подписчика; при переполнении клиент получает
+# событие reset и перезагружает график целиком
+QUEUE_SIZE = 1000
+
+# Интервал комментария-пинга, с: не дает прокси закрыть простаивающий поток
+HEARTBEAT_INTERVAL = 15
+
+# Пауза перед переподключением EventSource, мс
+RETRY_MS = 3000
+
+RESET_EVENT = 'event: reset\ndata: {}\n\n'
+
+
+class Subscription:
+    """Подписка одного потока на значения пары двигатель/параметр."""
+
+    def __init__(self, key, loop):
+        self.key = key
+        self.loop = loop
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, message):
+        """Постановка сообщения в очередь; вызывается в цикле событий."""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def drain(self, first):
+        """Все накопившиеся сообщения одной строкой для отправки."""
+        messages = [first]
+        while not self.queue.empty():
+            messages.append(self.queue.get_nowait())
+        if self.overflowed:
+            # Часть точек потеряна - клиенту нужен полный ряд
+            self.overflowed = False
+            return RESET_EVENT
+        return ''.join(messages)
+
+
+class LiveHub:
+    """Реестр подписок: (id двигателя, id типа параметра) -> подписки."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, engine_id, parameter_type_id):
+        """Новая подписка текущего цикла событий."""
+        key = (engine_id, parameter_type_id)
+        subscription = Subscription(key, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.setdefault(key, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.key)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.key]
+
+    def has_subscribers(self):
+        return bool(self._subscriptions)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(map(len, self._subscriptions.values()))
+
+    def publish(self, rows):
+        """
+        Рассылка новых значений подписчикам.
+
+        Args:
+            rows: Последовательность (id двигателя, id типа параметра,
+                время, значение)
+        """
+        if not self.has_subscribers():
+            return
+        with self._lock:
+            targets = {
+                key: list(subscriptions)
+                for key, subscriptions in self._subscriptions.items()
+            }
+
+        points = {}
+        for engine_id, parameter_type_id, timestamp, value in rows:
+            key = (engine_id, parameter_type_id)
+            if key in targets:
+                points.setdefault(key, []).append((timestamp, value))
+
+        for key, key_points in points.items():
+            message = points_message(key_points)
+            for subscription in targets[key]:
+                try:
+                    subscription.loop.call_soon_threadsafe(
+                        subscription.put, message
+                    )
+                except RuntimeError:
+                    # Цикл событий уже закрыт - поток оборвался
+                    self.unsubscribe(subscription)
+
+
+def points_message(points):
+    """Событие points с точками в формате данных графика."""
+    points.sort(key=lambda point: point[0])
+    timestamps = [int(timestamp.timestamp() * 1000) for timestamp, _ in points]
+    data = json.dumps({
+        'labels': format_labels(timestamps),
+        'timestamps': timestamps,
+        'values': [value for _, value in points],
+    })
+    return f'event: points\ndata: {data}\n\n'
+
+
+hub = LiveHub()
+
+
+def publish_values(rows):
+    """Рассылка значений (id двигателя, id параметра, время, значение)."""
+    hub.publish(rows)
+
+
+def has_subscribers():
+    """Есть ли открытые потоки; без них значения не публикуются."""
+    return hub.has_subscribers()
+
+
+async def event_stream(engine_id, parameter_type_id,
+                       heartbeat=HEARTBEAT_INTERVAL):
+    """
+    Поток server-sent events с новыми значениями параметра двигателя.
+
+    Накопившиеся к моменту отправки сообщения уходят одним куском;
+    подписка снимается, когда клиент закрывает соединение.
+
+    Yields:
+        str: Куски потока text/event-stream
+    """
+    subscription = hub.subscribe(engine_id, parameter_type_id)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    subscription.queue.get(), heartbeat
+                )
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            yield subscription.drain(message)
+    finally:
+        hub.unsubscribe(subscription)
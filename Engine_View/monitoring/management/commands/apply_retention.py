@@ -0,0 +1,59 @@
+"""Сжатие сырых значений старше сроков хранения в минутные агрегаты."""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.caching import bump_engine_versions
+from monitoring.models import Engine
+from monitoring.retention import (
+    COMPACT_BATCH_SIZE,
+    compact_values,
+    retention_plan,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Применяет политики хранения (RetentionPolicy): сырые значения '
+        'старше срока сжимаются в минутные агрегаты и удаляются пачками '
+        'в коротких транзакциях. Часовые и суточные агрегаты и текущие '
+        'значения сохраняются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--engine', default=None,
+            help='Серийный номер двигателя (по умолчанию - все двигатели)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=COMPACT_BATCH_SIZE,
+            help='Число значений в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        engines = Engine.objects.order_by('pk')
+        if options['engine']:
+            engines = engines.filter(serial_number=options['engine'])
+            if not engines.exists():
+                raise CommandError(
+                    f"Двигатель {options['engine']} не найден")
+
+        plan = retention_plan(list(engines))
+        if not plan:
+            self.stdout.write('Нет активных политик хранения')
+            return
+
+        for engine, cutoffs in plan.items():
+            for cutoff, parameter_type_ids in sorted(cutoffs.items()):
+                started = time.perf_counter()
+                values, measurements = compact_values(
+                    engine, parameter_type_ids, cutoff, options['batch_size']
+                )
+                self.stdout.write(
+                    f'{engine.serial_number} до {cutoff:%Y-%m-%d}: '
+                    f'параметров {len(parameter_type_ids)}, '
+                    f'значений {values}, замеров {measurements}, '
+                    f'{time.perf_counter() - started:.2f} с'
+                )
+            bump_engine_versions([engine.pk])
+        self.stdout.write(self.style.SUCCESS('Политики хранения применены'))
@@ -0,0 +1,68 @@
+"""Перенос старых замеров в файловый архив по месяцам."""
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from monitoring.archive import archive_month, month_start
+from monitoring.models import Engine
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит замеры старше заданной даты в файлы архива '
+        '(MONITORING_ARCHIVE_ROOT) целыми месяцами UTC. Агрегаты '
+        'и графики за архивные периоды сохраняются.'
+    )
+
+    def add_arguments(self, parser):
+        cutoff = parser.add_mutually_exclusive_group(required=True)
+        cutoff.add_argument(
+            '--before',
+            help='Дата ГГГГ-ММ-ДД: переносятся месяцы, закончившиеся '
+                 'до ее месяца',
+        )
+        cutoff.add_argument(
+            '--keep-days', type=int,
+            help='Оставить в базе замеры за столько последних дней '
+                 '(с округлением до начала месяца)',
+        )
+        parser.add_argument(
+            '--engine', default=None,
+            help='Серийный номер двигателя (по умолчанию - все двигатели)',
+        )
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                cutoff = datetime.strptime(options['before'], '%Y-%m-%d')
+            except ValueError as error:
+                raise CommandError(f'Неверная дата: {error}') from error
+            cutoff = cutoff.replace(tzinfo=dt_timezone.utc)
+        else:
+            cutoff = timezone.now() - timedelta(days=options['keep_days'])
+        cutoff = month_start(cutoff)
+
+        engines = Engine.objects.order_by('pk')
+        if options['engine']:
+            engines = engines.filter(serial_number=options['engine'])
+            if not engines.exists():
+                raise CommandError(
+                    f"Двигатель {options['engine']} не найден")
+
+        for engine in engines:
+            months = engine.measurements.filter(
+                timestamp__lt=cutoff
+            ).datetimes('timestamp', 'month', tzinfo=dt_timezone.utc)
+            for start in months:
+                started = time.perf_counter()
+                archived = archive_month(engine, start)
+                self.stdout.write(
+                    f'{engine.serial_number} {start:%Y-%m}: '
+                    f'замеров {archived}, '
+                    f'{time.perf_counter() - started:.2f} с'
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'Замеры до {cutoff:%Y-%m-%d} перенесены в архив'
+        ))
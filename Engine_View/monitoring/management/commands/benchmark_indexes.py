@@ -0,0 +1,192 @@
+"""Бенчмарк индексов замеров: планы EXPLAIN и время запросов."""
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Avg, Count, Max, Min
+from django.utils import timezone
+
+from monitoring.models import (
+    Engine,
+    Measurement,
+    ParameterType,
+    ParameterValue,
+    Vessel,
+)
+from monitoring.pagination import older_than
+from monitoring.series import series_queryset
+
+BATCH_SIZE = 5000
+
+# Сколько раз выполняется каждый запрос; берется лучшее время
+REPEATS = 3
+
+
+class _Rollback(Exception):
+    """Откат транзакции с синтетическими данными после замеров."""
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает планы и время запросов списка, рядов и статистики '
+        'с индексами monitoring и без них. Синтетические данные создаются '
+        'в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--values', type=int, default=5_000_000,
+            help='Общее число значений параметров',
+        )
+        parser.add_argument(
+            '--parameters', type=int, default=10,
+            help='Параметров в каждом замере',
+        )
+        parser.add_argument(
+            '--engines', type=int, default=4,
+            help='Число двигателей',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, options):
+        started = time.perf_counter()
+        engines, parameters = self._generate(
+            options['values'], options['parameters'], options['engines']
+        )
+        self.stdout.write(
+            f'Генерация {options["values"]} значений: '
+            f'{time.perf_counter() - started:.1f} с'
+        )
+
+        queries = self._queries(engines[0], parameters[0])
+        self._measure('С индексами', queries)
+
+        # В SQLite schema_editor нельзя открыть внутри транзакции,
+        # поэтому берется только его шаблон удаления индекса
+        template = connection.schema_editor().sql_delete_index
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            for model in (Measurement, ParameterValue):
+                for index in model._meta.indexes:
+                    cursor.execute(template % {
+                        'table': quote(model._meta.db_table),
+                        'name': quote(index.name),
+                    })
+        self._measure('Без индексов', queries)
+
+    def _generate(self, total_values, parameters_count, engines_count):
+        """Минутные замеры всех двигателей с полным набором параметров."""
+        vessel = Vessel.objects.create(name='Benchmark', imo_number='BENCH')
+        engines = [
+            Engine.objects.create(
+                vessel=vessel, name=f'Benchmark {number}', model='BENCH',
+                serial_number=f'BENCH-{number}',
+            )
+            for number in range(engines_count)
+        ]
+        parameters = [
+            ParameterType.objects.create(
+                name=f'Benchmark {number}', code=f'bench_{number}', unit='°C'
+            )
+            for number in range(parameters_count)
+        ]
+
+        rows = total_values // parameters_count
+        minutes = rows // engines_count
+        start = timezone.now() - timedelta(minutes=minutes)
+        values = np.random.default_rng(0).normal(80, 5, BATCH_SIZE)
+
+        for offset in range(0, rows, BATCH_SIZE):
+            measurements = Measurement.objects.bulk_create([
+                Measurement(
+                    engine=engines[row % engines_count],
+                    timestamp=start + timedelta(minutes=row // engines_count),
+                )
+                for row in range(offset, min(offset + BATCH_SIZE, rows))
+            ])
+            ParameterValue.objects.bulk_create([
+                ParameterValue(
+                    measurement=measurement,
+                    parameter_type=parameter,
+                    value=float(values[i]),
+                )
+                for i, measurement in enumerate(measurements)
+                for parameter in parameters
+            ], batch_size=BATCH_SIZE)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return engines, parameters
+
+    @staticmethod
+    def _queries(engine, parameter):
+        """Запросы в том виде, в котором их строят представления."""
+        now = timezone.now()
+        middle = Measurement.objects.filter(engine=engine).order_by(
+            'timestamp'
+        ).values_list('timestamp', flat=True)
+        middle = middle[middle.count() // 2]
+        return {
+            'Список: первая страница': Measurement.objects.order_by(
+                '-timestamp', '-pk'
+            )[:50],
+            'Список двигателя: глубокая страница': older_than(
+                Measurement.objects.filter(engine=engine), middle, 0
+            ).order_by('-timestamp', '-pk')[:50],
+            'Список судна за неделю': Measurement.objects.filter(
+                engine__vessel_id=engine.vessel_id,
+                timestamp__gte=now - timedelta(days=7),
+            ).order_by('-timestamp', '-pk')[:50],
+            'Ряд параметра за 30 дней': series_queryset(parameter, {
+                'engine_id': engine.pk,
+                'timestamp__gte': now - timedelta(days=30),
+            }),
+            'Статистика двигателя за 30 дней': ParameterValue.objects.filter(
+                measurement__engine=engine,
+                measurement__timestamp__gte=now - timedelta(days=30),
+            ).values('parameter_type').annotate(
+                count=Count('id'), avg=Avg('value'),
+                min=Min('value'), max=Max('value'),
+            ),
+        }
+
+    def _measure(self, title, queries):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for name, queryset in queries.items():
+            timings = []
+            for _ in range(REPEATS):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append(time.perf_counter() - started)
+            self.stdout.write(self.style.SUCCESS(
+                f'  {name}: {min(timings) * 1000:.1f} мс'
+            ))
+            for line in self._explain(queryset, title):
+                self.stdout.write(f'    {line}')
+
+    @staticmethod
+    def _explain(queryset, title):
+        """
+        План запроса.
+
+        QuerySet.explain() в SQLite возвращает план из кэша
+        подготовленных выражений, даже если индексы уже удалены, поэтому
+        текст запроса делается уникальным комментарием.
+        """
+        sql, params = queryset.query.sql_with_params()
+        prefix = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql} /* {title} */', params)
+            return [
+                ' '.join(str(column) for column in row)
+                for row in cursor.fetchall()
+            ]
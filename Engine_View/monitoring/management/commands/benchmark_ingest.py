@@ -0,0 +1,126 @@
+"""Нагрузочная проверка API приема замеров на синтетических данных."""
+import gzip
+import json
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+
+from monitoring.ingest import create_token
+from monitoring.models import Engine, ParameterType, Vessel
+from monitoring.views import ingest_api
+
+
+class _Rollback(Exception):
+    """Откат транзакции с синтетическими данными после замеров."""
+
+
+class Command(BaseCommand):
+    help = (
+        'Отправляет пачки gzip NDJSON в api/ingest/ в этом процессе '
+        '(один воркер) и печатает пропускную способность в значениях '
+        'в секунду. Синтетические данные создаются в транзакции '
+        'и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=20,
+            help='Число запросов',
+        )
+        parser.add_argument(
+            '--records', type=int, default=500,
+            help='Записей (замеров) в одном запросе',
+        )
+        parser.add_argument(
+            '--parameters', type=int, default=20,
+            help='Параметров в каждой записи',
+        )
+        parser.add_argument(
+            '--engines', type=int, default=4,
+            help='Число двигателей, между которыми делятся записи',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, options):
+        vessel = Vessel.objects.create(name='Benchmark', imo_number='BENCH')
+        engines = [
+            Engine.objects.create(
+                vessel=vessel, name=f'Benchmark {number}', model='BENCH',
+                serial_number=f'BENCH-{number}',
+            )
+            for number in range(options['engines'])
+        ]
+        codes = [
+            ParameterType.objects.create(
+                name=f'Benchmark {number}', code=f'bench_{number}', unit='°C'
+            ).code
+            for number in range(options['parameters'])
+        ]
+        user = User.objects.create_user('benchmark-ingest')
+        _, key = create_token(user, 'Benchmark')
+
+        bodies = self._bodies(
+            engines, codes, options['requests'], options['records']
+        )
+        factory = RequestFactory()
+        path = reverse('monitoring:ingest_api')
+
+        total_values = 0
+        started = time.perf_counter()
+        for body in bodies:
+            request = factory.post(
+                path, body, content_type='application/x-ndjson',
+                HTTP_CONTENT_ENCODING='gzip',
+                HTTP_AUTHORIZATION=f'Token {key}',
+            )
+            response = json.loads(ingest_api(request).content)
+            if response['error'] or response['error_count']:
+                self.stderr.write(str(response['error'] or response['errors']))
+                return
+            total_values += response['values']
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{options['requests']} запросов × {options['records']} записей "
+            f"× {options['parameters']} параметров: {elapsed:.2f} с"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'  {total_values / elapsed:,.0f} значений/с, '
+            f"{options['requests'] * options['records'] / elapsed:,.0f} "
+            f'замеров/с'
+        ))
+
+    @staticmethod
+    def _bodies(engines, codes, requests, records):
+        """Сжатые тела запросов: поминутные записи по кругу двигателей."""
+        generator = np.random.default_rng(0)
+        start = timezone.now() - timedelta(minutes=requests * records)
+        bodies = []
+        for request_number in range(requests):
+            lines = []
+            values = generator.normal(80, 5, (records, len(codes)))
+            for number in range(records):
+                position = request_number * records + number
+                lines.append(json.dumps({
+                    'engine': engines[position % len(engines)].serial_number,
+                    'timestamp': (
+                        start + timedelta(minutes=position)
+                    ).isoformat(),
+                    'values': dict(zip(codes, values[number].round(2).tolist())),
+                }))
+            bodies.append(gzip.compress('\n'.join(lines).encode('utf-8')))
+        return bodies
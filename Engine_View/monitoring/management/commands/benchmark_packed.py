@@ -0,0 +1,211 @@
+"""Бенчмарк компактного хранения: объем и скорость чтения рядов."""
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from monitoring.models import (
+    Engine,
+    Measurement,
+    ParameterType,
+    ParameterValue,
+    Vessel,
+)
+from monitoring.packed import (
+    layout_for,
+    pack_values,
+    packed_columns,
+    packed_rows,
+)
+from monitoring.series import (
+    FETCH_CHUNK_SIZE,
+    Series,
+    fetch_packed_series,
+    fetch_series,
+)
+
+BATCH_SIZE = 5000
+
+# Сколько раз выполняется каждое чтение; берется лучшее время
+REPEATS = 3
+
+
+class _Rollback(Exception):
+    """Откат транзакции с синтетическими данными после замеров."""
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает объем и скорость чтения значений в строках '
+        'ParameterValue и в упакованных массивах замеров. Синтетические '
+        'данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--measurements', type=int, default=200_000,
+            help='Число замеров',
+        )
+        parser.add_argument(
+            '--parameters', type=int, default=10,
+            help='Параметров в каждом замере',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options['measurements'], options['parameters'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, measurements, parameters_count):
+        started = time.perf_counter()
+        engine, parameters = self._generate(measurements, parameters_count)
+        self.stdout.write(
+            f'Генерация {measurements} замеров × {parameters_count} '
+            f'параметров: {time.perf_counter() - started:.1f} с'
+        )
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Объем'))
+        rows_size = self._table_size(ParameterValue)
+        self.stdout.write(
+            f'  Строки ParameterValue с индексами: {self._mb(rows_size)}'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT SUM(LENGTH(packed_values)) FROM '
+                f'{connection.ops.quote_name(Measurement._meta.db_table)}'
+            )
+            packed_size = cursor.fetchone()[0] or 0
+        self.stdout.write(
+            f'  Упакованные массивы: {self._mb(packed_size)}'
+            + (f' ({rows_size / packed_size:.1f}x меньше)'
+               if rows_size and packed_size else '')
+        )
+
+        filters = {'engine_id': engine.pk}
+        parameter = parameters[0]
+        self.stdout.write(self.style.MIGRATE_HEADING('Чтение'))
+        self._measure('Ряд одного параметра, строки', lambda: fetch_series(
+            parameter, filters
+        ))
+        self._measure('Ряд одного параметра, массивы', lambda: (
+            fetch_packed_series(parameter, filters)
+        ))
+        self._measure('Все параметры, строки', lambda: self._row_columns(
+            filters
+        ))
+        self._measure('Все параметры, массивы', lambda: packed_columns(
+            packed_rows(filters).iterator(chunk_size=FETCH_CHUNK_SIZE)
+        ))
+
+    @staticmethod
+    def _generate(measurements, parameters_count):
+        """Минутные замеры одного двигателя, строки и массивы сразу."""
+        vessel = Vessel.objects.create(name='Benchmark', imo_number='BENCH')
+        engine = Engine.objects.create(
+            vessel=vessel, name='Benchmark', model='BENCH',
+            serial_number='BENCH',
+        )
+        parameters = [
+            ParameterType.objects.create(
+                name=f'Benchmark {number}', code=f'bench_{number}', unit='°C'
+            )
+            for number in range(parameters_count)
+        ]
+        layout = layout_for([parameter.pk for parameter in parameters])
+
+        start = timezone.now() - timedelta(minutes=measurements)
+        generator = np.random.default_rng(0)
+        for offset in range(0, measurements, BATCH_SIZE):
+            count = min(BATCH_SIZE, measurements - offset)
+            values = generator.normal(80, 5, (count, parameters_count))
+            rows = [
+                {
+                    parameter.pk: float(value)
+                    for parameter, value in zip(parameters, row)
+                }
+                for row in values
+            ]
+            created = Measurement.objects.bulk_create([
+                Measurement(
+                    engine=engine,
+                    timestamp=start + timedelta(minutes=offset + i),
+                    layout=layout,
+                    packed_values=pack_values(layout, row),
+                )
+                for i, row in enumerate(rows)
+            ])
+            ParameterValue.objects.bulk_create([
+                ParameterValue(
+                    measurement=measurement,
+                    parameter_type_id=parameter_type_id,
+                    value=value,
+                )
+                for measurement, row in zip(created, rows)
+                for parameter_type_id, value in row.items()
+            ], batch_size=BATCH_SIZE)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return engine, parameters
+
+    @staticmethod
+    def _row_columns(filters):
+        """Все столбцы из строк ParameterValue - для сравнения."""
+        lookups = {
+            f'measurement__{key}': value for key, value in filters.items()
+        }
+        columns = {}
+        rows = ParameterValue.objects.filter(**lookups).order_by(
+            'measurement__timestamp'
+        ).values_list('parameter_type_id', 'measurement__timestamp', 'value')
+        for parameter_type_id, timestamp, value in rows.iterator(
+            chunk_size=FETCH_CHUNK_SIZE
+        ):
+            column = columns.setdefault(parameter_type_id, ([], []))
+            column[0].append(timestamp)
+            column[1].append(value)
+        return {
+            parameter_type_id: Series(
+                pd.DatetimeIndex(timestamps).as_unit('ms').asi8,
+                np.asarray(values, dtype=np.float64),
+            )
+            for parameter_type_id, (timestamps, values) in columns.items()
+        }
+
+    @staticmethod
+    def _table_size(model):
+        """Размер таблицы вместе с индексами в байтах, если известен."""
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT pg_total_relation_size(%s)', [table])
+                return cursor.fetchone()[0]
+            if connection.vendor == 'sqlite':
+                cursor.execute(
+                    'SELECT SUM(pgsize) FROM dbstat WHERE name IN ('
+                    'SELECT name FROM sqlite_master WHERE tbl_name = %s)',
+                    [table],
+                )
+                return cursor.fetchone()[0]
+        return None
+
+    @staticmethod
+    def _mb(size):
+        return 'н/д' if size is None else f'{size / 1024 / 1024:.1f} МБ'
+
+    def _measure(self, name, read):
+        timings = []
+        for _ in range(REPEATS):
+            started = time.perf_counter()
+            read()
+            timings.append(time.perf_counter() - started)
+        self.stdout.write(self.style.SUCCESS(
+            f'  {name}: {min(timings) * 1000:.1f} мс'
+        ))
@@ -0,0 +1,144 @@
+"""Бенчмарк построения рядов для графиков на синтетических данных."""
+import json
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from monitoring.models import (
+    Engine,
+    Measurement,
+    ParameterType,
+    ParameterValue,
+    Vessel,
+)
+from monitoring.series import fetch_series, serialize_series
+
+BATCH_SIZE = 5000
+
+
+class _Rollback(Exception):
+    """Откат транзакции с синтетическими данными после замеров."""
+
+
+class _QueryCounter:
+    """Счетчик SQL-запросов, не зависящий от лимита connection.queries."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время построения ряда параметра на 10k/100k/1M точек. '
+        'Синтетические данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--points', type=int, nargs='+',
+            default=[10_000, 100_000, 1_000_000],
+            help='Размеры рядов для замера',
+        )
+        parser.add_argument(
+            '--legacy-limit', type=int, default=10_000,
+            help='Максимальный размер ряда для замера старого '
+                 'поштучного алгоритма (0 - не замерять)',
+        )
+
+    def handle(self, *args, **options):
+        for points in options['points']:
+            try:
+                with transaction.atomic():
+                    self._run(points, options['legacy_limit'])
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+    def _run(self, points, legacy_limit):
+        vessel = Vessel.objects.create(
+            name='Benchmark', imo_number=f'BENCH-{points}')
+        engine = Engine.objects.create(
+            vessel=vessel, name='Benchmark', model='BENCH',
+            serial_number=f'BENCH-{points}')
+        parameter = ParameterType.objects.create(
+            name='Benchmark', code=f'bench_{points}', unit='°C')
+
+        started = time.perf_counter()
+        self._generate(engine, parameter, points)
+        self.stdout.write(
+            f'{points} точек: генерация {time.perf_counter() - started:.2f} с')
+
+        filters = {'engine_id': engine.pk}
+        queries = _QueryCounter()
+        with connection.execute_wrapper(queries):
+            started = time.perf_counter()
+            series = fetch_series(parameter, filters)
+            fetched = time.perf_counter()
+            payload = json.dumps(serialize_series(series, parameter))
+            finished = time.perf_counter()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'  fetch_series: {fetched - started:.3f} с, '
+            f'сериализация: {finished - fetched:.3f} с, '
+            f'запросов: {queries.count}, '
+            f'JSON: {len(payload) / 1024 / 1024:.1f} МБ'
+        ))
+
+        if legacy_limit and points <= legacy_limit:
+            started = time.perf_counter()
+            legacy_queries = self._legacy(engine, parameter)
+            self.stdout.write(
+                f'  поштучный алгоритм: '
+                f'{time.perf_counter() - started:.3f} с, '
+                f'запросов: {legacy_queries}'
+            )
+
+    @staticmethod
+    def _generate(engine, parameter, points):
+        """Минутные замеры с синусоидой и шумом."""
+        start = timezone.now() - timedelta(minutes=points)
+        values = 80 + 5 * np.sin(np.arange(points) / 60) \
+            + np.random.default_rng(0).normal(0, 0.5, points)
+
+        for offset in range(0, points, BATCH_SIZE):
+            measurements = Measurement.objects.bulk_create([
+                Measurement(
+                    engine=engine,
+                    timestamp=start + timedelta(minutes=i),
+                )
+                for i in range(offset, min(offset + BATCH_SIZE, points))
+            ])
+            ParameterValue.objects.bulk_create([
+                ParameterValue(
+                    measurement=measurement,
+                    parameter_type=parameter,
+                    value=float(values[offset + i]),
+                )
+                for i, measurement in enumerate(measurements)
+            ])
+
+    @staticmethod
+    def _legacy(engine, parameter):
+        """Старый алгоритм: отдельный запрос значения на каждый замер."""
+        queries = _QueryCounter()
+        with connection.execute_wrapper(queries):
+            labels = []
+            values = []
+            for measurement in engine.measurements.order_by('timestamp'):
+                param_value = measurement.parameter_values.filter(
+                    parameter_type=parameter
+                ).first()
+                if param_value:
+                    labels.append(
+                        measurement.timestamp.strftime('%d.%m.%Y %H:%M'))
+                    values.append(float(param_value.value))
+            json.dumps({'labels': labels, 'values': values})
+        return queries.count
@@ -0,0 +1,31 @@
+"""Создание токена регистратора данных для API приема замеров."""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.ingest import create_token
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает токен для api/ingest/ и печатает ключ. Ключ хранится '
+        'только в виде хэша и больше нигде не показывается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Пользователь - автор замеров')
+        parser.add_argument(
+            '--name', default='Регистратор', help='Название токена'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist as error:
+            raise CommandError(
+                f"Пользователь {options['username']} не найден"
+            ) from error
+
+        token, key = create_token(user, options['name'])
+        self.stdout.write(f'Токен "{token.name}" для {user.username}:')
+        self.stdout.write(self.style.SUCCESS(key))
+        self.stdout.write(f'Заголовок запроса: Authorization: Token {key}')
@@ -0,0 +1,67 @@
+"""Проверка истории значений на нарушения пределов и аномалии."""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.alarms import save_alarms, series_alarms
+from monitoring.models import Engine
+from monitoring.registry import get_registry
+from monitoring.series import fetch_series
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет ряды параметров двигателей целиком (вместе с архивом) '
+        'и записывает тревоги (monitoring.alarms). Уже записанные '
+        'тревоги не дублируются; нужно после изменения пределов '
+        'параметров или импорта истории.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--engine', default=None,
+            help='Серийный номер двигателя (по умолчанию - все двигатели)',
+        )
+        parser.add_argument(
+            '--parameter', default=None,
+            help='Код параметра (по умолчанию - все параметры)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Число тревог в одной пачке записи',
+        )
+
+    def handle(self, *args, **options):
+        engines = Engine.objects.order_by('pk')
+        if options['engine']:
+            engines = engines.filter(serial_number=options['engine'])
+            if not engines.exists():
+                raise CommandError(
+                    f"Двигатель {options['engine']} не найден")
+
+        parameters = get_registry().parameters
+        if options['parameter']:
+            parameters = [
+                param for param in parameters
+                if param.code == options['parameter']
+            ]
+            if not parameters:
+                raise CommandError(
+                    f"Параметр {options['parameter']} не найден")
+
+        for engine in engines:
+            started = time.perf_counter()
+            points = 0
+            found = 0
+            for parameter_type in parameters:
+                series = fetch_series(parameter_type, {'engine_id': engine.pk})
+                points += len(series)
+                found += save_alarms(series_alarms(
+                    engine.pk, parameter_type, series.timestamps,
+                    series.values,
+                ), options['batch_size'])
+            self.stdout.write(
+                f'{engine.serial_number}: значений {points}, '
+                f'тревог {found}, {time.perf_counter() - started:.2f} с'
+            )
+        self.stdout.write(self.style.SUCCESS('Проверка завершена'))
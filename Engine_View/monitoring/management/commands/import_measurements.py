@@ -0,0 +1,67 @@
+"""Импорт замеров двигателя из CSV или Excel (.xlsx) файла."""
+import resource
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.importers import MeasurementImporter
+from monitoring.models import Engine
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует замеры двигателя из CSV или Excel (.xlsx) файла '
+        'пачками bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу')
+        parser.add_argument(
+            '--engine', required=True,
+            help='Серийный номер двигателя (для книг Excel - двигатель '
+                 'по умолчанию; листы с названием или серийным номером '
+                 'другого двигателя судна импортируются в него)',
+        )
+        parser.add_argument(
+            '--timestamp-format', default='%Y-%m-%d %H:%M:%S',
+            help='Формат даты/времени для strptime',
+        )
+        parser.add_argument('--delimiter', default=',')
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Число строк в одной пачке записи',
+        )
+        parser.add_argument(
+            '--user', default=None,
+            help='Имя пользователя, от которого выполняется импорт',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            engine = Engine.objects.get(serial_number=options['engine'])
+        except Engine.DoesNotExist as e:
+            raise CommandError(
+                f"Двигатель {options['engine']} не найден") from e
+
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+
+        importer = MeasurementImporter(
+            engine, user, options['timestamp_format'], options['batch_size']
+        )
+        with open(options['path'], 'rb') as file:
+            result = importer.import_file(
+                file, options['path'], options['delimiter'])
+
+        for error in result.error_rows[:20]:
+            self.stderr.write(error)
+        # ru_maxrss в Linux возвращается в килобайтах
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано замеров: {result.imported_count}, '
+            f'значений: {result.values_count}, '
+            f'ошибок: {result.error_count}, '
+            f'{result.elapsed:.2f} с ({result.rows_per_second:.0f} строк/с), '
+            f'пик RSS: {peak_rss:.0f} МБ'
+        ))
@@ -0,0 +1,45 @@
+"""Заполнение упакованных значений замеров для компактного режима."""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.models import Engine, Measurement
+from monitoring.packed import pack_measurements
+
+
+class Command(BaseCommand):
+    help = (
+        'Упаковывает значения параметров замеров в массивы float64 '
+        '(MONITORING_PACKED_VALUES). Нужно выполнить после включения '
+        'компактного режима и после изменений данных в обход ORM.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--engine', default=None,
+            help='Серийный номер двигателя (по умолчанию - все двигатели)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Число замеров в одной пачке записи',
+        )
+
+    def handle(self, *args, **options):
+        engines = Engine.objects.order_by('pk')
+        if options['engine']:
+            engines = engines.filter(serial_number=options['engine'])
+            if not engines.exists():
+                raise CommandError(
+                    f"Двигатель {options['engine']} не найден")
+
+        for engine in engines:
+            started = time.perf_counter()
+            packed = pack_measurements(
+                Measurement.objects.filter(engine=engine),
+                options['batch_size'],
+            )
+            self.stdout.write(
+                f'{engine.serial_number}: замеров {packed}, '
+                f'{time.perf_counter() - started:.2f} с'
+            )
+        self.stdout.write(self.style.SUCCESS('Значения упакованы'))
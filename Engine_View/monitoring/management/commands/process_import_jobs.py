@@ -0,0 +1,32 @@
+"""Обработчик очереди задач импорта (режим MONITORING_IMPORT_MODE='queue')."""
+import time
+
+from django.core.management.base import BaseCommand
+
+from monitoring.jobs import claim_next_job, run_import_job
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задачи импорта из очереди по одной.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обработать все задачи в очереди и завершиться',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=2.0,
+            help='Пауза между проверками пустой очереди, с',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job_id = claim_next_job()
+            if job_id is None:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+
+            self.stdout.write(f'Задача импорта #{job_id}...')
+            run_import_job(job_id, claimed=True)
@@ -0,0 +1,43 @@
+"""Полная пересборка часовых и суточных агрегатов значений."""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.models import Engine
+from monitoring.rollups import DAY, HOUR, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает часовые и суточные агрегаты значений параметров '
+        'из сырых данных. Нужно выполнить один раз после миграции и после '
+        'изменений данных в обход ORM.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--engine', default=None,
+            help='Серийный номер двигателя (по умолчанию - все двигатели)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Число агрегатов в одной пачке записи',
+        )
+
+    def handle(self, *args, **options):
+        engines = Engine.objects.order_by('pk')
+        if options['engine']:
+            engines = engines.filter(serial_number=options['engine'])
+            if not engines.exists():
+                raise CommandError(
+                    f"Двигатель {options['engine']} не найден")
+
+        for engine in engines:
+            started = time.perf_counter()
+            created = rebuild_rollups(engine, options['batch_size'])
+            self.stdout.write(
+                f'{engine.serial_number}: часовых {created[HOUR]}, '
+                f'суточных {created[DAY]}, '
+                f'{time.perf_counter() - started:.2f} с'
+            )
+        self.stdout.write(self.style.SUCCESS('Агрегаты пересобраны'))
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0004_parametertype_remove_measurement_coolant_temperature_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='imports/%Y/%m/', verbose_name='Файл')),
+                ('original_name', models.CharField(max_length=255, verbose_name='Имя файла')),
+                ('timestamp_format', models.CharField(max_length=50, verbose_name='Формат даты/времени')),
+                ('delimiter', models.CharField(default=',', max_length=5, verbose_name='Разделитель')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Завершен'), ('failed', 'Ошибка')], db_index=True, default='pending', max_length=10, verbose_name='Статус')),
+                ('total_bytes', models.BigIntegerField(default=0, verbose_name='Размер файла')),
+                ('processed_bytes', models.BigIntegerField(default=0, verbose_name='Обработано байт')),
+                ('rows_count', models.PositiveIntegerField(default=0, verbose_name='Прочитано строк')),
+                ('imported_count', models.PositiveIntegerField(default=0, verbose_name='Импортировано замеров')),
+                ('values_count', models.PositiveIntegerField(default=0, verbose_name='Импортировано значений')),
+                ('error_count', models.PositiveIntegerField(default=0, verbose_name='Ошибок')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='Ошибки строк')),
+                ('created_parameters', models.JSONField(blank=True, default=list, verbose_name='Созданные параметры')),
+                ('elapsed', models.FloatField(default=0, verbose_name='Время выполнения, с')),
+                ('message', models.TextField(blank=True, verbose_name='Сообщение')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Кто загрузил')),
+                ('engine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to='monitoring.engine', verbose_name='Двигатель')),
+            ],
+            options={
+                'verbose_name': 'Задача импорта',
+                'verbose_name_plural': 'Задачи импорта',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
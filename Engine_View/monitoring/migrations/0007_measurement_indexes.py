@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0006_chunkedupload'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(fields=['engine', 'timestamp'], name='monitoring_meas_engine_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(fields=['timestamp', 'id'], name='monitoring_meas_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parametervalue',
+            index=models.Index(fields=['parameter_type', 'measurement', 'value'], name='monitoring_pv_type_meas_idx'),
+        ),
+    ]
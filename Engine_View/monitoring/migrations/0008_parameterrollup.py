@@ -0,0 +1,88 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:57
+
+from datetime import timezone as dt_timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDay, TruncHour
+
+
+def fill_rollups(apps, schema_editor):
+    """Часовые и суточные агрегаты уже сохраненных значений."""
+    Engine = apps.get_model('monitoring', 'Engine')
+    ParameterValue = apps.get_model('monitoring', 'ParameterValue')
+    ParameterRollup = apps.get_model('monitoring', 'ParameterRollup')
+
+    for engine_id in Engine.objects.values_list('pk', flat=True):
+        hourly = ParameterValue.objects.filter(
+            measurement__engine_id=engine_id
+        ).values(
+            'parameter_type_id',
+            hour=TruncHour('measurement__timestamp', tzinfo=dt_timezone.utc),
+        ).annotate(
+            total_count=Count('id'), low=Min('value'),
+            high=Max('value'), total=Sum('value'),
+            squares=Sum(F('value') * F('value')),
+        ).order_by()
+        ParameterRollup.objects.bulk_create((
+            ParameterRollup(
+                engine_id=engine_id,
+                parameter_type_id=row['parameter_type_id'],
+                resolution='hour', bucket=row['hour'],
+                count=row['total_count'], min=row['low'], max=row['high'],
+                sum=row['total'], sum_squares=row['squares'],
+            )
+            for row in hourly.iterator(chunk_size=5000)
+        ), batch_size=1000)
+
+        # Суточные - из часовых, как в rollups.rebuild_rollups
+        daily = ParameterRollup.objects.filter(
+            engine_id=engine_id, resolution='hour'
+        ).values(
+            'parameter_type_id', day=TruncDay('bucket', tzinfo=dt_timezone.utc),
+        ).annotate(
+            total_count=Sum('count'), low=Min('min'), high=Max('max'),
+            total=Sum('sum'), squares=Sum('sum_squares'),
+        ).order_by()
+        ParameterRollup.objects.bulk_create([
+            ParameterRollup(
+                engine_id=engine_id,
+                parameter_type_id=row['parameter_type_id'],
+                resolution='day', bucket=row['day'],
+                count=row['total_count'], min=row['low'], max=row['high'],
+                sum=row['total'], sum_squares=row['squares'],
+            )
+            for row in daily
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0007_measurement_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParameterRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('hour', 'Час'), ('day', 'Сутки')], max_length=4, verbose_name='Интервал')),
+                ('bucket', models.DateTimeField(verbose_name='Начало интервала')),
+                ('count', models.PositiveIntegerField(verbose_name='Число значений')),
+                ('min', models.FloatField(verbose_name='Минимум')),
+                ('max', models.FloatField(verbose_name='Максимум')),
+                ('sum', models.FloatField(verbose_name='Сумма')),
+                ('sum_squares', models.FloatField(verbose_name='Сумма квадратов')),
+                ('engine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='monitoring.engine', verbose_name='Двигатель')),
+                ('parameter_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='monitoring.parametertype', verbose_name='Тип параметра')),
+            ],
+            options={
+                'verbose_name': 'Агрегат параметра',
+                'verbose_name_plural': 'Агрегаты параметров',
+                'constraints': [models.UniqueConstraint(fields=('parameter_type', 'resolution', 'engine', 'bucket'), name='monitoring_rollup_unique')],
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
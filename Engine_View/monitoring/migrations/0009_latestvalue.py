@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-17 03:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_latest_values(apps, schema_editor):
+    """Заполнение текущих значений из уже сохраненных замеров."""
+    Engine = apps.get_model('monitoring', 'Engine')
+    ParameterType = apps.get_model('monitoring', 'ParameterType')
+    ParameterValue = apps.get_model('monitoring', 'ParameterValue')
+    LatestValue = apps.get_model('monitoring', 'LatestValue')
+
+    parameter_type_ids = list(ParameterType.objects.values_list('pk', flat=True))
+    latest = []
+    for engine_id in Engine.objects.values_list('pk', flat=True):
+        for parameter_type_id in parameter_type_ids:
+            row = ParameterValue.objects.filter(
+                measurement__engine_id=engine_id,
+                parameter_type_id=parameter_type_id,
+            ).order_by(
+                '-measurement__timestamp', '-measurement_id'
+            ).values_list('measurement__timestamp', 'value').first()
+            if row is not None:
+                latest.append(LatestValue(
+                    engine_id=engine_id, parameter_type_id=parameter_type_id,
+                    timestamp=row[0], value=row[1],
+                ))
+    LatestValue.objects.bulk_create(latest, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0008_parameterrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(verbose_name='Время замера')),
+                ('value', models.FloatField(verbose_name='Значение')),
+                ('engine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='latest_values', to='monitoring.engine', verbose_name='Двигатель')),
+                ('parameter_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='monitoring.parametertype', verbose_name='Тип параметра')),
+            ],
+            options={
+                'verbose_name': 'Текущее значение',
+                'verbose_name_plural': 'Текущие значения',
+                'constraints': [models.UniqueConstraint(fields=('engine', 'parameter_type'), name='monitoring_latest_unique')],
+            },
+        ),
+        migrations.RunPython(fill_latest_values, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-17 03:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0009_latestvalue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParameterLayout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('parameter_ids', models.JSONField(verbose_name='Типы параметров по порядку')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Раскладка значений',
+                'verbose_name_plural': 'Раскладки значений',
+            },
+        ),
+        migrations.AddField(
+            model_name='measurement',
+            name='packed_values',
+            field=models.BinaryField(blank=True, null=True, verbose_name='Упакованные значения'),
+        ),
+        migrations.AddField(
+            model_name='measurement',
+            name='layout',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='monitoring.parameterlayout', verbose_name='Раскладка значений'),
+        ),
+    ]
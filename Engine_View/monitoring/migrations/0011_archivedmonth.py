@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-17 03:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0010_packed_values'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='engine',
+            name='archived_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='В архиве до'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Месяц (UTC)')),
+                ('path', models.CharField(max_length=255, verbose_name='Каталог относительно архива')),
+                ('parameter_ids', models.JSONField(verbose_name='Типы параметров')),
+                ('first_timestamp', models.DateTimeField(verbose_name='Первый замер')),
+                ('last_timestamp', models.DateTimeField(verbose_name='Последний замер')),
+                ('measurement_count', models.PositiveIntegerField(verbose_name='Число замеров')),
+                ('value_count', models.PositiveIntegerField(verbose_name='Число значений')),
+                ('archived_at', models.DateTimeField(auto_now=True, verbose_name='Перенесен в архив')),
+                ('engine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_months', to='monitoring.engine', verbose_name='Двигатель')),
+            ],
+            options={
+                'verbose_name': 'Архивный месяц',
+                'verbose_name_plural': 'Архивные месяцы',
+                'constraints': [models.UniqueConstraint(fields=('engine', 'month'), name='monitoring_archive_unique')],
+            },
+        ),
+    ]
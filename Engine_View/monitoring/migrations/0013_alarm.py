@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-17 03:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0012_ingesttoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Alarm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('low', 'Ниже минимума'), ('high', 'Выше максимума'), ('zscore', 'Выброс (z-оценка)'), ('rate', 'Скачок скорости изменения')], max_length=10, verbose_name='Вид')),
+                ('timestamp', models.DateTimeField(verbose_name='Время замера')),
+                ('value', models.FloatField(verbose_name='Значение')),
+                ('score', models.FloatField(help_text='Предел, z-оценка или отношение скорости изменения к обычной', verbose_name='Оценка')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('engine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alarms', to='monitoring.engine', verbose_name='Двигатель')),
+                ('parameter_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='monitoring.parametertype', verbose_name='Тип параметра')),
+            ],
+            options={
+                'verbose_name': 'Тревога',
+                'verbose_name_plural': 'Тревоги',
+                'indexes': [models.Index(fields=['engine', 'timestamp', 'id'], name='monitoring_alarm_engine_idx'), models.Index(fields=['timestamp', 'id'], name='monitoring_alarm_ts_idx')],
+                'constraints': [models.UniqueConstraint(fields=('engine', 'parameter_type', 'kind', 'timestamp'), name='monitoring_alarm_unique')],
+            },
+        ),
+    ]
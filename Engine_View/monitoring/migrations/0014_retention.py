@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-17 03:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0013_alarm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='engine',
+            name='compacted_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Сжато до'),
+        ),
+        migrations.AlterField(
+            model_name='parameterrollup',
+            name='resolution',
+            field=models.CharField(choices=[('minute', 'Минута'), ('hour', 'Час'), ('day', 'Сутки')], max_length=6, verbose_name='Интервал'),
+        ),
+        migrations.CreateModel(
+            name='RetentionPolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('raw_days', models.PositiveIntegerField(help_text='Более старые значения сжимаются в минутные агрегаты', verbose_name='Хранить сырые значения, дней')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активна')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('engine', models.ForeignKey(blank=True, help_text='Пусто - все двигатели', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='retention_policies', to='monitoring.engine', verbose_name='Двигатель')),
+                ('parameter_type', models.ForeignKey(blank=True, help_text='Пусто - все параметры', null=True, on_delete=django.db.models.deletion.CASCADE, to='monitoring.parametertype', verbose_name='Тип параметра')),
+            ],
+            options={
+                'verbose_name': 'Политика хранения',
+                'verbose_name_plural': 'Политики хранения',
+                'constraints': [models.UniqueConstraint(fields=('engine', 'parameter_type'), name='monitoring_retention_unique')],
+            },
+        ),
+    ]
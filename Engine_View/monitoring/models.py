@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 
 
 class Vessel(models.Model):
@@ -26,6 +27,15 @@ class Engine(models.Model):
     model = models.CharField(max_length=50, verbose_name="Модель")
     serial_number = models.CharField(max_length=50, unique=True, verbose_name="Серийный номер")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Замеры раньше этого времени перенесены в архив (monitoring.archive)
+    archived_until = models.DateTimeField(
+        null=True, blank=True, verbose_name="В архиве до"
+    )
+    # Сырые значения раньше этого времени могли быть сжаты в минутные
+    # агрегаты (monitoring.retention)
+    compacted_until = models.DateTimeField(
+        null=True, blank=True, verbose_name="Сжато до"
+    )
 
     class Meta:
         verbose_name = "Двигатель"
@@ -73,6 +83,19 @@ class ParameterType(models.Model):
         return f"{self.name} ({self.unit})"
 
 
+class ParameterLayout(models.Model):
+    """Порядок параметров в упакованных значениях замеров (версия раскладки)"""
+    parameter_ids = models.JSONField(verbose_name="Типы параметров по порядку")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Раскладка значений"
+        verbose_name_plural = "Раскладки значений"
+
+    def __str__(self):
+        return f"Раскладка {self.pk} ({len(self.parameter_ids)} параметров)"
+
+
 class Measurement(models.Model):
     engine = models.ForeignKey(
         Engine,
@@ -89,11 +112,35 @@ class Measurement(models.Model):
     )
     notes = models.TextField(blank=True, verbose_name="Примечания")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Компактный режим (MONITORING_PACKED_VALUES): копия значений замера
+    # массивом float64 в порядке раскладки, см. monitoring.packed
+    layout = models.ForeignKey(
+        ParameterLayout,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="Раскладка значений"
+    )
+    packed_values = models.BinaryField(
+        null=True, blank=True, verbose_name="Упакованные значения"
+    )
 
     class Meta:
         verbose_name = "Замер"
         verbose_name_plural = "Замеры"
         ordering = ['-timestamp']
+        indexes = [
+            # Списки, ряды и статистика по двигателю за период
+            models.Index(
+                fields=['engine', 'timestamp'],
+                name='monitoring_meas_engine_ts_idx',
+            ),
+            # Список всех замеров и фильтры по судну за период
+            models.Index(
+                fields=['timestamp', 'id'], name='monitoring_meas_ts_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.engine} - {self.timestamp}"
@@ -118,6 +165,415 @@ class ParameterValue(models.Model):
         verbose_name = "Значение параметра"
         verbose_name_plural = "Значения параметров"
         unique_together = ['measurement', 'parameter_type']
+        indexes = [
+            # Ряд одного параметра; value в индексе позволяет
+            # не читать таблицу значений
+            models.Index(
+                fields=['parameter_type', 'measurement', 'value'],
+                name='monitoring_pv_type_meas_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.parameter_type.name}: {self.value} {self.parameter_type.unit}"
+
+
+class ParameterRollup(models.Model):
+    """Агрегаты значений параметра двигателя за минуту, час или сутки (UTC)"""
+    RESOLUTION_MINUTE = 'minute'
+    RESOLUTION_HOUR = 'hour'
+    RESOLUTION_DAY = 'day'
+    RESOLUTION_CHOICES = [
+        (RESOLUTION_MINUTE, 'Минута'),
+        (RESOLUTION_HOUR, 'Час'),
+        (RESOLUTION_DAY, 'Сутки'),
+    ]
+
+    engine = models.ForeignKey(
+        Engine,
+        on_delete=models.CASCADE,
+        verbose_name="Двигатель",
+        related_name='rollups'
+    )
+    parameter_type = models.ForeignKey(
+        ParameterType,
+        on_delete=models.CASCADE,
+        verbose_name="Тип параметра"
+    )
+    resolution = models.CharField(
+        max_length=6, choices=RESOLUTION_CHOICES, verbose_name="Интервал"
+    )
+    bucket = models.DateTimeField(verbose_name="Начало интервала")
+    count = models.PositiveIntegerField(verbose_name="Число значений")
+    min = models.FloatField(verbose_name="Минимум")
+    max = models.FloatField(verbose_name="Максимум")
+    sum = models.FloatField(verbose_name="Сумма")
+    sum_squares = models.FloatField(verbose_name="Сумма квадратов")
+
+    class Meta:
+        verbose_name = "Агрегат параметра"
+        verbose_name_plural = "Агрегаты параметров"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['parameter_type', 'resolution', 'engine', 'bucket'],
+                name='monitoring_rollup_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.engine} {self.parameter_type.name} {self.bucket}"
+
+    @property
+    def avg(self):
+        return self.sum / self.count
+
+    @property
+    def std(self):
+        """Стандартное отклонение значений интервала."""
+        variance = self.sum_squares / self.count - self.avg ** 2
+        return max(variance, 0.0) ** 0.5
+
+
+class LatestValue(models.Model):
+    """Последнее по времени значение параметра двигателя (текущее состояние)"""
+    engine = models.ForeignKey(
+        Engine,
+        on_delete=models.CASCADE,
+        verbose_name="Двигатель",
+        related_name='latest_values'
+    )
+    parameter_type = models.ForeignKey(
+        ParameterType,
+        on_delete=models.CASCADE,
+        verbose_name="Тип параметра"
+    )
+    timestamp = models.DateTimeField(verbose_name="Время замера")
+    value = models.FloatField(verbose_name="Значение")
+
+    class Meta:
+        verbose_name = "Текущее значение"
+        verbose_name_plural = "Текущие значения"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['engine', 'parameter_type'],
+                name='monitoring_latest_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.engine} {self.parameter_type.name}: {self.value}"
+
+
+class RetentionPolicy(models.Model):
+    """Срок хранения сырых значений параметров (monitoring.retention)"""
+    engine = models.ForeignKey(
+        Engine,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        verbose_name="Двигатель",
+        help_text="Пусто - все двигатели",
+        related_name='retention_policies'
+    )
+    parameter_type = models.ForeignKey(
+        ParameterType,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        verbose_name="Тип параметра",
+        help_text="Пусто - все параметры"
+    )
+    raw_days = models.PositiveIntegerField(
+        verbose_name="Хранить сырые значения, дней",
+        help_text="Более старые значения сжимаются в минутные агрегаты"
+    )
+    is_active = models.BooleanField(default=True, verbose_name="Активна")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Политика хранения"
+        verbose_name_plural = "Политики хранения"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['engine', 'parameter_type'],
+                name='monitoring_retention_unique',
+            ),
+        ]
+
+    def __str__(self):
+        engine = self.engine or "Все двигатели"
+        parameter = (self.parameter_type.name if self.parameter_type
+                     else "все параметры")
+        return f"{engine}, {parameter}: {self.raw_days} дн."
+
+    def clean(self):
+        # NULL в уникальном ограничении не совпадает с NULL, поэтому
+        # общие политики проверяются здесь
+        duplicates = RetentionPolicy.objects.filter(
+            engine=self.engine, parameter_type=self.parameter_type
+        ).exclude(pk=self.pk)
+        if duplicates.exists():
+            raise ValidationError(
+                "Политика для этого двигателя и параметра уже есть"
+            )
+
+
+class Alarm(models.Model):
+    """Нарушение предела или аномалия значения параметра (monitoring.alarms)"""
+    KIND_LOW = 'low'
+    KIND_HIGH = 'high'
+    KIND_ZSCORE = 'zscore'
+    KIND_RATE = 'rate'
+    KIND_CHOICES = [
+        (KIND_LOW, 'Ниже минимума'),
+        (KIND_HIGH, 'Выше максимума'),
+        (KIND_ZSCORE, 'Выброс (z-оценка)'),
+        (KIND_RATE, 'Скачок скорости изменения'),
+    ]
+
+    engine = models.ForeignKey(
+        Engine,
+        on_delete=models.CASCADE,
+        verbose_name="Двигатель",
+        related_name='alarms'
+    )
+    parameter_type = models.ForeignKey(
+        ParameterType,
+        on_delete=models.CASCADE,
+        verbose_name="Тип параметра"
+    )
+    kind = models.CharField(
+        max_length=10, choices=KIND_CHOICES, verbose_name="Вид"
+    )
+    timestamp = models.DateTimeField(verbose_name="Время замера")
+    value = models.FloatField(verbose_name="Значение")
+    score = models.FloatField(
+        verbose_name="Оценка",
+        help_text="Предел, z-оценка или отношение скорости изменения к обычной"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Тревога"
+        verbose_name_plural = "Тревоги"
+        constraints = [
+            # Повторная проверка тех же значений не дублирует тревоги
+            models.UniqueConstraint(
+                fields=['engine', 'parameter_type', 'kind', 'timestamp'],
+                name='monitoring_alarm_unique',
+            ),
+        ]
+        indexes = [
+            # Лента тревог двигателя и всего флота от новых к старым
+            models.Index(
+                fields=['engine', 'timestamp', 'id'],
+                name='monitoring_alarm_engine_idx',
+            ),
+            models.Index(
+                fields=['timestamp', 'id'], name='monitoring_alarm_ts_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return (f"{self.engine} {self.parameter_type.name}: "
+                f"{self.get_kind_display()} {self.value}")
+
+
+class ArchivedMonth(models.Model):
+    """Месяц замеров двигателя, перенесенный в файлы архива"""
+    engine = models.ForeignKey(
+        Engine,
+        on_delete=models.CASCADE,
+        verbose_name="Двигатель",
+        related_name='archived_months'
+    )
+    month = models.DateField(verbose_name="Месяц (UTC)")
+    path = models.CharField(
+        max_length=255, verbose_name="Каталог относительно архива"
+    )
+    parameter_ids = models.JSONField(verbose_name="Типы параметров")
+    first_timestamp = models.DateTimeField(verbose_name="Первый замер")
+    last_timestamp = models.DateTimeField(verbose_name="Последний замер")
+    measurement_count = models.PositiveIntegerField(
+        verbose_name="Число замеров"
+    )
+    value_count = models.PositiveIntegerField(verbose_name="Число значений")
+    archived_at = models.DateTimeField(
+        auto_now=True, verbose_name="Перенесен в архив"
+    )
+
+    class Meta:
+        verbose_name = "Архивный месяц"
+        verbose_name_plural = "Архивные месяцы"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['engine', 'month'], name='monitoring_archive_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.engine} {self.month:%Y-%m}"
+
+
+class ImportJob(models.Model):
+    """Фоновая задача импорта замеров из файла"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Завершен'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    # Сколько сообщений об ошибках строк хранится в задаче
+    MAX_STORED_ERRORS = 100
+
+    engine = models.ForeignKey(
+        Engine,
+        on_delete=models.CASCADE,
+        verbose_name="Двигатель",
+        related_name='import_jobs'
+    )
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        verbose_name="Кто загрузил"
+    )
+    file = models.FileField(upload_to='imports/%Y/%m/', verbose_name="Файл")
+    original_name = models.CharField(max_length=255, verbose_name="Имя файла")
+    timestamp_format = models.CharField(max_length=50, verbose_name="Формат даты/времени")
+    delimiter = models.CharField(max_length=5, default=',', verbose_name="Разделитель")
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        db_index=True,
+        verbose_name="Статус"
+    )
+    total_bytes = models.BigIntegerField(default=0, verbose_name="Размер файла")
+    processed_bytes = models.BigIntegerField(default=0, verbose_name="Обработано байт")
+    rows_count = models.PositiveIntegerField(default=0, verbose_name="Прочитано строк")
+    imported_count = models.PositiveIntegerField(default=0, verbose_name="Импортировано замеров")
+    values_count = models.PositiveIntegerField(default=0, verbose_name="Импортировано значений")
+    error_count = models.PositiveIntegerField(default=0, verbose_name="Ошибок")
+    errors = models.JSONField(default=list, blank=True, verbose_name="Ошибки строк")
+    created_parameters = models.JSONField(default=list, blank=True, verbose_name="Созданные параметры")
+    elapsed = models.FloatField(default=0, verbose_name="Время выполнения, с")
+    message = models.TextField(blank=True, verbose_name="Сообщение")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Задача импорта"
+        verbose_name_plural = "Задачи импорта"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.original_name} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    @property
+    def progress(self):
+        """Процент выполнения по прочитанным байтам файла."""
+        if self.status == self.STATUS_DONE:
+            return 100
+        if not self.total_bytes:
+            return 0
+        return min(99, int(self.processed_bytes * 100 / self.total_bytes))
+
+    @property
+    def rows_per_second(self):
+        if not self.elapsed:
+            return 0.0
+        return self.rows_count / self.elapsed
+
+    def as_status_dict(self):
+        """Состояние задачи для JSON-эндпоинта статуса."""
+        return {
+            'id': self.pk,
+            'status': self.status,
+            'status_display': self.get_status_display(),
+            'finished': self.is_finished,
+            'progress': self.progress,
+            'total_bytes': self.total_bytes,
+            'processed_bytes': self.processed_bytes,
+            'rows_count': self.rows_count,
+            'imported_count': self.imported_count,
+            'values_count': self.values_count,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'created_parameters': self.created_parameters,
+            'elapsed': round(self.elapsed, 2),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'message': self.message,
+        }
+
+
+class ChunkedUpload(models.Model):
+    """Файл, загружаемый частями с возможностью продолжения после обрыва"""
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Кто загружает"
+    )
+    file = models.FileField(upload_to='uploads/', verbose_name="Файл")
+    filename = models.CharField(max_length=255, verbose_name="Имя файла")
+    total_bytes = models.BigIntegerField(verbose_name="Размер файла")
+    uploaded_bytes = models.BigIntegerField(default=0, verbose_name="Загружено байт")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Загрузка файла"
+        verbose_name_plural = "Загрузки файлов"
+
+    def __str__(self):
+        return f"{self.filename} ({self.uploaded_bytes}/{self.total_bytes})"
+
+    @property
+    def is_complete(self):
+        return self.uploaded_bytes >= self.total_bytes
+
+    def as_status_dict(self):
+        return {
+            'id': self.pk,
+            'filename': self.filename,
+            'offset': self.uploaded_bytes,
+            'size': self.total_bytes,
+            'complete': self.is_complete,
+        }
+
+
+class IngestToken(models.Model):
+    """Токен регистратора данных для API приема замеров"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name='ingest_tokens'
+    )
+    name = models.CharField(max_length=100, verbose_name="Название")
+    # Хранится только SHA-256 ключа; сам ключ показывается один раз
+    key_digest = models.CharField(
+        max_length=64, unique=True, verbose_name="SHA-256 ключа"
+    )
+    is_active = models.BooleanField(default=True, verbose_name="Активный")
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Последнее использование"
+    )
+
+    class Meta:
+        verbose_name = "Токен приема данных"
+        verbose_name_plural = "Токены приема данных"
 
     def __str__(self):
-        return f"{self.parameter_type.name}: {self.value} {self.parameter_type.unit}"
\ No newline at end of file
+        return f"{self.name} ({self.user})"
@@ -0,0 +1,279 @@
+"""
+Наложение рядов: несколько параметров разных двигателей в одном ответе.
+
+Ряд задается парой "<id двигателя>:<код параметра>". Без шага сетки
+каждый ряд строится как обычный график (cached_chart_data) со своими
+метками времени. С шагом сетки ряды приводятся к общим меткам
+времени: источник выбирается по шагу (сырые значения, часовые или
+суточные агрегаты - по одному запросу на ряд), а значения в узлах
+сетки получаются линейной интерполяцией np.interp. Узлы вне периода
+ряда и внутри длинных пропусков остаются пустыми (null).
+
+Размер сетки проверяется до загрузки рядов: по периоду запроса
+и границам данных рядов из суточных агрегатов (один запрос). Сетка
+по сырым значениям (шаг меньше часа) требует ограниченного периода.
+"""
+import numpy as np
+from django.db.models import Max, Min, Q
+
+from .caching import cached_chart_data
+from .downsampling import MINMAX
+from .models import ParameterRollup
+from .registry import get_registry
+from .rollups import (
+    BUCKET_SIZES,
+    DAY,
+    HOUR,
+    RAW,
+    bucket_start,
+    fetch_rollups,
+)
+from .series import (
+    DEFAULT_MAX_POINTS,
+    MAX_POINTS_LIMIT,
+    Series,
+    fetch_series,
+    format_labels,
+)
+
+# Рядов в одном запросе
+MAX_SERIES = 12
+
+# Пропуск длиннее стольких медианных интервалов ряда не интерполируется
+GAP_FACTOR = 5
+
+
+class OverlayError(Exception):
+    """Неверное описание рядов или сетки."""
+
+
+def parse_series(specs):
+    """
+    Разбор описаний рядов "<id двигателя>:<код параметра>".
+
+    Returns:
+        list: Пары (двигатель, тип параметра) из справочников
+
+    Raises:
+        OverlayError: Пустой или слишком длинный список, неизвестный
+            двигатель или параметр
+    """
+    if not specs:
+        raise OverlayError('Не выбраны ряды (series=<двигатель>:<параметр>)')
+    if len(specs) > MAX_SERIES:
+        raise OverlayError(f'Не больше {MAX_SERIES} рядов в одном запросе')
+
+    registry = get_registry()
+    pairs = []
+    for spec in specs:
+        engine_id, _, code = spec.partition(':')
+        try:
+            engine = registry.engines_by_id[int(engine_id)]
+        except (KeyError, ValueError):
+            raise OverlayError(f'Неизвестный двигатель: {spec}') from None
+        parameter_type = registry.parameters_by_code.get(code)
+        if parameter_type is None:
+            raise OverlayError(f'Неизвестный параметр: {spec}')
+        pairs.append((engine, parameter_type))
+    return pairs
+
+
+def grid_resolution(step):
+    """Самый грубый источник, интервал которого не больше шага сетки."""
+    for resolution in (DAY, HOUR):
+        if step >= BUCKET_SIZES[resolution]:
+            return resolution
+    return RAW
+
+
+def period_bounds(measurement_filters):
+    """Начало и конец периода из lookup-ов (None - без ограничения)."""
+    start = (measurement_filters.get('timestamp__gte')
+             or measurement_filters.get('timestamp__gt'))
+    end = (measurement_filters.get('timestamp__lt')
+           or measurement_filters.get('timestamp__lte'))
+    return start, end
+
+
+def data_bounds(pairs, measurement_filters):
+    """
+    Границы значений рядов в периоде по суточным агрегатам, без загрузки
+    самих рядов.
+
+    Returns:
+        tuple: (начало, конец) или None, если значений нет
+    """
+    start, end = period_bounds(measurement_filters)
+    condition = Q()
+    for engine, parameter_type in pairs:
+        condition |= Q(engine_id=engine.pk,
+                       parameter_type_id=parameter_type.pk)
+    rollups = ParameterRollup.objects.filter(condition, resolution=DAY)
+    if start is not None:
+        rollups = rollups.filter(bucket__gte=bucket_start(start, DAY))
+    if end is not None:
+        rollups = rollups.filter(bucket__lt=end)
+    bounds = rollups.aggregate(first=Min('bucket'), last=Max('bucket'))
+    if bounds['first'] is None:
+        return None
+    first = bounds['first'] if start is None else max(bounds['first'], start)
+    last = bounds['last'] + BUCKET_SIZES[DAY]
+    return first, last if end is None else min(last, end)
+
+
+def _check_grid_size(count):
+    if count > MAX_POINTS_LIMIT:
+        raise OverlayError(
+            f'Сетка из {count} точек больше {MAX_POINTS_LIMIT}, '
+            f'увеличьте шаг'
+        )
+
+
+def fetch_grid_source(parameter_type, measurement_filters, resolution):
+    """
+    Ряд для выравнивания: сырые значения или средние по агрегатам.
+
+    Returns:
+        tuple: (Series, статистика всех значений периода)
+    """
+    if resolution == RAW:
+        series = fetch_series(parameter_type, measurement_filters)
+        return series, series.stats()
+    buckets = fetch_rollups(parameter_type, measurement_filters, resolution)
+    return Series(buckets.timestamps, buckets.averages), buckets.stats()
+
+
+def time_grid(series_list, step_ms):
+    """
+    Общая сетка от начала самого раннего ряда до конца самого позднего.
+
+    Returns:
+        numpy.ndarray: Узлы сетки (мс UTC), кратные шагу
+
+    Raises:
+        OverlayError: Узлов больше MAX_POINTS_LIMIT
+    """
+    filled = [series for series in series_list if len(series)]
+    if not filled:
+        return np.empty(0, dtype=np.int64)
+    first = min(series.timestamps[0] for series in filled)
+    last = max(series.timestamps[-1] for series in filled)
+    start = first - first % step_ms
+    count = (last - start) // step_ms + 1
+    _check_grid_size(count)
+    return start + np.arange(count, dtype=np.int64) * step_ms
+
+
+def interpolate(series, grid):
+    """
+    Значения ряда в узлах сетки.
+
+    Returns:
+        numpy.ndarray: Значения float64; NaN вне периода ряда и внутри
+            пропусков длиннее GAP_FACTOR медианных интервалов
+    """
+    timestamps = series.timestamps
+    if len(series) < 2:
+        values = np.full(len(grid), np.nan)
+        if len(series):
+            values[grid == timestamps[0]] = series.values[0]
+        return values
+
+    values = np.interp(grid, timestamps, series.values)
+    # Соседние точки ряда слева и справа от каждого узла
+    right = np.clip(
+        np.searchsorted(timestamps, grid, side='right'), 1, len(series) - 1
+    )
+    left = right - 1
+    exact = (timestamps[left] == grid) | (timestamps[right] == grid)
+    intervals = np.diff(timestamps)
+    intervals = intervals[intervals > 0]
+    max_gap = GAP_FACTOR * np.median(intervals) if len(intervals) else 0
+    gaps = (timestamps[right] - timestamps[left] > max_gap) & ~exact
+    outside = (grid < timestamps[0]) | (grid > timestamps[-1])
+    values[outside | gaps] = np.nan
+    return values
+
+
+def _json_values(values):
+    """Значения для JSON: NaN заменяется на None."""
+    result = values.astype(object)
+    result[np.isnan(values)] = None
+    return result.tolist()
+
+
+def _series_info(engine, parameter_type):
+    return {
+        'engine': engine.pk,
+        'engine_name': str(engine),
+        'vessel': engine.vessel.name,
+        'parameter': parameter_type.code,
+        'parameter_name': parameter_type.name,
+        'parameter_unit': parameter_type.unit,
+    }
+
+
+def build_overlay(pairs, measurement_filters=None, step=None,
+                  max_points=DEFAULT_MAX_POINTS, method=MINMAX):
+    """
+    Данные наложенных рядов.
+
+    Args:
+        pairs: Пары (двигатель, тип параметра), см. parse_series
+        measurement_filters: Lookup-ы периода по Measurement
+        step: Шаг общей сетки (timedelta) или None - без выравнивания
+        max_points: Точек в ряду без выравнивания
+        method: Алгоритм прореживания рядов без выравнивания
+
+    Returns:
+        dict: {'step': секунды или None, 'series': [...]}; при
+            выравнивании также общие 'timestamps' и 'labels'
+    """
+    measurement_filters = dict(measurement_filters or {})
+    if step is None:
+        series = []
+        for engine, parameter_type in pairs:
+            data = cached_chart_data(
+                parameter_type,
+                {**measurement_filters, 'engine_id': engine.pk},
+                max_points, method,
+            )
+            series.append({**_series_info(engine, parameter_type), **data})
+        return {'step': None, 'series': series}
+
+    step_ms = int(step.total_seconds() * 1000)
+    if step_ms <= 0:
+        raise OverlayError('Шаг сетки должен быть положительным')
+    resolution = grid_resolution(step)
+    if resolution == RAW and None in period_bounds(measurement_filters):
+        raise OverlayError(
+            'Для шага меньше часа задайте период (date_from и date_to)'
+        )
+    bounds = data_bounds(pairs, measurement_filters)
+    if bounds is not None:
+        # Оценка сверху до загрузки рядов
+        first, last = (int(moment.timestamp() * 1000) for moment in bounds)
+        _check_grid_size((last - 1 - (first - first % step_ms)) // step_ms + 1)
+    sources, stats = zip(*(
+        fetch_grid_source(
+            parameter_type, {**measurement_filters, 'engine_id': engine.pk},
+            resolution,
+        )
+        for engine, parameter_type in pairs
+    ))
+    grid = time_grid(sources, step_ms)
+    return {
+        'step': step_ms // 1000,
+        'resolution': resolution,
+        'timestamps': grid.tolist(),
+        'labels': format_labels(grid),
+        'series': [
+            {
+                **_series_info(engine, parameter_type),
+                'stats': source_stats,
+                'values': _json_values(interpolate(source, grid)),
+            }
+            for (engine, parameter_type), source, source_stats
+            in zip(pairs, sources, stats)
+        ],
+    }
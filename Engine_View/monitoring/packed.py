@@ -0,0 +1,256 @@
+"""
+Компактное хранение значений замера массивом float64.
+
+В компактном режиме (MONITORING_PACKED_VALUES) каждый замер кроме строк
+ParameterValue хранит свои значения одним BLOB-ом: массив float64
+(little-endian) в порядке раскладки ParameterLayout, отсутствующие
+значения - NaN. Раскладки не изменяются: появление нового параметра
+создает новую версию с тем же порядком и параметром в конце.
+
+Ряд двигателя читается из одной таблицы замеров без join: BLOB-ы одной
+раскладки склеиваются и разбираются NumPy frombuffer в матрицу
+(замеры × параметры), откуда столбцы берутся срезами.
+
+Строки ParameterValue остаются основным хранилищем (фильтры, агрегаты,
+текущие значения); BLOB - производная копия, которую пересобирают
+сигналы при изменении значений и команда pack_measurements.
+"""
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .models import Measurement, ParameterLayout, ParameterValue
+
+DTYPE = np.dtype('<f8')
+
+# Раскладки неизменяемы, поэтому кэшируются в процессе без сброса
+_layouts = {}
+_current_layout = None
+
+
+def clear_layout_cache():
+    """Сброс кэша раскладок (для тестов, где база откатывается)."""
+    global _current_layout  # pylint: disable=global-statement
+    _layouts.clear()
+    _current_layout = None
+
+
+def packed_values_enabled():
+    """Включен ли компактный режим, MONITORING_PACKED_VALUES."""
+    return getattr(settings, 'MONITORING_PACKED_VALUES', False)
+
+
+def get_layout(layout_id):
+    """Раскладка по id: {id типа параметра: номер столбца}."""
+    columns = _layouts.get(layout_id)
+    if columns is None:
+        layout = ParameterLayout.objects.get(pk=layout_id)
+        columns = _layouts[layout_id] = {
+            parameter_type_id: index
+            for index, parameter_type_id in enumerate(layout.parameter_ids)
+        }
+    return columns
+
+
+def layout_for(parameter_type_ids):
+    """
+    Текущая раскладка, содержащая все parameter_type_ids.
+
+    Если в ней нет каких-то параметров, создается новая версия
+    с этими параметрами в конце.
+
+    Returns:
+        ParameterLayout: Раскладка
+    """
+    global _current_layout  # pylint: disable=global-statement
+    needed = set(parameter_type_ids)
+    layout = _current_layout
+    if layout is None or not needed <= set(layout.parameter_ids):
+        # Другой процесс мог уже создать подходящую версию
+        layout = ParameterLayout.objects.order_by('-pk').first()
+        if layout is None or not needed <= set(layout.parameter_ids):
+            parameter_ids = list(layout.parameter_ids) if layout else []
+            parameter_ids += sorted(needed - set(parameter_ids))
+            layout = ParameterLayout.objects.create(
+                parameter_ids=parameter_ids
+            )
+        _current_layout = layout
+    return layout
+
+
+def pack_values(layout, values):
+    """
+    Упаковка {id типа параметра: значение} в байты по раскладке.
+
+    Returns:
+        bytes: Массив float64, NaN для отсутствующих параметров
+    """
+    columns = get_layout(layout.pk)
+    packed = np.full(len(columns), np.nan, dtype=DTYPE)
+    for parameter_type_id, value in values.items():
+        packed[columns[parameter_type_id]] = value
+    return packed.tobytes()
+
+
+def unpack_values(layout_id, data):
+    """Значения замера {id типа параметра: значение} без отсутствующих."""
+    values = np.frombuffer(data, dtype=DTYPE)
+    return {
+        parameter_type_id: float(values[index])
+        for parameter_type_id, index in get_layout(layout_id).items()
+        if index < len(values) and not np.isnan(values[index])
+    }
+
+
+def _matrices(rows):
+    """
+    Группировка строк (время, id раскладки, данные) по раскладкам.
+
+    Returns:
+        list: (раскладка, метки времени мс, матрица замеры × параметры)
+    """
+    groups = {}
+    for timestamp, layout_id, data in rows:
+        group = groups.setdefault(layout_id, ([], []))
+        group[0].append(timestamp)
+        group[1].append(data)
+
+    matrices = []
+    for layout_id, (timestamps, blobs) in groups.items():
+        columns = get_layout(layout_id)
+        matrix = np.frombuffer(b''.join(blobs), dtype=DTYPE).reshape(
+            len(blobs), len(columns)
+        )
+        matrices.append((
+            columns,
+            pd.DatetimeIndex(timestamps).as_unit('ms').asi8,
+            matrix,
+        ))
+    return matrices
+
+
+def packed_column(rows, parameter_type_id):
+    """
+    Столбец одного параметра из упакованных замеров.
+
+    Args:
+        rows: Строки (время, id раскладки, данные), отсортированные
+            по времени
+        parameter_type_id: Тип параметра
+
+    Returns:
+        tuple: (метки времени мс UTC, значения) - NumPy массивы
+            без замеров, где параметра нет
+    """
+    chunks = []
+    for columns, timestamps, matrix in _matrices(rows):
+        index = columns.get(parameter_type_id)
+        if index is not None:
+            column = matrix[:, index]
+            present = ~np.isnan(column)
+            chunks.append((timestamps[present], column[present]))
+    return _concatenate(chunks)
+
+
+def _concatenate(chunks):
+    """Склейка столбцов разных раскладок в один ряд по времени."""
+    if not chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=DTYPE)
+    if len(chunks) == 1:
+        return chunks[0]
+    timestamps = np.concatenate([chunk[0] for chunk in chunks])
+    values = np.concatenate([chunk[1] for chunk in chunks])
+    order = np.argsort(timestamps, kind='stable')
+    return timestamps[order], values[order]
+
+
+def packed_columns(rows):
+    """
+    Все столбцы упакованных замеров за один проход.
+
+    Returns:
+        dict: {id типа параметра: (метки времени мс UTC, значения)}
+    """
+    parts = {}
+    for columns, timestamps, matrix in _matrices(rows):
+        for parameter_type_id, index in columns.items():
+            column = matrix[:, index]
+            present = ~np.isnan(column)
+            if present.any():
+                parts.setdefault(parameter_type_id, []).append(
+                    (timestamps[present], column[present])
+                )
+
+    return {
+        parameter_type_id: _concatenate(chunks)
+        for parameter_type_id, chunks in parts.items()
+    }
+
+
+def packed_rows(measurement_filters=None):
+    """
+    Запрос (время, раскладка, данные) замеров без join с ParameterValue.
+
+    Args:
+        measurement_filters: Словарь lookup-ов по Measurement
+    """
+    return Measurement.objects.filter(
+        **(measurement_filters or {})
+    ).order_by('timestamp').values_list(
+        'timestamp', 'layout_id', 'packed_values'
+    )
+
+
+def pack_measurement(measurement):
+    """Пересборка упакованных значений замера из строк ParameterValue."""
+    values = dict(
+        measurement.parameter_values.values_list('parameter_type_id', 'value')
+    )
+    layout = layout_for(values)
+    Measurement.objects.filter(pk=measurement.pk).update(
+        layout=layout, packed_values=pack_values(layout, values)
+    )
+
+
+def pack_measurements(measurements, batch_size=5000):
+    """
+    Пересборка упакованных значений пачками (заполнение после включения
+    компактного режима).
+
+    Args:
+        measurements: QuerySet замеров
+        batch_size: Число замеров в одной пачке
+
+    Returns:
+        int: Число упакованных замеров
+    """
+    packed_count = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            measurements.filter(pk__gt=last_pk).order_by('pk')
+            .only('pk')[:batch_size]
+        )
+        if not batch:
+            return packed_count
+        last_pk = batch[-1].pk
+
+        values = {}
+        for measurement_id, parameter_type_id, value in (
+            ParameterValue.objects.filter(measurement__in=batch).values_list(
+                'measurement_id', 'parameter_type_id', 'value'
+            )
+        ):
+            values.setdefault(measurement_id, {})[parameter_type_id] = value
+
+        # Замер без значений получает массив из NaN той же раскладки
+        layout = layout_for({pk for row in values.values() for pk in row})
+        for measurement in batch:
+            measurement.layout = layout
+            measurement.packed_values = pack_values(
+                layout, values.get(measurement.pk, {})
+            )
+        Measurement.objects.bulk_update(
+            batch, ['layout', 'packed_values'], batch_size=batch_size
+        )
+        packed_count += len(batch)
@@ -0,0 +1,146 @@
+"""
+Постраничный вывод замеров по курсору (keyset pagination).
+
+Страница выбирается условием по ключу сортировки (timestamp, id), а не
+смещением OFFSET, и без подсчета COUNT(*): база сразу находит начало
+страницы, поэтому глубокие страницы стоят столько же, сколько первая.
+Курсор - время и id крайнего замера страницы в виде строки
+'<микросекунды от эпохи>_<id>'.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+# Направления листания: после курсора (вперед) и до него (назад)
+AFTER = 'after'
+BEFORE = 'before'
+
+
+class InvalidCursor(ValueError):
+    """Курсор не удалось разобрать."""
+
+
+def encode_cursor(measurement):
+    """Курсор замера для ссылки на соседнюю страницу."""
+    micros = (measurement.timestamp - EPOCH) // MICROSECOND
+    return f'{micros}_{measurement.pk}'
+
+
+def decode_cursor(cursor):
+    """
+    Разбор курсора.
+
+    Returns:
+        tuple: (timestamp, id)
+
+    Raises:
+        InvalidCursor: Курсор поврежден
+    """
+    try:
+        micros, pk = cursor.split('_')
+        return EPOCH + int(micros) * MICROSECOND, int(pk)
+    except (AttributeError, ValueError, OverflowError) as e:
+        raise InvalidCursor(f'Неверный курсор: {cursor}') from e
+
+
+def older_than(queryset, timestamp, pk):
+    """
+    Замеры строго раньше (timestamp, pk) в порядке (-timestamp, -id).
+
+    Условие timestamp <= X дублирует OR-условие, но позволяет базе
+    начать просмотр индекса по времени сразу с нужного места.
+    """
+    return queryset.filter(timestamp__lte=timestamp).filter(
+        Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, pk__lt=pk)
+    )
+
+
+def newer_than(queryset, timestamp, pk):
+    """Замеры строго позже (timestamp, pk), см. older_than."""
+    return queryset.filter(timestamp__gte=timestamp).filter(
+        Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, pk__gt=pk)
+    )
+
+
+class KeysetPage:
+    """
+    Страница замеров от новых к старым.
+
+    Args:
+        object_list: Замеры страницы
+        has_next: Есть более старые замеры
+        has_previous: Есть более новые замеры
+    """
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def next_cursor(self):
+        if not self.has_next:
+            return None
+        return encode_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous or not self.object_list:
+            return None
+        return encode_cursor(self.object_list[0])
+
+
+def paginate_keyset(queryset, per_page, after=None, before=None):
+    """
+    Страница замеров, отсортированных по (-timestamp, -id).
+
+    Args:
+        queryset: Замеры (фильтры, аннотации и prefetch уже применены)
+        per_page: Размер страницы
+        after: Курсор - вернуть замеры старше него (следующая страница)
+        before: Курсор - вернуть замеры новее него (предыдущая страница)
+
+    Returns:
+        KeysetPage: Страница замеров
+
+    Raises:
+        InvalidCursor: Курсор поврежден
+    """
+    if before:
+        timestamp, pk = decode_cursor(before)
+        # Ближайшие более новые замеры, затем в обычном порядке
+        rows = list(newer_than(queryset, timestamp, pk).order_by(
+            'timestamp', 'pk'
+        )[:per_page + 1])
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        return KeysetPage(rows, has_next=True, has_previous=has_previous)
+
+    queryset = queryset.order_by('-timestamp', '-pk')
+    if after:
+        timestamp, pk = decode_cursor(after)
+        queryset = older_than(queryset, timestamp, pk)
+    # Лишняя строка показывает, есть ли следующая страница
+    rows = list(queryset[:per_page + 1])
+    return KeysetPage(
+        rows[:per_page], has_next=len(rows) > per_page,
+        has_previous=bool(after),
+    )
+
+
+def cursor_query(params, direction, cursor):
+    """Строка запроса со всеми фильтрами и новым курсором."""
+    query = params.copy()
+    for key in (AFTER, BEFORE, 'page'):
+        query.pop(key, None)
+    query[direction] = cursor
+    return query.urlencode()
@@ -0,0 +1,124 @@
+"""
+Справочники в памяти процесса: суда, двигатели и типы параметров.
+
+Таблицы маленькие и меняются редко, а нужны почти каждому запросу
+(формы фильтров, создание замера, импорт). Снимок загружается тремя
+запросами и дальше отдается без обращений к базе, с индексами по id,
+коду, названию и серийному номеру.
+
+Снимок помечается версией из общего кэша Django. Сигналы сохранения
+и удаления справочников (см. monitoring.signals) меняют версию сразу
+и еще раз после фиксации транзакции, поэтому другие процессы с общим
+кэшем перечитывают справочники при следующем запросе, а снимок,
+прочитанный до фиксации, не остается актуальным. Версия в кэше,
+который не виден другим процессам (LocMemCache), об их изменениях
+не узнает, поэтому снимок в любом случае перечитывается не реже
+раза в MONITORING_REGISTRY_TTL секунд.
+
+Объекты снимка общие для всех запросов процесса - их нельзя изменять
+без сохранения в базу.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Engine, ParameterType, Vessel
+
+REGISTRY_VERSION_KEY = 'monitoring:registry_version'
+
+_lock = threading.Lock()
+_registry = None
+
+
+class ReferenceData:
+    """Снимок справочников с индексами."""
+
+    def __init__(self, version):
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+        self.vessels = list(Vessel.objects.order_by('pk'))
+        self.vessels_by_id = {vessel.pk: vessel for vessel in self.vessels}
+
+        self.engines = list(Engine.objects.order_by('pk'))
+        self.engines_by_id = {}
+        self.engines_by_serial = {}
+        self.engines_by_vessel = {}
+        for engine in self.engines:
+            # Судно берется из снимка, а не отдельным запросом
+            engine.vessel = self.vessels_by_id[engine.vessel_id]
+            self.engines_by_id[engine.pk] = engine
+            self.engines_by_serial[engine.serial_number] = engine
+            self.engines_by_vessel.setdefault(engine.vessel_id, []).append(
+                engine
+            )
+
+        self.parameters = list(ParameterType.objects.order_by('pk'))
+        self.parameters_by_id = {param.pk: param for param in self.parameters}
+        self.parameters_by_code = {
+            param.code: param for param in self.parameters
+        }
+        self.parameters_by_name = {
+            param.name.lower(): param for param in self.parameters
+        }
+        self.active_parameters = [
+            param for param in self.parameters if param.is_active
+        ]
+
+    def vessel_engines(self, vessel_id):
+        """Двигатели судна в порядке создания."""
+        return self.engines_by_vessel.get(vessel_id, [])
+
+    def filter_engines(self, measurement_filters):
+        """Двигатели, замеры которых попадают в lookup-ы по Measurement."""
+        if 'engine_id' in measurement_filters:
+            engine = self.engines_by_id.get(measurement_filters['engine_id'])
+            return [engine] if engine else []
+        if 'engine__vessel_id' in measurement_filters:
+            return self.vessel_engines(measurement_filters['engine__vessel_id'])
+        return self.engines
+
+
+def get_registry_ttl():
+    """Наибольший возраст снимка, MONITORING_REGISTRY_TTL (с)."""
+    return getattr(settings, 'MONITORING_REGISTRY_TTL', 30)
+
+
+def _is_current(registry, version):
+    return (registry is not None and version is not None
+            and registry.version == version
+            and time.monotonic() - registry.loaded_at < get_registry_ttl())
+
+
+def get_registry():
+    """
+    Актуальный снимок справочников процесса.
+
+    Returns:
+        ReferenceData: Снимок; перечитывается, если версия в кэше
+            изменилась или снимок старше MONITORING_REGISTRY_TTL
+    """
+    global _registry  # pylint: disable=global-statement
+    version = cache.get(REGISTRY_VERSION_KEY)
+    registry = _registry
+    if _is_current(registry, version):
+        return registry
+
+    with _lock:
+        if version is None:
+            # Версия вытеснена из кэша или еще не создана
+            cache.add(REGISTRY_VERSION_KEY, time.time_ns(), None)
+            version = cache.get(REGISTRY_VERSION_KEY)
+        registry = _registry
+        if not _is_current(registry, version):
+            registry = _registry = ReferenceData(version)
+    return registry
+
+
+def invalidate_registry():
+    """Сброс снимка справочников во всех процессах с общим кэшем."""
+    global _registry  # pylint: disable=global-statement
+    _registry = None
+    cache.set(REGISTRY_VERSION_KEY, time.time_ns(), None)
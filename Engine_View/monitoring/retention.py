@@ -0,0 +1,228 @@
+"""
+Сроки хранения сырых значений и их сжатие в минутные агрегаты.
+
+Политика (RetentionPolicy) задает, сколько дней хранить сырые значения
+параметра двигателя; для пары двигатель/параметр действует самая
+точная из активных политик: двигатель и параметр, только параметр,
+только двигатель, общая. Команда apply_retention сжимает более старые
+значения в минутные агрегаты ParameterRollup и удаляет исходные строки.
+
+Сжатие идет пачками по compact_values: каждая пачка - отдельная
+короткая транзакция, в памяти только ее строки, а удаление выполняется
+прямым DELETE по id без сборщика каскадов Django и сигналов. Часовые
+и суточные агрегаты и текущие значения при этом не меняются. Граница
+сжатия выравнивается на начало суток UTC и запоминается
+в Engine.compacted_until; сырые ряды (series.fetch_series) за сжатый
+период дополняются средними минутных агрегатов.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import (
+    Measurement,
+    ParameterRollup,
+    ParameterValue,
+    RetentionPolicy,
+)
+from .packed import pack_measurements, packed_values_enabled
+from .registry import get_registry
+from .rollups import MINUTE, apply_values, fetch_rollups, rollup_lookups
+from .stats import invalidate_fleet_summary
+
+# Значений в одной пачке сжатия
+COMPACT_BATCH_SIZE = 5000
+
+
+def retention_cutoff(raw_days, now=None):
+    """Граница хранения: начало суток UTC raw_days дней назад."""
+    moment = (now or timezone.now()) - timedelta(days=raw_days)
+    moment = moment.astimezone(dt_timezone.utc)
+    return datetime(moment.year, moment.month, moment.day,
+                    tzinfo=dt_timezone.utc)
+
+
+def retention_plan(engines=None, now=None):
+    """
+    Границы хранения по активным политикам.
+
+    Args:
+        engines: Двигатели (по умолчанию - все)
+        now: Текущий момент
+
+    Returns:
+        dict: {двигатель: {граница: [id типов параметров]}}
+    """
+    policies = {
+        (policy.engine_id, policy.parameter_type_id): policy.raw_days
+        for policy in RetentionPolicy.objects.filter(is_active=True)
+    }
+    registry = get_registry()
+    plan = {}
+    for engine in engines if engines is not None else registry.engines:
+        for parameter_type in registry.parameters:
+            for key in ((engine.pk, parameter_type.pk),
+                        (None, parameter_type.pk), (engine.pk, None),
+                        (None, None)):
+                if key in policies:
+                    cutoff = retention_cutoff(policies[key], now)
+                    plan.setdefault(engine, {}).setdefault(
+                        cutoff, []
+                    ).append(parameter_type.pk)
+                    break
+    return plan
+
+
+def compact_values(engine, parameter_type_ids, cutoff,
+                   batch_size=COMPACT_BATCH_SIZE):
+    """
+    Сжатие значений параметров двигателя раньше cutoff.
+
+    Версии данных графиков двигателя (monitoring.caching) меняет
+    вызывающий код: модуль кэша сам зависит от сырых рядов.
+
+    Args:
+        engine: Двигатель (объект из базы, не из справочников в памяти)
+        parameter_type_ids: Сжимаемые параметры
+        cutoff: Граница (начало суток UTC)
+        batch_size: Значений в одной транзакции
+
+    Returns:
+        tuple: (удалено значений, удалено опустевших замеров)
+    """
+    if engine.compacted_until is None or engine.compacted_until < cutoff:
+        # До удаления: ряды сразу начинают читать минутные агрегаты
+        engine.compacted_until = cutoff
+        engine.save(update_fields=['compacted_until'])
+
+    values = ParameterValue.objects.filter(
+        measurement__engine=engine,
+        parameter_type_id__in=parameter_type_ids,
+        measurement__timestamp__lt=cutoff,
+    ).order_by('measurement__timestamp', 'pk')
+
+    values_deleted = 0
+    measurements_deleted = 0
+    while True:
+        with transaction.atomic():
+            rows = list(values.values_list(
+                'pk', 'measurement_id', 'parameter_type_id',
+                'measurement__timestamp', 'value',
+            )[:batch_size])
+            if not rows:
+                break
+            pks, measurement_ids, *_ = zip(*rows)
+            measurement_ids = set(measurement_ids)
+
+            apply_values([
+                (engine.pk, parameter_type_id, timestamp, value)
+                for _, _, parameter_type_id, timestamp, value in rows
+            ], resolutions=(MINUTE,))
+
+            batch = ParameterValue.objects.filter(pk__in=pks)
+            values_deleted += batch._raw_delete(batch.db)
+            emptied = Measurement.objects.filter(
+                pk__in=measurement_ids
+            ).filter(~Exists(
+                ParameterValue.objects.filter(measurement=OuterRef('pk'))
+            ))
+            measurements_deleted += emptied._raw_delete(emptied.db)
+            if packed_values_enabled():
+                pack_measurements(
+                    Measurement.objects.filter(pk__in=measurement_ids)
+                )
+    if measurements_deleted:
+        invalidate_fleet_summary()
+    return values_deleted, measurements_deleted
+
+
+def _compacted_engine_ids(measurement_filters):
+    """Двигатели фильтра, у которых период может захватывать сжатие."""
+    start = (measurement_filters.get('timestamp__gte')
+             or measurement_filters.get('timestamp__gt'))
+    return [
+        engine.pk
+        for engine in get_registry().filter_engines(measurement_filters)
+        if engine.compacted_until is not None
+        and (start is None or start < engine.compacted_until)
+    ]
+
+
+def _compacted_rollups(measurement_filters):
+    """Минутные агрегаты периода или None, если сжатых значений нет."""
+    engine_ids = _compacted_engine_ids(measurement_filters)
+    lookups = rollup_lookups(measurement_filters, MINUTE)
+    if not engine_ids or lookups is None:
+        return None
+    return ParameterRollup.objects.filter(
+        resolution=MINUTE, engine_id__in=engine_ids, **lookups
+    )
+
+
+def compacted_series(parameter_type, measurement_filters=None):
+    """
+    Средние минутных агрегатов параметра за период фильтра.
+
+    Returns:
+        tuple: (метки времени мс UTC, значения) по возрастанию времени
+            или None, если сжатых значений в периоде быть не может
+    """
+    measurement_filters = measurement_filters or {}
+    if not _compacted_engine_ids(measurement_filters):
+        return None
+    if rollup_lookups(measurement_filters, MINUTE) is None:
+        return None
+    buckets = fetch_rollups(parameter_type, measurement_filters, MINUTE)
+    if not len(buckets):
+        return None
+    return buckets.timestamps, buckets.averages
+
+
+def compacted_parameter_ids(measurement_filters=None):
+    """Id типов параметров со сжатыми значениями в периоде."""
+    rollups = _compacted_rollups(measurement_filters or {})
+    if rollups is None:
+        return set()
+    return set(rollups.order_by().values_list(
+        'parameter_type_id', flat=True
+    ).distinct())
+
+
+def compacted_measurement_count(measurement_filters=None, limit=None):
+    """Число строк compacted_measurements, не больше limit."""
+    rollups = _compacted_rollups(measurement_filters or {})
+    if rollups is None:
+        return 0
+    minutes = rollups.order_by().values('bucket', 'engine_id').distinct()
+    return (minutes[:limit] if limit is not None else minutes).count()
+
+
+def compacted_measurements(measurement_filters=None, chunk_size=5000):
+    """
+    Сжатый период в виде замеров: по строке на минуту двигателя
+    со средними значениями параметров.
+
+    Yields:
+        tuple: (начало минуты, id двигателя, {id типа параметра:
+            среднее}) по возрастанию времени
+    """
+    rollups = _compacted_rollups(measurement_filters or {})
+    if rollups is None:
+        return
+    current = None
+    values = {}
+    for bucket, engine_id, parameter_type_id, total, count in rollups.order_by(
+        'bucket', 'engine_id'
+    ).values_list(
+        'bucket', 'engine_id', 'parameter_type_id', 'sum', 'count'
+    ).iterator(chunk_size=chunk_size):
+        if (bucket, engine_id) != current:
+            if current is not None:
+                yield current + (values,)
+            current = (bucket, engine_id)
+            values = {}
+        values[parameter_type_id] = total / count
+    if current is not None:
+        yield current + (values,)
@@ -0,0 +1,422 @@
+"""
+Часовые и суточные агрегаты значений параметров (ParameterRollup).
+
+Агрегаты хранят число значений, минимум, максимум, сумму и сумму
+квадратов по двигателю, параметру и интервалу времени (UTC). Новые
+значения добавляются к агрегатам инкрементально: импорт передает
+пачку целиком, единичные записи - сигналы post_save. При удалении или
+изменении значений интервал пересчитывается из сырых данных, потому что
+минимум и максимум нельзя "вычесть"; для месяцев, перенесенных в архив,
+к сырым данным добавляются значения из его файлов, а для периода
+сжатия - минутные агрегаты. Команда rebuild_rollups пересобирает
+агрегаты полностью.
+
+Для графика за период выбирается самый детальный источник, который
+укладывается в лимиты: сырые значения, часовые или суточные агрегаты.
+
+Минутные агрегаты создаются только при сжатии старых сырых значений
+(monitoring.retention) и заменяют их в сырых рядах.
+"""
+from datetime import timedelta, timezone as dt_timezone
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDay, TruncHour
+
+from .archive import archived_values
+from .models import ParameterRollup, ParameterValue
+from .registry import get_registry
+from .upsert import ADD, GREATEST, LEAST, upsert
+
+RAW = 'raw'
+MINUTE = ParameterRollup.RESOLUTION_MINUTE
+HOUR = ParameterRollup.RESOLUTION_HOUR
+DAY = ParameterRollup.RESOLUTION_DAY
+RESOLUTIONS = (HOUR, DAY)
+BUCKET_SIZES = {
+    MINUTE: timedelta(minutes=1),
+    HOUR: timedelta(hours=1),
+    DAY: timedelta(days=1),
+}
+
+# До стольких значений в периоде график строится по сырым данным
+RAW_POINTS_LIMIT = 20_000
+
+# Часовые агрегаты используются, пока интервалов не больше этого числа
+# (около года); для более длинных периодов - суточные
+MAX_HOURLY_BUCKETS = 10_000
+
+# Lookup-ы по Measurement, которые можно перевести на агрегаты
+_ROLLUP_LOOKUPS = {
+    'engine_id': 'engine_id',
+    'engine__vessel_id': 'engine__vessel_id',
+    'timestamp__gte': 'bucket__gte',
+    'timestamp__gt': 'bucket__gte',
+    'timestamp__lt': 'bucket__lt',
+    'timestamp__lte': 'bucket__lte',
+}
+
+_FIELDS = ('count', 'min', 'max', 'sum', 'sum_squares')
+_UNIQUE_FIELDS = ('parameter_type', 'resolution', 'engine', 'bucket')
+
+
+def bucket_start(timestamp, resolution):
+    """Начало интервала resolution (UTC), содержащего timestamp."""
+    timestamp = timestamp.astimezone(dt_timezone.utc)
+    if resolution == MINUTE:
+        return timestamp.replace(second=0, microsecond=0)
+    if resolution == HOUR:
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def apply_values(rows, resolutions=RESOLUTIONS):
+    """
+    Инкрементальное добавление новых значений к агрегатам.
+
+    Args:
+        rows: Последовательность (engine_id, parameter_type_id,
+            timestamp, value) только что записанных значений
+        resolutions: Интервалы обновляемых агрегатов
+    """
+    deltas = {}
+    for engine_id, parameter_type_id, timestamp, value in rows:
+        for resolution in resolutions:
+            key = (
+                engine_id, parameter_type_id, resolution,
+                bucket_start(timestamp, resolution),
+            )
+            delta = deltas.get(key)
+            if delta is None:
+                deltas[key] = [1, value, value, value, value * value]
+            else:
+                delta[0] += 1
+                delta[1] = min(delta[1], value)
+                delta[2] = max(delta[2], value)
+                delta[3] += value
+                delta[4] += value * value
+    if not deltas:
+        return
+
+    # Приращения складываются с агрегатами в самой базе, поэтому
+    # параллельные записи в один интервал не затирают друг друга
+    upsert(
+        ParameterRollup,
+        ('engine', 'parameter_type', 'resolution', 'bucket') + _FIELDS,
+        (key + tuple(delta) for key, delta in deltas.items()),
+        _UNIQUE_FIELDS,
+        {'count': ADD, 'min': LEAST, 'max': GREATEST, 'sum': ADD,
+         'sum_squares': ADD},
+    )
+
+
+def _aggregates():
+    return {
+        'count': Count('id'),
+        'min': Min('value'),
+        'max': Max('value'),
+        'sum': Sum('value'),
+        'sum_squares': Sum(F('value') * F('value')),
+    }
+
+
+def refresh_buckets(engine_id, timestamps, parameter_type_ids=None):
+    """
+    Пересчет интервалов, содержащих timestamps, из сырых и архивных
+    значений и минутных агрегатов сжатого периода.
+
+    Args:
+        engine_id: Двигатель
+        timestamps: Моменты времени, значения которых изменились
+        parameter_type_ids: Ограничить пересчет этими параметрами
+    """
+    engine = get_registry().engines_by_id.get(engine_id)
+    archived_until = getattr(engine, 'archived_until', None)
+    compacted_until = getattr(engine, 'compacted_until', None)
+    with transaction.atomic():
+        for resolution in RESOLUTIONS:
+            for bucket in {bucket_start(ts, resolution) for ts in timestamps}:
+                _rebuild_bucket(
+                    engine_id, resolution, bucket, parameter_type_ids,
+                    archived=archived_until is not None
+                    and bucket < archived_until,
+                    compacted=compacted_until is not None
+                    and bucket < compacted_until,
+                )
+
+
+def _rebuild_bucket(engine_id, resolution, bucket, parameter_type_ids,
+                    archived=False, compacted=False):
+    end = bucket + BUCKET_SIZES[resolution]
+    values = ParameterValue.objects.filter(
+        measurement__engine_id=engine_id,
+        measurement__timestamp__gte=bucket,
+        measurement__timestamp__lt=end,
+    )
+    rollups = ParameterRollup.objects.filter(
+        engine_id=engine_id, resolution=resolution, bucket=bucket
+    )
+    if parameter_type_ids is not None:
+        values = values.filter(parameter_type_id__in=parameter_type_ids)
+        rollups = rollups.filter(parameter_type_id__in=parameter_type_ids)
+
+    rows = {
+        row.pop('parameter_type_id'): row
+        for row in values.values('parameter_type_id').annotate(**_aggregates())
+    }
+    if archived:
+        # Сырых строк архивного месяца в базе нет - значения из файлов
+        for parameter_type_id, column in archived_values(
+            engine_id, bucket, end, parameter_type_ids
+        ).items():
+            _merge_row(rows, parameter_type_id, (
+                len(column), float(column.min()), float(column.max()),
+                float(column.sum()), float(np.dot(column, column)),
+            ))
+    if compacted:
+        # Сжатые значения остались только в минутных агрегатах
+        minutes = ParameterRollup.objects.filter(
+            engine_id=engine_id, resolution=MINUTE,
+            bucket__gte=bucket, bucket__lt=end,
+        )
+        if parameter_type_ids is not None:
+            minutes = minutes.filter(parameter_type_id__in=parameter_type_ids)
+        for parameter_type_id, *fields in minutes.values(
+            'parameter_type_id'
+        ).annotate(
+            total_count=Sum('count'), low=Min('min'), high=Max('max'),
+            total=Sum('sum'), squares=Sum('sum_squares'),
+        ).order_by().values_list(
+            'parameter_type_id', 'total_count', 'low', 'high', 'total',
+            'squares',
+        ):
+            _merge_row(rows, parameter_type_id, fields)
+
+    rollups.delete()
+    ParameterRollup.objects.bulk_create([
+        ParameterRollup(
+            engine_id=engine_id, parameter_type_id=parameter_type_id,
+            resolution=resolution, bucket=bucket, **row
+        )
+        for parameter_type_id, row in rows.items()
+    ])
+
+
+def _merge_row(rows, parameter_type_id, fields):
+    """Добавление агрегатов (count, min, max, sum, sum_squares) к строке."""
+    row = rows.get(parameter_type_id)
+    if row is None:
+        rows[parameter_type_id] = dict(zip(_FIELDS, fields))
+        return
+    count, low, high, total, squares = fields
+    row['count'] += count
+    row['min'] = min(row['min'], low)
+    row['max'] = max(row['max'], high)
+    row['sum'] += total
+    row['sum_squares'] += squares
+
+
+def rebuild_rollups(engine, batch_size=5000):
+    """
+    Полная пересборка агрегатов двигателя.
+
+    Часовые агрегаты группируются в базе из сырых значений, суточные -
+    из часовых. Агрегаты месяцев, перенесенных в архив
+    (Engine.archived_until), и периода сжатых значений
+    (Engine.compacted_until) сохраняются - сырых данных для них нет.
+    Минутные агрегаты не меняются.
+
+    Returns:
+        dict: Число созданных агрегатов по интервалам
+    """
+    rollups = ParameterRollup.objects.filter(
+        engine=engine, resolution__in=RESOLUTIONS
+    )
+    values = ParameterValue.objects.filter(measurement__engine=engine)
+    boundaries = [
+        boundary for boundary in (engine.archived_until, engine.compacted_until)
+        if boundary is not None
+    ]
+    if boundaries:
+        rollups = rollups.filter(bucket__gte=max(boundaries))
+        values = values.filter(measurement__timestamp__gte=max(boundaries))
+
+    hourly = values.values(
+        'parameter_type_id',
+        bucket=TruncHour('measurement__timestamp', tzinfo=dt_timezone.utc),
+    ).annotate(**_aggregates()).order_by()
+
+    daily = rollups.filter(resolution=HOUR).values(
+        'parameter_type_id',
+        day=TruncDay('bucket', tzinfo=dt_timezone.utc),
+    ).annotate(
+        total_count=Sum('count'), low=Min('min'), high=Max('max'),
+        total=Sum('sum'), squares=Sum('sum_squares'),
+    ).order_by()
+
+    with transaction.atomic():
+        rollups.delete()
+        hours = _bulk_create(engine, HOUR, (
+            (row['parameter_type_id'], row['bucket'], row['count'],
+             row['min'], row['max'], row['sum'], row['sum_squares'])
+            for row in hourly.iterator(chunk_size=batch_size)
+        ), batch_size)
+        days = _bulk_create(engine, DAY, (
+            (row['parameter_type_id'], row['day'], row['total_count'],
+             row['low'], row['high'], row['total'], row['squares'])
+            for row in daily.iterator(chunk_size=batch_size)
+        ), batch_size)
+    return {HOUR: hours, DAY: days}
+
+
+def _bulk_create(engine, resolution, rows, batch_size):
+    created = 0
+    batch = []
+    for parameter_type_id, bucket, *values in rows:
+        batch.append(ParameterRollup(
+            engine=engine, parameter_type_id=parameter_type_id,
+            resolution=resolution, bucket=bucket,
+            **dict(zip(_FIELDS, values)),
+        ))
+        if len(batch) >= batch_size:
+            ParameterRollup.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    ParameterRollup.objects.bulk_create(batch)
+    return created + len(batch)
+
+
+def rollup_lookups(measurement_filters, resolution):
+    """
+    Перевод lookup-ов по Measurement в lookup-ы по ParameterRollup.
+
+    Начало периода округляется вниз до интервала, поэтому первый
+    интервал может захватывать значения чуть раньше периода.
+
+    Returns:
+        dict: Lookup-ы или None, если какой-то фильтр не переводится
+    """
+    lookups = {}
+    for key, value in (measurement_filters or {}).items():
+        rollup_key = _ROLLUP_LOOKUPS.get(key)
+        if rollup_key is None:
+            return None
+        if rollup_key == 'bucket__gte':
+            value = bucket_start(value, resolution)
+        lookups[rollup_key] = value
+    return lookups
+
+
+def choose_resolution(parameter_type, measurement_filters=None):
+    """
+    Источник данных графика: RAW, HOUR или DAY.
+
+    Число значений и границы периода берутся одним запросом
+    по суточным агрегатам. Если агрегатов нет (еще не построены) или
+    фильтр не переводится на агрегаты, используются сырые значения.
+    """
+    lookups = rollup_lookups(measurement_filters, DAY)
+    if lookups is None:
+        return RAW
+    summary = ParameterRollup.objects.filter(
+        parameter_type=parameter_type, resolution=DAY, **lookups
+    ).aggregate(count=Sum('count'), first=Min('bucket'), last=Max('bucket'))
+    if not summary['count'] or summary['count'] <= RAW_POINTS_LIMIT:
+        return RAW
+
+    span = summary['last'] - summary['first'] + BUCKET_SIZES[DAY]
+    if span / BUCKET_SIZES[HOUR] <= MAX_HOURLY_BUCKETS:
+        return HOUR
+    return DAY
+
+
+class RollupBuckets:
+    """Агрегаты ряда по интервалам: метки времени (мс UTC) и массивы полей."""
+
+    __slots__ = ('timestamps', 'counts', 'mins', 'maxs', 'sums')
+
+    def __init__(self, timestamps, counts, mins, maxs, sums):
+        self.timestamps = timestamps
+        self.counts = counts
+        self.mins = mins
+        self.maxs = maxs
+        self.sums = sums
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def averages(self):
+        return self.sums / self.counts
+
+    def stats(self):
+        """Точная статистика всех значений периода."""
+        if not len(self):
+            return {'min': None, 'max': None, 'avg': None, 'count': 0}
+        return {
+            'min': float(self.mins.min()),
+            'max': float(self.maxs.max()),
+            'avg': float(self.sums.sum() / self.counts.sum()),
+            'count': int(self.counts.sum()),
+        }
+
+    def merge(self, max_points):
+        """
+        Объединение соседних интервалов до не более чем max_points.
+
+        В отличие от прореживания сырого ряда ничего не теряется:
+        минимум и максимум группы - крайние значения ее интервалов,
+        среднее взвешено числом значений.
+        """
+        if len(self) <= max_points:
+            return self
+        starts = np.unique(
+            np.linspace(0, len(self), max_points + 1).astype(np.int64)[:-1]
+        )
+        return RollupBuckets(
+            self.timestamps[starts],
+            np.add.reduceat(self.counts, starts),
+            np.minimum.reduceat(self.mins, starts),
+            np.maximum.reduceat(self.maxs, starts),
+            np.add.reduceat(self.sums, starts),
+        )
+
+
+def fetch_rollups(parameter_type, measurement_filters, resolution):
+    """
+    Агрегаты параметра за период, отсортированные по времени.
+
+    Агрегаты разных двигателей (фильтр по судну) объединяются
+    в базе по интервалу.
+
+    Returns:
+        RollupBuckets: Агрегаты по интервалам
+    """
+    rows = ParameterRollup.objects.filter(
+        parameter_type=parameter_type, resolution=resolution,
+        **rollup_lookups(measurement_filters, resolution)
+    ).values('bucket').annotate(
+        total_count=Sum('count'), low=Min('min'), high=Max('max'),
+        total=Sum('sum'),
+    ).order_by('bucket').values_list(
+        'bucket', 'total_count', 'low', 'high', 'total'
+    )
+
+    buckets, counts, mins, maxs, sums = [], [], [], [], []
+    for bucket, count, low, high, total in rows:
+        buckets.append(bucket)
+        counts.append(count)
+        mins.append(low)
+        maxs.append(high)
+        sums.append(total)
+
+    return RollupBuckets(
+        pd.DatetimeIndex(buckets).as_unit('ms').asi8
+        if buckets else np.empty(0, dtype=np.int64),
+        np.asarray(counts, dtype=np.int64),
+        np.asarray(mins, dtype=np.float64),
+        np.asarray(maxs, dtype=np.float64),
+        np.asarray(sums, dtype=np.float64),
+    )
@@ -0,0 +1,250 @@
+"""
+Построение временных рядов параметров для графиков.
+
+Ряд (timestamp, value) для одного параметра выбирается одним запросом
+к ParameterValue с join на Measurement и собирается в NumPy массивы.
+В компактном режиме (см. monitoring.packed) ряд разбирается из
+упакованных значений замеров без join. Если период захватывает
+архивные месяцы (см. monitoring.archive), ряд дополняется из архива,
+а за период сжатых значений (monitoring.retention) - средними
+минутных агрегатов.
+"""
+import numpy as np
+import pandas as pd
+
+from .archive import archived_series
+from .downsampling import MINMAX, downsample
+from .models import ParameterValue
+from .packed import packed_column, packed_rows, packed_values_enabled
+from .retention import compacted_series
+from .rollups import RAW, choose_resolution, fetch_rollups
+
+# Подписи оси X в формате ДД.ММ.ГГГГ ЧЧ:ММ собираются перестановкой
+# символов ISO-строки 'ГГГГ-ММ-ДДTЧЧ:ММ' (индексы символов ISO-строки)
+_LABEL_LAYOUT = (8, 9, '.', 5, 6, '.', 0, 1, 2, 3, ' ', 11, 12, 13, 14, 15)
+
+# Размер пачки строк при чтении из курсора
+FETCH_CHUNK_SIZE = 10000
+
+# Ограничения числа точек, отправляемых на график
+DEFAULT_MAX_POINTS = 2000
+MAX_POINTS_LIMIT = 10000
+
+
+class Series:
+    """Временной ряд одного параметра: метки времени (мс UTC) и значения."""
+
+    __slots__ = ('timestamps', 'values')
+
+    def __init__(self, timestamps, values):
+        self.timestamps = timestamps
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+
+    def stats(self):
+        """Минимум, максимум и среднее по полному (непрореженному) ряду."""
+        if not len(self):
+            return {'min': None, 'max': None, 'avg': None, 'count': 0}
+        return {
+            'min': float(self.values.min()),
+            'max': float(self.values.max()),
+            'avg': float(self.values.mean()),
+            'count': len(self),
+        }
+
+    def merge(self, other):
+        """Объединение с другим рядом в порядке времени."""
+        if not len(other):
+            return self
+        if not len(self):
+            return other
+        timestamps = np.concatenate([self.timestamps, other.timestamps])
+        order = np.argsort(timestamps, kind='stable')
+        return Series(
+            timestamps[order],
+            np.concatenate([self.values, other.values])[order],
+        )
+
+    def downsample(self, max_points, method=MINMAX):
+        """Прореженная копия ряда (или сам ряд, если точек достаточно мало)."""
+        timestamps, values = downsample(
+            self.timestamps, self.values, max_points, method
+        )
+        return Series(timestamps, values)
+
+
+def series_queryset(parameter_type, measurement_filters=None):
+    """
+    Запрос (время, значение) ряда параметра, отсортированный по времени.
+
+    Args:
+        parameter_type: Тип параметра (объект или id)
+        measurement_filters: Словарь lookup-ов по Measurement
+            (например, {'engine_id': 1, 'timestamp__gte': dt})
+    """
+    lookups = {
+        f'measurement__{key}': value
+        for key, value in (measurement_filters or {}).items()
+    }
+    return ParameterValue.objects.filter(
+        parameter_type=parameter_type, **lookups
+    ).order_by('measurement__timestamp').values_list(
+        'measurement__timestamp', 'value'
+    )
+
+
+def fetch_series(parameter_type, measurement_filters=None):
+    """
+    Загрузка ряда параметра из базы и, если нужно, из архива.
+
+    Args:
+        parameter_type: Тип параметра (объект или id)
+        measurement_filters: Словарь lookup-ов по Measurement
+            (например, {'engine_id': 1, 'timestamp__gte': dt})
+
+    Returns:
+        Series: Ряд, отсортированный по времени
+    """
+    series = None
+    if packed_values_enabled():
+        series = fetch_packed_series(parameter_type, measurement_filters)
+    if series is None:
+        series = fetch_row_series(parameter_type, measurement_filters)
+
+    archived = archived_series(parameter_type, measurement_filters)
+    if archived is not None:
+        series = series.merge(Series(*archived))
+    compacted = compacted_series(parameter_type, measurement_filters)
+    if compacted is not None:
+        series = series.merge(Series(*compacted))
+    return series
+
+
+def fetch_row_series(parameter_type, measurement_filters=None):
+    """Загрузка ряда из строк ParameterValue одним SQL-запросом."""
+    rows = series_queryset(parameter_type, measurement_filters)
+
+    timestamps = []
+    values = []
+    for timestamp, value in rows.iterator(chunk_size=FETCH_CHUNK_SIZE):
+        timestamps.append(timestamp)
+        values.append(value)
+
+    if not values:
+        return Series.empty()
+
+    return Series(
+        pd.DatetimeIndex(timestamps).as_unit('ms').asi8,
+        np.asarray(values, dtype=np.float64),
+    )
+
+
+def fetch_packed_series(parameter_type, measurement_filters=None):
+    """
+    Загрузка ряда из упакованных значений замеров (без join).
+
+    Returns:
+        Series: Ряд или None, если у части замеров периода нет
+            упакованных значений (например, до pack_measurements)
+    """
+    rows = list(packed_rows(measurement_filters).iterator(
+        chunk_size=FETCH_CHUNK_SIZE
+    ))
+    if any(layout_id is None for _, layout_id, _ in rows):
+        return None
+    return Series(*packed_column(
+        rows, getattr(parameter_type, 'pk', parameter_type)
+    ))
+
+
+def serialize_series(series, parameter_type, stats=None):
+    """
+    Сериализация ряда в формат графика за один проход.
+
+    Args:
+        series: Ряд параметра
+        parameter_type: Тип параметра для подписи
+        stats: Статистика полного ряда, если series прорежен
+
+    Returns:
+        dict: Данные для графика
+    """
+    if stats is None:
+        stats = series.stats()
+    return {
+        'labels': format_labels(series.timestamps),
+        'timestamps': series.timestamps.tolist(),
+        'values': series.values.tolist(),
+        'parameter_name': parameter_type.name,
+        'parameter_unit': parameter_type.unit,
+        'stats': stats,
+        'downsampled': len(series) < stats['count'],
+    }
+
+
+def format_labels(timestamps):
+    """Векторное форматирование меток времени (мс UTC) в подписи графика."""
+    if not len(timestamps):
+        return []
+    iso = np.datetime_as_string(
+        np.asarray(timestamps, dtype='datetime64[ms]'), unit='m'
+    ).astype('S16').view('S1').reshape(-1, 16)
+
+    labels = np.empty_like(iso)
+    for position, source in enumerate(_LABEL_LAYOUT):
+        if isinstance(source, int):
+            labels[:, position] = iso[:, source]
+        else:
+            labels[:, position] = source.encode()
+    return labels.view('S16').ravel().astype('U16').tolist()
+
+
+def build_chart_data(parameter_type, measurement_filters=None,
+                     max_points=DEFAULT_MAX_POINTS, method=MINMAX):
+    """
+    Загрузка, прореживание и сериализация ряда параметра для графика.
+
+    Источник выбирается по объему данных периода: сырые значения,
+    часовые или суточные агрегаты (см. monitoring.rollups). Число точек
+    в ответе не превышает MAX_POINTS_LIMIT независимо от длины периода.
+    """
+    max_points = min(max_points, MAX_POINTS_LIMIT)
+    resolution = choose_resolution(parameter_type, measurement_filters)
+    if resolution != RAW:
+        return build_rollup_chart_data(
+            parameter_type, measurement_filters, resolution, max_points
+        )
+
+    series = fetch_series(parameter_type, measurement_filters)
+    data = serialize_series(
+        series.downsample(max_points, method), parameter_type, series.stats()
+    )
+    data['resolution'] = RAW
+    return data
+
+
+def build_rollup_chart_data(parameter_type, measurement_filters, resolution,
+                            max_points=DEFAULT_MAX_POINTS):
+    """
+    Данные графика по агрегатам: средние по интервалам и их минимумы
+    и максимумы для отрисовки диапазона значений.
+    """
+    buckets = fetch_rollups(parameter_type, measurement_filters, resolution)
+    stats = buckets.stats()
+    buckets = buckets.merge(max_points)
+
+    data = serialize_series(
+        Series(buckets.timestamps, buckets.averages), parameter_type, stats
+    )
+    data.update({
+        'resolution': resolution,
+        'min_values': buckets.mins.tolist(),
+        'max_values': buckets.maxs.tolist(),
+    })
+    return data
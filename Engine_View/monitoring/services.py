@@ -0,0 +1,181 @@
+"""
+Запись замеров: единая точка для формы создания, импорта и API.
+
+Замеры и значения пишутся пачками bulk_create в одной транзакции.
+bulk_create не отправляет сигналы post_save, поэтому производные данные
+обновляются здесь же и тоже пачкой: агрегаты (monitoring.rollups),
+текущие значения (monitoring.latest), а после фиксации - сводка флота
+и версия данных двигателя в кэше графиков. В компактном режиме
+замеры сразу получают упакованные значения (monitoring.packed).
+
+Пределы min/max типа параметра жестко проверяет только ручной ввод
+(record_measurement); импорт и API пишут значения как есть, а выходы
+за пределы отмечаются тревогами (monitoring.alarms).
+"""
+from functools import partial
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .alarms import alarms_enabled, detect_new_values
+from .caching import bump_engine_versions
+from .latest import apply_latest
+from .live import has_subscribers, publish_values
+from .models import Measurement, ParameterValue
+from .packed import layout_for, pack_values, packed_values_enabled
+from .registry import get_registry
+from .rollups import apply_values
+from .stats import invalidate_fleet_summary
+
+
+def range_error(parameter_type, value):
+    """
+    Проверка значения по min_value/max_value типа параметра.
+
+    Returns:
+        str: Сообщение об ошибке или None, если значение в диапазоне
+    """
+    low = parameter_type.min_value
+    high = parameter_type.max_value
+    if low is not None and value < low:
+        return (f"Значение {value} меньше минимального {low} "
+                f"{parameter_type.unit}".rstrip())
+    if high is not None and value > high:
+        return (f"Значение {value} больше максимального {high} "
+                f"{parameter_type.unit}".rstrip())
+    return None
+
+
+def _parameter_types(values):
+    """Типы параметров для ключей словаря значений (объекты или id)."""
+    parameters = get_registry().parameters_by_id
+    resolved = {}
+    for key, value in values.items():
+        parameter_type = parameters.get(getattr(key, 'pk', key))
+        if parameter_type is None:
+            raise ValidationError(f"Неизвестный параметр: {key}")
+        resolved[parameter_type] = value
+    return resolved
+
+
+def record_measurement(engine, timestamp, values, user=None, notes=''):
+    """
+    Проверка и запись одного замера со значениями параметров.
+
+    Все значения проверяются за один проход; при ошибках ничего
+    не записывается.
+
+    Args:
+        engine: Двигатель
+        timestamp: Время замера
+        values: Словарь {тип параметра или его id: значение}
+        user: Автор замера
+        notes: Примечания
+
+    Returns:
+        Measurement: Созданный замер
+
+    Raises:
+        ValidationError: Со словарем {код параметра: сообщение}
+            для значений вне диапазона
+    """
+    values = _parameter_types(values)
+    errors = {}
+    for parameter_type, value in values.items():
+        message = range_error(parameter_type, value)
+        if message:
+            errors[parameter_type.code] = message
+    if errors:
+        raise ValidationError(errors)
+
+    measurement, = record_measurements(
+        engine, [(timestamp, {
+            parameter_type.pk: value
+            for parameter_type, value in values.items()
+        })], user, notes,
+    )
+    return measurement
+
+
+def record_measurements(engine, rows, user=None, notes='', batch_size=None):
+    """
+    Запись пачки проверенных замеров одного двигателя.
+
+    Args:
+        engine: Двигатель
+        rows: Список (время, {id типа параметра: значение})
+        user: Автор замеров
+        notes: Примечания для всех замеров пачки
+        batch_size: Размер пачки одного INSERT
+
+    Returns:
+        list: Созданные замеры в порядке rows
+    """
+    return record_batches([(engine, rows)], user, notes, batch_size)
+
+
+def record_batches(batches, user=None, notes='', batch_size=None):
+    """
+    Запись проверенных замеров нескольких двигателей одной транзакцией.
+
+    Замеры всех двигателей пишутся общими bulk_create, агрегаты
+    и текущие значения обновляются одним проходом.
+
+    Args:
+        batches: Список (двигатель, [(время, {id типа параметра:
+            значение})])
+        user: Автор замеров
+        notes: Примечания для всех замеров
+        batch_size: Размер пачки одного INSERT
+
+    Returns:
+        list: Созданные замеры в порядке batches и строк в них
+    """
+    rows = [
+        (engine, timestamp, values)
+        for engine, engine_rows in batches
+        for timestamp, values in engine_rows
+    ]
+    with transaction.atomic():
+        measurements = [
+            Measurement(
+                engine=engine, timestamp=timestamp, created_by=user,
+                notes=notes,
+            )
+            for engine, timestamp, _ in rows
+        ]
+        if packed_values_enabled():
+            layout = layout_for(
+                {pk for _, _, values in rows for pk in values}
+            )
+            for measurement, (_, _, values) in zip(measurements, rows):
+                measurement.layout = layout
+                measurement.packed_values = pack_values(layout, values)
+        Measurement.objects.bulk_create(measurements, batch_size=batch_size)
+
+        ParameterValue.objects.bulk_create([
+            ParameterValue(
+                measurement_id=measurement.pk,
+                parameter_type_id=parameter_type_id,
+                value=value,
+            )
+            for measurement, (_, _, values) in zip(measurements, rows)
+            for parameter_type_id, value in values.items()
+        ], batch_size=batch_size)
+
+        derived = [
+            (engine.pk, parameter_type_id, timestamp, value)
+            for engine, timestamp, values in rows
+            for parameter_type_id, value in values.items()
+        ]
+        apply_values(derived)
+        apply_latest(derived)
+
+        engine_ids = [engine.pk for engine, _ in batches]
+        transaction.on_commit(invalidate_fleet_summary)
+        transaction.on_commit(partial(bump_engine_versions, engine_ids))
+        if has_subscribers():
+            transaction.on_commit(partial(publish_values, derived))
+        if alarms_enabled():
+            transaction.on_commit(partial(detect_new_values, derived))
+    return measurements
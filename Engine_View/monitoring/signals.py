@@ -0,0 +1,182 @@
+"""
+Реакция на изменение данных мониторинга: сброс кэшированных сводок,
+справочников (monitoring.registry) и версий данных двигателей
+(monitoring.caching), обновление агрегатов (monitoring.rollups),
+текущих значений (monitoring.latest) и упакованных значений замеров
+(monitoring.packed), удаление файлов архива (monitoring.archive).
+
+Массовые операции (bulk_create в импорте) сигналы не отправляют
+и обновляют агрегаты, текущие значения и кэш сами.
+"""
+import shutil
+from functools import partial
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from .alarms import alarms_enabled, detect_new_values
+from .archive import get_archive_root
+from .caching import bump_engine_versions
+from .latest import apply_latest, refresh_latest
+from .live import has_subscribers, publish_values
+from .models import (
+    ArchivedMonth,
+    Engine,
+    Measurement,
+    ParameterType,
+    ParameterValue,
+    Vessel,
+)
+from .packed import pack_measurement, packed_values_enabled
+from .registry import invalidate_registry
+from .rollups import apply_values, refresh_buckets
+from .stats import invalidate_fleet_summary
+
+
+@receiver([post_save, post_delete], sender=Vessel)
+@receiver([post_save, post_delete], sender=Engine)
+@receiver([post_save, post_delete], sender=Measurement)
+def fleet_changed(sender, **kwargs):
+    # После фиксации транзакции, иначе параллельный запрос может
+    # снова закэшировать данные без этого изменения
+    transaction.on_commit(invalidate_fleet_summary)
+
+
+@receiver([post_save, post_delete], sender=Vessel)
+@receiver([post_save, post_delete], sender=Engine)
+@receiver([post_save, post_delete], sender=ParameterType)
+def reference_data_changed(sender, **kwargs):
+    # Сразу - чтобы этот же процесс видел изменение, и после фиксации -
+    # чтобы снимок, прочитанный другим процессом до нее, устарел
+    invalidate_registry()
+    transaction.on_commit(invalidate_registry)
+
+
+def _engines_changed(*engine_ids):
+    # Как и сводку, версию меняем после фиксации: иначе график, собранный
+    # до фиксации по старым данным, попадет в кэш под новой версией
+    transaction.on_commit(partial(bump_engine_versions, engine_ids))
+
+
+@receiver([post_save, post_delete], sender=Measurement)
+def measurement_changed(sender, instance, **kwargs):
+    _engines_changed(instance.engine_id)
+
+
+def _origin_model(origin):
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+def _owner_deleted(origin):
+    """Удаление начато с судна, двигателя или параметра."""
+    return _origin_model(origin) in (Vessel, Engine, ParameterType)
+
+
+@receiver(post_save, sender=ParameterValue)
+def parameter_value_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    measurement = instance.measurement
+    _engines_changed(measurement.engine_id)
+    if packed_values_enabled():
+        pack_measurement(measurement)
+    if created:
+        row = (
+            measurement.engine_id, instance.parameter_type_id,
+            measurement.timestamp, instance.value,
+        )
+        apply_values([row])
+        apply_latest([row])
+        if has_subscribers():
+            transaction.on_commit(partial(publish_values, [row]))
+        if alarms_enabled():
+            transaction.on_commit(partial(detect_new_values, [row]))
+    else:
+        # Старое значение неизвестно - интервал пересчитывается целиком
+        refresh_buckets(measurement.engine_id, [measurement.timestamp])
+        refresh_latest(measurement.engine_id, [instance.parameter_type_id])
+
+
+@receiver(post_delete, sender=ParameterValue)
+def parameter_value_deleted(sender, instance, origin=None, **kwargs):
+    # Агрегаты и текущие значения удаляются каскадом вместе с владельцем,
+    # а при удалении замера пересчитываются один раз в measurement_deleted
+    if _owner_deleted(origin) or _origin_model(origin) is Measurement:
+        return
+    measurement = instance.measurement
+    _engines_changed(measurement.engine_id)
+    if packed_values_enabled():
+        pack_measurement(measurement)
+    refresh_buckets(
+        measurement.engine_id, [measurement.timestamp],
+        [instance.parameter_type_id],
+    )
+    refresh_latest(measurement.engine_id, [instance.parameter_type_id])
+
+
+@receiver(pre_delete, sender=Measurement)
+def remember_measurement_parameters(sender, instance, origin=None, **kwargs):
+    instance._rollup_parameter_type_ids = None
+    if _owner_deleted(origin):
+        return
+    # Один запрос до каскада: значения замера удаляются вместе с ним
+    instance._rollup_parameter_type_ids = set(
+        instance.parameter_values.values_list('parameter_type_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Measurement)
+def measurement_deleted(sender, instance, **kwargs):
+    parameter_type_ids = getattr(instance, '_rollup_parameter_type_ids', None)
+    if not parameter_type_ids:
+        return
+    refresh_buckets(
+        instance.engine_id, [instance.timestamp], parameter_type_ids
+    )
+    refresh_latest(
+        instance.engine_id, parameter_type_ids, [instance.timestamp]
+    )
+
+
+@receiver(pre_save, sender=Measurement)
+def remember_measurement_position(sender, instance, raw=False, **kwargs):
+    instance._rollup_position = None
+    if raw or instance.pk is None:
+        return
+    instance._rollup_position = Measurement.objects.filter(
+        pk=instance.pk
+    ).values_list('engine_id', 'timestamp').first()
+
+
+@receiver(post_save, sender=Measurement)
+def measurement_moved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_rollup_position', None)
+    if created or previous is None:
+        return
+    if previous == (instance.engine_id, instance.timestamp):
+        return
+    # Значения замера переехали в другой интервал или к другому двигателю
+    _engines_changed(previous[0])
+    parameter_type_ids = list(
+        instance.parameter_values.values_list('parameter_type_id', flat=True)
+    )
+    for engine_id, timestamp in (previous,
+                                 (instance.engine_id, instance.timestamp)):
+        refresh_buckets(engine_id, [timestamp])
+        refresh_latest(engine_id, parameter_type_ids)
+
+
+@receiver(post_delete, sender=ArchivedMonth)
+def archived_month_deleted(sender, instance, **kwargs):
+    # Файлы удаляются только после фиксации, чтобы откат не оставил
+    # строку архива без каталога
+    transaction.on_commit(partial(
+        shutil.rmtree, get_archive_root() / instance.path, ignore_errors=True
+    ))
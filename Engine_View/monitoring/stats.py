@@ -0,0 +1,283 @@
+"""
+Сводная статистика по судам и двигателям.
+
+Статистика параметров считается по суточным агрегатам
+(monitoring.rollups): один сгруппированный запрос по парам
+двигатель-параметр, объем которого зависит от числа суток, а не от
+числа значений. Агрегаты сохраняются при переносе в архив и сжатии,
+поэтому статистика учитывает и эти периоды. Если период задан
+не целыми сутками UTC, неполные крайние сутки досчитываются по часовым
+агрегатам, а неполные часы - по сырым значениям. Текущие значения
+читаются из LatestValue (см. monitoring.latest), суда и двигатели -
+из справочников в памяти (monitoring.registry).
+
+Сводка флота для главной страницы кэшируется и сбрасывается сигналами
+при изменении судов, двигателей и замеров (см. monitoring.signals).
+"""
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Min, Q, Sum
+
+from .models import (
+    Engine,
+    LatestValue,
+    Measurement,
+    ParameterRollup,
+    ParameterValue,
+    Vessel,
+)
+from .registry import get_registry
+
+FLEET_SUMMARY_CACHE_KEY = 'monitoring:fleet_summary'
+
+
+def get_summary_timeout():
+    """Срок жизни сводки в кэше, MONITORING_SUMMARY_CACHE_TIMEOUT."""
+    return getattr(settings, 'MONITORING_SUMMARY_CACHE_TIMEOUT', 300)
+
+
+def fleet_summary():
+    """
+    Счетчики флота: суда, двигатели, замеры и время последнего замера.
+
+    Returns:
+        dict: {'vessels_count', 'engines_count', 'measurements_count',
+            'last_measurement_date'}
+    """
+    summary = cache.get(FLEET_SUMMARY_CACHE_KEY)
+    if summary is None:
+        measurements = Measurement.objects.aggregate(
+            measurements_count=Count('pk'),
+            last_measurement_date=Max('timestamp'),
+        )
+        summary = {
+            'vessels_count': Vessel.objects.count(),
+            'engines_count': Engine.objects.count(),
+            **measurements,
+        }
+        cache.set(FLEET_SUMMARY_CACHE_KEY, summary, get_summary_timeout())
+    return summary
+
+
+def invalidate_fleet_summary():
+    """Сброс сводки флота после записи судов, двигателей или замеров."""
+    cache.delete(FLEET_SUMMARY_CACHE_KEY)
+
+
+# Агрегаты для статистики от крупных к мелким. Модуль агрегатов
+# не импортируется: он зависит от архива, а архив - от этого модуля.
+_STATS_RESOLUTIONS = (
+    (ParameterRollup.RESOLUTION_DAY, timedelta(days=1)),
+    (ParameterRollup.RESOLUTION_HOUR, timedelta(hours=1)),
+)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _floor(moment, step):
+    return _EPOCH + (moment - _EPOCH) // step * step
+
+
+def _ceil(moment, step):
+    return _EPOCH - (_EPOCH - moment) // step * step
+
+
+def _split_period(start, end):
+    """
+    Разбиение периода на целые интервалы агрегатов и сырые остатки.
+
+    Returns:
+        tuple: ([(интервал агрегатов, начало, конец)], [(начало, конец)]
+            остатков по сырым значениям); None - без ограничения
+    """
+    rollup_parts = []
+    rest = [(start, end)]
+    for resolution, step in _STATS_RESOLUTIONS:
+        parts, rest = rest, []
+        for part_start, part_end in parts:
+            whole_start = (_ceil(part_start, step)
+                           if part_start is not None else None)
+            whole_end = (_floor(part_end, step)
+                         if part_end is not None else None)
+            if whole_start is not None and whole_end is not None \
+                    and whole_start >= whole_end:
+                rest.append((part_start, part_end))
+                continue
+            rollup_parts.append((resolution, whole_start, whole_end))
+            if part_start is not None and part_start < whole_start:
+                rest.append((part_start, whole_start))
+            if part_end is not None and whole_end < part_end:
+                rest.append((whole_end, part_end))
+    return rollup_parts, rest
+
+
+def parameter_stats(start=None, end=None):
+    """
+    Статистика значений по парам двигатель-параметр за период.
+
+    Целые сутки UTC берутся из суточных агрегатов, целые часы неполных
+    крайних суток - из часовых, неполные часы - из сырых значений.
+
+    Args:
+        start: Начало периода (включительно) или None
+        end: Конец периода (не включается) или None
+
+    Returns:
+        dict: {(id двигателя, id параметра): {'count', 'min', 'max',
+            'avg', 'std', 'first_day', 'last_day'}}, где first_day
+            и last_day - сутки UTC первого и последнего значения
+            в периоде
+    """
+    rollup_parts, raw_parts = _split_period(start, end)
+
+    totals = {}
+
+    def add(rows):
+        for engine_id, parameter_type_id, count, low, high, total, \
+                squares, first, last in rows:
+            row = totals.get((engine_id, parameter_type_id))
+            if row is None:
+                totals[engine_id, parameter_type_id] = [
+                    count, low, high, total, squares, first, last
+                ]
+                continue
+            row[0] += count
+            row[1] = min(row[1], low)
+            row[2] = max(row[2], high)
+            row[3] += total
+            row[4] += squares
+            row[5] = min(row[5], first)
+            row[6] = max(row[6], last)
+
+    if rollup_parts:
+        condition = Q()
+        for resolution, part_start, part_end in rollup_parts:
+            part = Q(resolution=resolution)
+            if part_start is not None:
+                part &= Q(bucket__gte=part_start)
+            if part_end is not None:
+                part &= Q(bucket__lt=part_end)
+            condition |= part
+        add(ParameterRollup.objects.filter(condition).values(
+            'engine_id', 'parameter_type_id',
+        ).annotate(
+            total_count=Sum('count'), low=Min('min'), high=Max('max'),
+            total=Sum('sum'), squares=Sum('sum_squares'),
+            # Начала интервалов: сутки UTC те же, что у значений
+            first=Min('bucket'), last=Max('bucket'),
+        ).order_by().values_list(
+            'engine_id', 'parameter_type_id', 'total_count', 'low', 'high',
+            'total', 'squares', 'first', 'last',
+        ))
+    if raw_parts:
+        condition = Q()
+        for part_start, part_end in raw_parts:
+            condition |= Q(measurement__timestamp__gte=part_start,
+                           measurement__timestamp__lt=part_end)
+        add(ParameterValue.objects.filter(condition).values(
+            'measurement__engine_id', 'parameter_type_id',
+        ).annotate(
+            count=Count('id'), low=Min('value'), high=Max('value'),
+            total=Sum('value'), squares=Sum(F('value') * F('value')),
+            first=Min('measurement__timestamp'),
+            last=Max('measurement__timestamp'),
+        ).order_by().values_list(
+            'measurement__engine_id', 'parameter_type_id', 'count', 'low',
+            'high', 'total', 'squares', 'first', 'last',
+        ))
+
+    stats = {}
+    for key, (count, low, high, total, squares, first,
+              last) in totals.items():
+        avg = total / count
+        stats[key] = {
+            'count': count,
+            'min': low,
+            'max': high,
+            'avg': avg,
+            # Погрешность округления может дать отрицательную дисперсию
+            'std': math.sqrt(max(squares / count - avg * avg, 0.0)),
+            'first_day': first.astimezone(dt_timezone.utc).date(),
+            'last_day': last.astimezone(dt_timezone.utc).date(),
+        }
+    return stats
+
+
+def fleet_stats(start=None, end=None):
+    """
+    Статистика флота для страницы vessel_engine_stats.
+
+    Числа, первые и последние сутки с данными относятся к периоду,
+    текущие значения параметров - к последнему замеру.
+
+    Args:
+        start: Начало периода (включительно) или None - вся история
+        end: Конец периода (не включается) или None
+
+    Returns:
+        list: Словари по судам {'vessel', 'engines_count',
+            'values_count', 'last_day', 'engines'}, где engines -
+            словари {'engine', 'values_count', 'first_day', 'last_day',
+            'parameters'}, а parameters - словари {'name', 'unit',
+            'count', 'min', 'max', 'avg', 'std', 'first_day',
+            'last_day', 'current', 'current_timestamp'}
+    """
+    registry = get_registry()
+    current = {
+        (latest.engine_id, latest.parameter_type_id): latest
+        for latest in LatestValue.objects.all()
+    }
+
+    parameters = {}
+    for (engine_id, parameter_type_id), row in parameter_stats(
+        start, end
+    ).items():
+        parameter_type = registry.parameters_by_id[parameter_type_id]
+        latest = current.get((engine_id, parameter_type_id))
+        parameters.setdefault(engine_id, []).append({
+            'name': parameter_type.name,
+            'unit': parameter_type.unit,
+            **row,
+            'current': latest.value if latest else None,
+            'current_timestamp': latest.timestamp if latest else None,
+        })
+
+    engines_by_vessel = {}
+    for engine in sorted(registry.engines, key=lambda engine: engine.name):
+        engine_parameters = sorted(
+            parameters.get(engine.pk, []), key=lambda param: param['name']
+        )
+        engines_by_vessel.setdefault(engine.vessel_id, []).append({
+            'engine': engine,
+            'values_count': sum(param['count'] for param in engine_parameters),
+            'first_day': min(
+                (param['first_day'] for param in engine_parameters),
+                default=None,
+            ),
+            'last_day': max(
+                (param['last_day'] for param in engine_parameters),
+                default=None,
+            ),
+            'parameters': engine_parameters,
+        })
+
+    stats = []
+    for vessel in sorted(registry.vessels, key=lambda vessel: vessel.name):
+        vessel_engines = engines_by_vessel.get(vessel.pk, [])
+        stats.append({
+            'vessel': vessel,
+            'engines_count': len(vessel_engines),
+            'values_count': sum(
+                engine['values_count'] for engine in vessel_engines
+            ),
+            'last_day': max(
+                (engine['last_day'] for engine in vessel_engines
+                 if engine['last_day']),
+                default=None,
+            ),
+            'engines': vessel_engines,
+        })
+    return stats
@@ -1,7 +1,71 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from unittest import mock
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.http import QueryDict
+from django.test import TestCase, override_settings
 from django.utils import timezone
-from .models import Vessel, Engine, Measurement
-from .forms import MeasurementFilterForm
+from openpyxl import Workbook, load_workbook
+
+from .alarms import ALARM_WINDOW, detect, detect_new_values
+from .archive import archive_month
+from .caching import (
+    ENGINE_VERSION_KEY,
+    bump_engine_versions,
+    cached_chart_data,
+    engine_versions,
+)
+from .jobs import claim_next_job, run_import_job
+from .latest import apply_latest
+from .models import (
+    Alarm,
+    ArchivedMonth,
+    ImportJob,
+    LatestValue,
+    Vessel,
+    Engine,
+    Measurement,
+    ParameterLayout,
+    ParameterType,
+    ParameterRollup,
+    ParameterValue,
+    RetentionPolicy,
+)
+from .export import export_row_count
+from .filters import form_lookups, measurement_lookups
+from .forms import MeasurementFilterForm, MeasurementWithParametersForm
+from .downsampling import LTTB, MIN_POINTS, MINMAX, downsample
+from .importers import MeasurementImporter
+from .ingest import IngestError, MeasurementIngestor, create_token
+from .live import event_stream, has_subscribers
+from .overlay import interpolate
+from .packed import clear_layout_cache, pack_measurements
+from .registry import REGISTRY_VERSION_KEY, get_registry
+from .retention import compact_values, retention_cutoff
+from .rollups import DAY, HOUR, MINUTE, RAW, apply_values, rebuild_rollups
+from .series import (
+    MAX_POINTS_LIMIT,
+    Series,
+    build_chart_data,
+    fetch_series,
+)
+from .services import record_measurement
+from .stats import fleet_stats, parameter_stats
+from .views import get_downsampling_params
 
 
 class MeasurementTestCase(TestCase):
@@ -16,12 +80,17 @@ class MeasurementTestCase(TestCase):
             model="ABC-123",
             serial_number="SN001"
         )
+        self.temperature = ParameterType.objects.create(
+            name="Температура", code="temperature", unit="°C"
+        )
         self.measurement = Measurement.objects.create(
             engine=self.engine,
             timestamp=timezone.now(),
-            temperature=85.5,
-            pressure=15.2,
-            rpm=1500
+        )
+        ParameterValue.objects.create(
+            measurement=self.measurement,
+            parameter_type=self.temperature,
+            value=85.5,
         )
 
     def test_measurement_creation(self):
@@ -40,3 +109,1984 @@ class MeasurementTestCase(TestCase):
         response = self.client.get('/monitoring/measurements/')
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Test Vessel")
+
+    def test_measurement_list_query_count(self):
+        parameters = [
+            ParameterType.objects.create(
+                name=f"Параметр {index}", code=f"param_{index}", unit="бар"
+            )
+            for index in range(6)
+        ]
+        for minute in range(120):
+            measurement = Measurement.objects.create(
+                engine=self.engine,
+                timestamp=timezone.now() - timedelta(minutes=minute),
+            )
+            ParameterValue.objects.bulk_create([
+                ParameterValue(
+                    measurement=measurement, parameter_type=param, value=1.0
+                )
+                for param in parameters
+            ])
+
+        # Статистика, страница и первые значения - независимо от числа
+        # замеров, значений и глубины страницы; списки фильтров берутся
+        # из справочника
+        get_registry()
+        pages = []
+        params = {}
+        while True:
+            with self.assertNumQueries(3):
+                response = self.client.get('/monitoring/measurements/', params)
+            self.assertEqual(response.context['total_count'], 121)
+            pages.append(list(response.context['page_obj']))
+            if 'next_query' not in response.context:
+                break
+            params = QueryDict(response.context['next_query'])
+
+        self.assertEqual([len(page) for page in pages], [50, 50, 21])
+        self.assertContains(response, "+2")
+        seen = [measurement.pk for page in pages for measurement in page]
+        self.assertEqual(len(set(seen)), 121)
+
+        # Назад с последней страницы - снова вторая
+        response = self.client.get(
+            '/monitoring/measurements/',
+            QueryDict(response.context['previous_query']),
+        )
+        self.assertEqual(list(response.context['page_obj']), pages[1])
+
+    def test_measurements_api_cursor(self):
+        for minute in range(5):
+            Measurement.objects.create(
+                engine=self.engine, timestamp=self.measurement.timestamp,
+            )
+        url = '/monitoring/api/measurements/'
+        first = self.client.get(url, {'limit': 4}).json()
+        self.assertEqual(len(first['results']), 4)
+        self.assertIsNone(first['previous_cursor'])
+
+        second = self.client.get(
+            url, {'limit': 4, 'after': first['next_cursor']}
+        ).json()
+        self.assertEqual(len(second['results']), 2)
+        self.assertIsNone(second['next_cursor'])
+        ids = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(len(set(ids)), 6)
+        self.assertIn(
+            {'temperature': 85.5},
+            [row['values'] for row in second['results']],
+        )
+
+        response = self.client.get(url, {'after': 'bad'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_vessel_engine_stats(self):
+        Engine.objects.create(
+            vessel=self.vessel, name="Aux Engine", model="X",
+            serial_number="SN002",
+        )
+        for value in (80.0, 90.0):
+            measurement = Measurement.objects.create(
+                engine=self.engine, timestamp=timezone.now(),
+            )
+            ParameterValue.objects.create(
+                measurement=measurement, parameter_type=self.temperature,
+                value=value,
+            )
+
+        # Суда и двигатели из справочников, по запросу на агрегаты
+        # и текущие значения
+        get_registry()
+        with self.assertNumQueries(2):
+            response = self.client.get('/monitoring/stats/')
+        self.assertEqual(response.status_code, 200)
+
+        vessel_stats, = response.context['stats']
+        self.assertEqual(vessel_stats['engines_count'], 2)
+        self.assertEqual(vessel_stats['values_count'], 3)
+        aux, main = vessel_stats['engines']
+        self.assertEqual(aux['parameters'], [])
+        temperature, = main['parameters']
+        self.assertEqual(
+            (temperature['count'], temperature['min'], temperature['max']),
+            (3, 80.0, 90.0),
+        )
+        self.assertEqual(temperature['current'], 90.0)
+        self.assertAlmostEqual(temperature['avg'], 85.1666, places=3)
+        self.assertAlmostEqual(temperature['std'], 4.0893, places=3)
+        today = timezone.now().astimezone(dt_timezone.utc).date()
+        self.assertEqual((main['first_day'], main['last_day']),
+                         (today, today))
+        self.assertEqual(vessel_stats['last_day'], today)
+
+    def test_parameter_stats_period(self):
+        day = datetime(2024, 3, 10, tzinfo=dt_timezone.utc)
+        values = {
+            day - timedelta(hours=1): 10.0,
+            day + timedelta(minutes=20): 20.0,
+            day + timedelta(hours=2, minutes=10): 30.0,
+            day + timedelta(days=1, hours=5): 40.0,
+            day + timedelta(days=2, hours=1, minutes=30): 50.0,
+            day + timedelta(days=2, hours=3): 60.0,
+        }
+        for timestamp, value in values.items():
+            measurement = Measurement.objects.create(
+                engine=self.engine, timestamp=timestamp,
+            )
+            ParameterValue.objects.create(
+                measurement=measurement, parameter_type=self.temperature,
+                value=value,
+            )
+        key = (self.engine.pk, self.temperature.pk)
+
+        # Неполный час, целые часы, целые сутки, целый час и неполный час
+        with self.assertNumQueries(2):
+            stats = parameter_stats(day + timedelta(minutes=10),
+                                    day + timedelta(days=2, hours=2))
+        self.assertEqual(
+            (stats[key]['count'], stats[key]['min'], stats[key]['max']),
+            (4, 20.0, 50.0),
+        )
+        self.assertEqual(stats[key]['avg'], 35.0)
+        self.assertEqual(
+            (stats[key]['first_day'], stats[key]['last_day']),
+            (date(2024, 3, 10), date(2024, 3, 12)),
+        )
+
+        # Целые сутки - только агрегаты
+        with self.assertNumQueries(1):
+            stats = parameter_stats(day, day + timedelta(days=1))
+        self.assertEqual(stats[key]['count'], 2)
+        self.assertEqual(
+            (stats[key]['first_day'], stats[key]['last_day']),
+            (date(2024, 3, 10), date(2024, 3, 10)),
+        )
+
+        # Период в прошлом: последние сутки - в периоде, а не по
+        # текущему значению
+        vessel_stats, = fleet_stats(None, day + timedelta(days=1))
+        main, = vessel_stats['engines']
+        self.assertEqual(main['last_day'], date(2024, 3, 10))
+        self.assertEqual(main['values_count'], 3)
+
+        # Внутри одного часа - только сырые значения
+        with self.assertNumQueries(1):
+            stats = parameter_stats(day + timedelta(hours=2, minutes=5),
+                                    day + timedelta(hours=2, minutes=15))
+        self.assertEqual(stats[key]['count'], 1)
+
+        self.assertEqual(parameter_stats(None, day)[key]['count'], 1)
+
+
+class SeriesTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        vessel = Vessel.objects.create(name="Vessel", imo_number="IMO7654321")
+        self.engine = Engine.objects.create(
+            vessel=vessel, name="ME", model="X", serial_number="SN100"
+        )
+        self.other_engine = Engine.objects.create(
+            vessel=vessel, name="AE", model="X", serial_number="SN101"
+        )
+        self.parameter = ParameterType.objects.create(
+            name="Давление", code="pressure", unit="бар"
+        )
+        self.start = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+        for minute in (30, 10, 20):
+            for engine in (self.engine, self.other_engine):
+                measurement = Measurement.objects.create(
+                    engine=engine,
+                    timestamp=self.start + timedelta(minutes=minute),
+                )
+                ParameterValue.objects.create(
+                    measurement=measurement,
+                    parameter_type=self.parameter,
+                    value=float(minute),
+                )
+
+    def test_fetch_series_single_query(self):
+        # Справочники нужны для проверки архива и берутся из памяти
+        get_registry()
+        with self.assertNumQueries(1):
+            series = fetch_series(self.parameter, {'engine_id': self.engine.pk})
+
+        self.assertEqual(series.values.tolist(), [10.0, 20.0, 30.0])
+        expected_ms = int((self.start + timedelta(minutes=10)).timestamp() * 1000)
+        self.assertEqual(series.timestamps[0], expected_ms)
+
+    def test_fetch_series_empty(self):
+        series = fetch_series(self.parameter, {'engine_id': 0})
+        self.assertEqual(len(series), 0)
+
+    def test_chart_data_api(self):
+        response = self.client.get('/monitoring/api/chart-data/', {
+            'engine': self.engine.pk,
+            'parameter': 'pressure',
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['values'], [10.0, 20.0, 30.0])
+        self.assertEqual(len(data['labels']), 3)
+        self.assertEqual(data['parameter_unit'], 'бар')
+
+    def test_trends_view(self):
+        response = self.client.get('/monitoring/trends/', {
+            'engine': self.engine.pk,
+            'parameter': 'pressure',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context['chart_data_json'].count('"labels"'), 1
+        )
+
+    def test_chart_data_cached_until_engine_write(self):
+        filters = {'engine_id': self.engine.pk}
+        data = cached_chart_data(self.parameter, filters)
+        # Повторный запрос не обращается к базе
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_chart_data(self.parameter, filters), data)
+
+        # Запись другого двигателя кэш этого двигателя не сбрасывает
+        with self.captureOnCommitCallbacks(execute=True):
+            measurement = Measurement.objects.create(
+                engine=self.other_engine, timestamp=self.start
+            )
+            ParameterValue.objects.create(
+                measurement=measurement, parameter_type=self.parameter,
+                value=1.0,
+            )
+        with self.assertNumQueries(0):
+            cached_chart_data(self.parameter, filters)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            measurement = Measurement.objects.create(
+                engine=self.engine, timestamp=self.start
+            )
+            ParameterValue.objects.create(
+                measurement=measurement, parameter_type=self.parameter,
+                value=1.0,
+            )
+        data = cached_chart_data(self.parameter, filters)
+        self.assertEqual(data['values'], [1.0, 10.0, 20.0, 30.0])
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }})
+    def test_chart_cache_skipped_with_local_memory_cache(self):
+        # Версии из других процессов здесь не видны - ряд читается заново
+        filters = {'engine_id': self.engine.pk}
+        data = cached_chart_data(self.parameter, filters)
+        get_registry()
+        with self.assertNumQueries(2):
+            self.assertEqual(cached_chart_data(self.parameter, filters), data)
+
+    def test_engine_version_survives_eviction(self):
+        version = engine_versions([self.engine.pk])[self.engine.pk]
+        bump_engine_versions([self.engine.pk])
+        self.assertEqual(
+            engine_versions([self.engine.pk])[self.engine.pk], version + 1
+        )
+        cache.delete(ENGINE_VERSION_KEY.format(self.engine.pk))
+        self.assertGreater(
+            engine_versions([self.engine.pk])[self.engine.pk], version + 1
+        )
+
+    def test_chart_data_api_max_points(self):
+        response = self.client.get('/monitoring/api/chart-data/', {
+            'engine': self.engine.pk,
+            'parameter': 'pressure',
+            'max_points': 2,
+        })
+        data = response.json()
+        # Число точек поднимается до MIN_POINTS, а ряд короче
+        self.assertEqual(len(data['values']), 3)
+        self.assertFalse(data['downsampled'])
+        self.assertEqual(data['stats']['max'], 30.0)
+
+
+    def test_chart_data_api_huge_days(self):
+        response = self.client.get('/monitoring/api/chart-data/', {
+            'engine': self.engine.pk, 'parameter': 'pressure',
+            'days': 10 ** 9,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['values']), 3)
+
+
+class MeasurementFilterTestCase(TestCase):
+    def setUp(self):
+        vessel = Vessel.objects.create(name="Vessel", imo_number="IMO2222222")
+        self.engine = Engine.objects.create(
+            vessel=vessel, name="ME", model="X", serial_number="SN300"
+        )
+
+    def test_date_range_is_half_open_in_local_time(self):
+        with timezone.override('Asia/Vladivostok'):
+            day_start = timezone.make_aware(datetime(2024, 3, 10))
+            for offset in (
+                timedelta(0),
+                timedelta(days=1) - timedelta(microseconds=1),
+                timedelta(days=1),
+                -timedelta(microseconds=1),
+            ):
+                Measurement.objects.create(
+                    engine=self.engine, timestamp=day_start + offset
+                )
+            form = MeasurementFilterForm(
+                {'date_from': '2024-03-10', 'date_to': '2024-03-10'}
+            )
+            lookups = form_lookups(form)
+            self.assertEqual(
+                Measurement.objects.filter(**lookups).count(), 2
+            )
+
+        self.assertEqual(
+            set(lookups), {'timestamp__gte', 'timestamp__lt'}
+        )
+
+    def test_calendar_edge_dates_rejected(self):
+        form = MeasurementFilterForm(
+            {'date_from': '0001-01-01', 'date_to': '9999-12-31'}
+        )
+        self.assertEqual(set(form.errors), {'date_from', 'date_to'})
+        self.assertEqual(form_lookups(form), {})
+
+        response = self.client.get('/monitoring/measurements/', {
+            'date_to': '9999-12-31',
+        })
+        self.assertEqual(response.status_code, 200)
+
+    def test_date_range_uses_index(self):
+        lookups = measurement_lookups(
+            engine=self.engine,
+            date_from=date(2024, 1, 1),
+            date_to=date(2024, 1, 31),
+        )
+        queryset = Measurement.objects.filter(**lookups)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            self.assertIn('monitoring_meas_engine_ts_idx', queryset.explain())
+        elif connection.vendor == 'sqlite':
+            self.assertIn(
+                'monitoring_meas_engine_ts_idx '
+                '(engine_id=? AND timestamp>? AND timestamp<?)',
+                queryset.explain(),
+            )
+        else:
+            self.skipTest(f'Нет проверки плана для {connection.vendor}')
+
+
+class DownsamplingTestCase(TestCase):
+    def setUp(self):
+        import numpy as np
+
+        self.timestamps = np.arange(100_000, dtype=np.int64) * 60_000
+        self.values = np.sin(np.arange(100_000) / 500.0)
+        self.spike_at = 54_321
+        self.values[self.spike_at] = 50.0
+
+    def test_spikes_survive(self):
+        for method in (LTTB, MINMAX):
+            timestamps, values = downsample(
+                self.timestamps, self.values, 500, method
+            )
+            self.assertLessEqual(len(values), 500, method)
+            self.assertIn(50.0, values, method)
+            self.assertEqual(timestamps[0], self.timestamps[0])
+            self.assertEqual(timestamps[-1], self.timestamps[-1])
+            self.assertTrue((timestamps[1:] > timestamps[:-1]).all(), method)
+
+    def test_minmax_keeps_opposite_spikes_in_one_bucket(self):
+        self.values[self.spike_at + 7] = -50.0
+        _, values = downsample(self.timestamps, self.values, 500, MINMAX)
+        self.assertIn(50.0, values)
+        self.assertIn(-50.0, values)
+
+    def test_small_max_points_still_downsamples(self):
+        for max_points in (0, -5, 1):
+            _, values = downsample(self.timestamps, self.values, max_points)
+            self.assertEqual(len(values), MIN_POINTS)
+
+    def test_max_points_clamped(self):
+        for max_points, expected in (('0', MIN_POINTS), ('-1', MIN_POINTS),
+                                     (str(10 ** 9), MAX_POINTS_LIMIT),
+                                     ('300', 300)):
+            self.assertEqual(get_downsampling_params(
+                {'max_points': max_points}
+            ), (expected, MINMAX))
+
+    def test_short_series_untouched(self):
+        timestamps, values = downsample(
+            self.timestamps[:10], self.values[:10], 500
+        )
+        self.assertEqual(len(values), 10)
+
+
+class MeasurementImporterTestCase(TestCase):
+    def setUp(self):
+        vessel = Vessel.objects.create(name="Vessel", imo_number="IMO1111111")
+        self.engine = Engine.objects.create(
+            vessel=vessel, name="ME", model="X", serial_number="SN200"
+        )
+        ParameterType.objects.create(
+            name="Температура", code="temperature", unit="°C"
+        )
+
+    def _import(self, text, batch_size=2):
+        importer = MeasurementImporter(
+            self.engine, None, '%Y-%m-%d %H:%M:%S', batch_size=batch_size
+        )
+        return importer.import_csv(BytesIO(text.encode('utf-8')), ',')
+
+    def test_bulk_import_with_row_errors(self):
+        result = self._import(
+            "timestamp,temperature,oil_pressure\n"
+            "2024-01-01 00:00:00,80.5,4\n"
+            "2024-01-01 00:01:00,81,\n"
+            "bad,82,4\n"
+            "2024-01-01 00:03:00,abc,4\n"
+            ",83,4\n"
+        )
+        self.assertEqual(result.rows_count, 5)
+        self.assertEqual(result.imported_count, 3)
+        self.assertEqual(result.values_count, 4)
+        self.assertEqual(len(result.error_rows), 3)
+        self.assertTrue(result.error_rows[0].startswith("Строка 4:"))
+        self.assertIn("Неверное значение 'abc'", result.error_rows[1])
+        self.assertIn("Не найдена колонка времени", result.error_rows[2])
+        self.assertEqual(
+            [param.code for param in result.created_parameters],
+            ['oil_pressure'],
+        )
+        self.assertEqual(
+            ParameterType.objects.get(code='oil_pressure').unit, 'бар'
+        )
+        self.assertEqual(Measurement.objects.count(), 3)
+
+    def test_out_of_range_value_raises_alarm(self):
+        temperature = ParameterType.objects.get(code='temperature')
+        temperature.max_value = 100
+        temperature.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self._import(
+                "timestamp,temperature\n"
+                "2024-01-01 00:00:00,80\n"
+                "2024-01-01 00:01:00,180\n"
+            )
+        self.assertEqual((result.imported_count, result.error_rows), (2, []))
+        self.assertEqual(
+            list(Alarm.objects.values_list('kind', 'value')),
+            [(Alarm.KIND_HIGH, 180.0)],
+        )
+
+    def test_query_count_independent_of_rows(self):
+        rows = "".join(
+            f"2024-01-01 00:{minute:02d}:00,{minute}\n" for minute in range(60)
+        )
+        # Параметры берутся из справочника; на каждую пачку из 20 строк
+        # транзакция с двумя bulk_create и обновлением агрегатов
+        # и текущих значений (по одному INSERT ... ON CONFLICT)
+        get_registry()
+        with self.assertNumQueries(3 * (2 + 2 + 1 + 1)):
+            result = self._import("timestamp,temperature\n" + rows, 20)
+        self.assertEqual(result.imported_count, 60)
+        self.assertGreater(result.rows_per_second, 0)
+
+    def test_xlsx_sheets_per_engine(self):
+        auxiliary = Engine.objects.create(
+            vessel=self.engine.vessel, name="AE1", model="Y",
+            serial_number="SN201",
+        )
+        workbook = Workbook()
+        sheets = {"SN200": 3, "ae1": 2, "Unknown": 1}
+        for index, (title, rows) in enumerate(sheets.items()):
+            sheet = workbook.active if index == 0 else workbook.create_sheet()
+            sheet.title = title
+            sheet.append(["timestamp", "temperature"])
+            for minute in range(rows):
+                sheet.append([datetime(2024, 1, 1, 0, minute), 80 + minute])
+        buffer = BytesIO()
+        workbook.save(buffer)
+        buffer.seek(0)
+
+        importer = MeasurementImporter(self.engine, None, '%Y-%m-%d %H:%M:%S')
+        result = importer.import_file(buffer, 'data.xlsx')
+
+        self.assertEqual(result.imported_count, 5)
+        self.assertEqual(self.engine.measurements.count(), 3)
+        self.assertEqual(auxiliary.measurements.count(), 2)
+        self.assertEqual(len(result.error_rows), 1)
+        self.assertIn("Лист 'Unknown'", result.error_rows[0])
+
+
+class RollupTestCase(TestCase):
+    def setUp(self):
+        vessel = Vessel.objects.create(name="Vessel", imo_number="IMO3333333")
+        self.engine = Engine.objects.create(
+            vessel=vessel, name="ME", model="X", serial_number="SN300"
+        )
+        self.parameter = ParameterType.objects.create(
+            name="Температура", code="temperature", unit="°C"
+        )
+        self.start = datetime(2024, 3, 1, 10, tzinfo=dt_timezone.utc)
+        # Два часа по три замера: 10:00-10:40 и 11:00-11:40
+        for minute, value in ((0, 10), (20, 30), (40, 20),
+                              (60, 5), (80, 15), (100, 25)):
+            self._create(self.start + timedelta(minutes=minute), value)
+
+    def _create(self, timestamp, value):
+        measurement = Measurement.objects.create(
+            engine=self.engine, timestamp=timestamp
+        )
+        ParameterValue.objects.create(
+            measurement=measurement, parameter_type=self.parameter,
+            value=float(value),
+        )
+        return measurement
+
+    def _rollups(self, resolution):
+        return list(ParameterRollup.objects.filter(
+            resolution=resolution
+        ).order_by('bucket').values_list('bucket', 'count', 'min', 'max', 'sum'))
+
+    def test_updates_merged_in_database(self):
+        # Без предварительного чтения: агрегаты и текущее значение
+        # считаются в INSERT ... ON CONFLICT из строк в базе
+        row = (self.engine.pk, self.parameter.pk, self.start, 40.0)
+        with self.assertNumQueries(1):
+            apply_values([row])
+        older = (self.engine.pk, self.parameter.pk, self.start, 1.0)
+        with self.assertNumQueries(1):
+            apply_latest([older])
+
+        self.assertEqual(
+            self._rollups(HOUR)[0], (self.start, 4, 10.0, 40.0, 100.0)
+        )
+        self.assertEqual(LatestValue.objects.get().value, 25.0)
+
+    def test_incremental_updates(self):
+        self.assertEqual(self._rollups(HOUR), [
+            (self.start, 3, 10.0, 30.0, 60.0),
+            (self.start + timedelta(hours=1), 3, 5.0, 25.0, 45.0),
+        ])
+        self.assertEqual(self._rollups(DAY), [
+            (self.start.replace(hour=0), 6, 5.0, 30.0, 105.0),
+        ])
+        rollup = ParameterRollup.objects.get(resolution=DAY)
+        self.assertAlmostEqual(rollup.avg, 17.5)
+
+        # Удаление максимума пересчитывает интервал из сырых данных
+        ParameterValue.objects.get(value=30.0).delete()
+        self.assertEqual(
+            self._rollups(HOUR)[0], (self.start, 2, 10.0, 20.0, 30.0)
+        )
+
+        # Перенос замера в другой час
+        measurement = Measurement.objects.get(parameter_values__value=5.0)
+        measurement.timestamp = self.start + timedelta(minutes=50)
+        measurement.save()
+        self.assertEqual(self._rollups(HOUR), [
+            (self.start, 3, 5.0, 20.0, 35.0),
+            (self.start + timedelta(hours=1), 2, 15.0, 25.0, 40.0),
+        ])
+        self.assertEqual(self._rollups(DAY)[0][1:], (5, 5.0, 25.0, 75.0))
+
+    def test_measurement_delete_refreshes_once(self):
+        parameters = [self.parameter] + [
+            ParameterType.objects.create(
+                name=f"Параметр {number}", code=f"param_{number}", unit=""
+            )
+            for number in range(3)
+        ]
+        measurement, later = (
+            Measurement.objects.create(engine=self.engine, timestamp=moment)
+            for moment in (self.start + timedelta(minutes=10),
+                           self.start + timedelta(hours=3))
+        )
+        for parameter in parameters:
+            for owner in (measurement, later):
+                ParameterValue.objects.create(
+                    measurement=owner, parameter_type=parameter, value=50.0,
+                )
+        get_registry()
+
+        # Один запрос параметров замера, по одному пересчету часа и суток
+        # для всех параметров; текущие значения не пересчитываются:
+        # замер не последний
+        with self.assertNumQueries(15):
+            measurement.delete()
+        self.assertEqual(self._rollups(HOUR)[0],
+                         (self.start, 3, 10.0, 30.0, 60.0))
+        self.assertFalse(ParameterRollup.objects.filter(
+            parameter_type__in=parameters[1:], resolution=HOUR,
+            bucket=self.start,
+        ).exists())
+        self.assertEqual(ParameterRollup.objects.filter(
+            parameter_type__in=parameters[1:], resolution=DAY, count=1,
+        ).count(), 3)
+        self.assertEqual(LatestValue.objects.filter(
+            timestamp=later.timestamp
+        ).count(), 4)
+
+    def test_rebuild_matches_incremental(self):
+        hourly, daily = self._rollups(HOUR), self._rollups(DAY)
+        self.assertEqual(
+            rebuild_rollups(self.engine), {HOUR: 2, DAY: 1}
+        )
+        self.assertEqual(self._rollups(HOUR), hourly)
+        self.assertEqual(self._rollups(DAY), daily)
+
+    def test_import_updates_rollups(self):
+        importer = MeasurementImporter(
+            self.engine, None, '%Y-%m-%d %H:%M:%S', batch_size=2
+        )
+        with timezone.override(dt_timezone.utc):
+            importer.import_csv(BytesIO(
+                b"timestamp,temperature\n"
+                b"2024-03-01 10:50:00,40\n"
+                b"2024-03-01 12:00:00,1\n"
+            ), ',')
+        hourly = self._rollups(HOUR)
+        self.assertEqual(hourly[0], (self.start, 4, 10.0, 40.0, 100.0))
+        self.assertEqual(hourly[2][1:], (1, 1.0, 1.0, 1.0))
+        self.assertEqual(self._rollups(DAY)[0][1:], (8, 1.0, 40.0, 146.0))
+
+    def test_chart_switches_to_rollups(self):
+        filters = {'engine_id': self.engine.pk}
+        self.assertEqual(
+            build_chart_data(self.parameter, filters)['resolution'], RAW
+        )
+        with mock.patch('monitoring.rollups.RAW_POINTS_LIMIT', 4):
+            data = build_chart_data(self.parameter, filters)
+            self.assertEqual(data['resolution'], HOUR)
+            self.assertEqual(data['values'], [20.0, 15.0])
+            self.assertEqual(data['min_values'], [10.0, 5.0])
+            self.assertEqual(data['max_values'], [30.0, 25.0])
+            self.assertEqual(data['stats']['count'], 6)
+
+            with mock.patch('monitoring.rollups.MAX_HOURLY_BUCKETS', 10):
+                data = build_chart_data(self.parameter, filters)
+            self.assertEqual(data['resolution'], DAY)
+            self.assertEqual(data['values'], [17.5])
+
+
+class ReferenceDataTestCase(TestCase):
+    def setUp(self):
+        self.vessel = Vessel.objects.create(
+            name="Vessel", imo_number="IMO5555555"
+        )
+        self.other_vessel = Vessel.objects.create(
+            name="Other", imo_number="IMO5555556"
+        )
+        self.engine = Engine.objects.create(
+            vessel=self.vessel, name="ME", model="X", serial_number="SN500"
+        )
+        Engine.objects.create(
+            vessel=self.other_vessel, name="ME", model="X",
+            serial_number="SN501",
+        )
+        self.parameter = ParameterType.objects.create(
+            name="Температура", code="temperature", unit="°C"
+        )
+
+    def test_forms_make_no_queries(self):
+        get_registry()
+        with self.assertNumQueries(0):
+            form = MeasurementFilterForm({
+                'vessel': self.vessel.pk, 'engine': self.engine.pk,
+            })
+            self.assertTrue(form.is_valid())
+            self.assertEqual(form.cleaned_data['engine'], self.engine)
+            self.assertEqual(
+                [engine for _, engine in list(form.fields['engine'].choices)[1:]],
+                [str(self.engine)],
+            )
+            form.as_p()
+            create_form = MeasurementWithParametersForm()
+            self.assertIn('param_temperature', create_form.fields)
+
+        form = MeasurementFilterForm({'engine': 999})
+        self.assertFalse(form.is_valid())
+        self.assertIn('engine', form.errors)
+
+    def test_registry_invalidated_by_signals(self):
+        registry = get_registry()
+        self.assertEqual(registry.parameters_by_code['temperature'], self.parameter)
+        self.parameter.name = "Температура масла"
+        self.parameter.save()
+
+        registry = get_registry()
+        self.assertEqual(
+            registry.parameters_by_name['температура масла'].pk,
+            self.parameter.pk,
+        )
+        self.assertIs(get_registry(), registry)
+
+        cache.delete(REGISTRY_VERSION_KEY)
+        self.assertIsNot(get_registry(), registry)
+
+    def test_registry_expires_without_shared_cache(self):
+        registry = get_registry()
+        # Запись из другого процесса не меняет версию в кэше этого
+        ParameterType.objects.filter(pk=self.parameter.pk).update(
+            name="Температура масла"
+        )
+        self.assertIs(get_registry(), registry)
+        with mock.patch('monitoring.registry.time.monotonic',
+                        return_value=registry.loaded_at + 31):
+            fresh = get_registry()
+        self.assertIsNot(fresh, registry)
+        self.assertIn('температура масла', fresh.parameters_by_name)
+
+
+class RecordMeasurementTestCase(TestCase):
+    def setUp(self):
+        vessel = Vessel.objects.create(name="Vessel", imo_number="IMO6666666")
+        self.engine = Engine.objects.create(
+            vessel=vessel, name="ME", model="X", serial_number="SN600"
+        )
+        self.temperature = ParameterType.objects.create(
+            name="Температура", code="temperature", unit="°C",
+            min_value=0, max_value=120,
+        )
+        self.pressure = ParameterType.objects.create(
+            name="Давление", code="pressure", unit="бар"
+        )
+        self.user = User.objects.create_user('operator', password='secret')
+        self.timestamp = timezone.now().replace(microsecond=0)
+
+    def test_record_measurement_batched(self):
+        get_registry()
+        # Замер и значения - двумя bulk_create, агрегаты и текущие
+        # значения - по одному INSERT ... ON CONFLICT, все в одной
+        # транзакции
+        with self.assertNumQueries(2 + 2 + 1 + 1):
+            measurement = record_measurement(
+                self.engine, self.timestamp,
+                {self.temperature: 85.0, self.pressure.pk: 4.5},
+                user=self.user,
+            )
+        self.assertEqual(measurement.created_by, self.user)
+        self.assertEqual(
+            dict(measurement.parameter_values.values_list(
+                'parameter_type__code', 'value'
+            )),
+            {'temperature': 85.0, 'pressure': 4.5},
+        )
+        self.assertEqual(
+            LatestValue.objects.get(parameter_type=self.temperature).value,
+            85.0,
+        )
+        self.assertEqual(ParameterRollup.objects.count(), 4)
+
+    def test_out_of_range_values_rejected(self):
+        with self.assertRaises(ValidationError) as context:
+            record_measurement(
+                self.engine, self.timestamp, {self.temperature: 150.0}
+            )
+        self.assertIn('temperature', context.exception.message_dict)
+        self.assertFalse(Measurement.objects.exists())
+
+    def test_create_measurement_view(self):
+        self.client.force_login(self.user)
+        data = {
+            'engine': self.engine.pk,
+            'timestamp': self.timestamp.strftime('%Y-%m-%dT%H:%M'),
+            'notes': '',
+            'param_temperature': '130',
+            'param_pressure': '4.5',
+        }
+        response = self.client.post('/monitoring/measurements/create/', data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('param_temperature', response.context['form'].errors)
+        self.assertFalse(Measurement.objects.exists())
+
+        data['param_temperature'] = '90'
+        response = self.client.post('/monitoring/measurements/create/', data)
+        measurement = Measurement.objects.get()
+        self.assertRedirects(
+            response, f'/monitoring/measurements/{measurement.pk}/'
+        )
+        self.assertEqual(measurement.parameter_values.count(), 2)
+
+
+class LatestValueTestCase(TestCase):
+    def setUp(self):
+        self.vessel = Vessel.objects.create(
+            name="Vessel", imo_number="IMO4444444"
+        )
+        self.engine = Engine.objects.create(
+            vessel=self.vessel, name="ME", model="X", serial_number="SN400"
+        )
+        self.parameter = ParameterType.objects.create(
+            name="Температура", code="temperature", unit="°C"
+        )
+        self.start = timezone.now().replace(microsecond=0)
+
+    def _create(self, minutes, value, engine=None):
+        measurement = Measurement.objects.create(
+            engine=engine or self.engine,
+            timestamp=self.start + timedelta(minutes=minutes),
+        )
+        ParameterValue.objects.create(
+            measurement=measurement, parameter_type=self.parameter,
+            value=float(value),
+        )
+        return measurement
+
+    def _current(self, engine=None):
+        return LatestValue.objects.filter(
+            engine=engine or self.engine
+        ).values_list('value', flat=True).first()
+
+    def test_latest_value_follows_writes(self):
+        self._create(10, 80)
+        latest = self._create(20, 90)
+        # Запоздавший старый замер текущее значение не меняет
+        self._create(5, 70)
+        self.assertEqual(self._current(), 90.0)
+
+        latest.delete()
+        self.assertEqual(self._current(), 80.0)
+
+        other = Engine.objects.create(
+            vessel=self.vessel, name="AE", model="X", serial_number="SN401"
+        )
+        moved = Measurement.objects.get(parameter_values__value=80.0)
+        moved.engine = other
+        moved.save()
+        self.assertEqual(self._current(), 70.0)
+        self.assertEqual(self._current(other), 80.0)
+
+        Measurement.objects.filter(engine=self.engine).delete()
+        self.assertIsNone(self._current())
+
+    def test_import_updates_latest_value(self):
+        self._create(0, 80)
+        importer = MeasurementImporter(
+            self.engine, None, '%Y-%m-%d %H:%M:%S', batch_size=2
+        )
+        later = timezone.localtime(self.start + timedelta(hours=1))
+        importer.import_csv(BytesIO(
+            "timestamp,temperature\n"
+            f"{later:%Y-%m-%d %H:%M:%S},95\n"
+            "2000-01-01 00:00:00,10\n".encode('utf-8')
+        ), ',')
+        self.assertEqual(self._current(), 95.0)
+
+    def test_current_state_api(self):
+        self._create(0, 80)
+        Engine.objects.create(
+            vessel=self.vessel, name="AE", model="X", serial_number="SN401"
+        )
+        # Двигатели и текущие значения
+        with self.assertNumQueries(2):
+            response = self.client.get('/monitoring/api/current-state/')
+        vessel, = response.json()['vessels']
+        auxiliary, main = vessel['engines']
+        self.assertEqual(auxiliary['values'], {})
+        self.assertIsNone(auxiliary['last_timestamp'])
+        self.assertEqual(main['values']['temperature']['value'], 80.0)
+
+        response = self.client.get(
+            '/monitoring/api/current-state/', {'engine': 'x'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(MONITORING_PACKED_VALUES=True)
+class PackedValuesTestCase(TestCase):
+    def setUp(self):
+        clear_layout_cache()
+        vessel = Vessel.objects.create(name="Vessel", imo_number="IMO8888888")
+        self.engine = Engine.objects.create(
+            vessel=vessel, name="ME", model="X", serial_number="SN800"
+        )
+        self.temperature = ParameterType.objects.create(
+            name="Температура", code="temperature", unit="°C"
+        )
+        self.pressure = ParameterType.objects.create(
+            name="Давление", code="pressure", unit="бар"
+        )
+        self.start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        self.filters = {'engine_id': self.engine.pk}
+
+    def _record(self, minute, values):
+        return record_measurement(
+            self.engine, self.start + timedelta(minutes=minute), values
+        )
+
+    def _row_series(self, parameter_type):
+        with override_settings(MONITORING_PACKED_VALUES=False):
+            return fetch_series(parameter_type, self.filters)
+
+    def assertSeriesEqual(self, first, second):
+        self.assertEqual(first.timestamps.tolist(), second.timestamps.tolist())
+        self.assertEqual(first.values.tolist(), second.values.tolist())
+
+    def test_packed_series_matches_rows(self):
+        self._record(0, {self.temperature: 80.0, self.pressure: 4.0})
+        self._record(1, {self.temperature: 81.0})
+        self._record(2, {self.pressure: 4.2})
+
+        # Одна таблица замеров, без join с ParameterValue
+        with self.assertNumQueries(1):
+            series = fetch_series(self.temperature, self.filters)
+        self.assertEqual(series.values.tolist(), [80.0, 81.0])
+        for parameter_type in (self.temperature, self.pressure):
+            self.assertSeriesEqual(
+                fetch_series(parameter_type, self.filters),
+                self._row_series(parameter_type),
+            )
+
+    def test_new_parameter_creates_layout_version(self):
+        self._record(0, {self.temperature: 80.0})
+        speed = ParameterType.objects.create(
+            name="Обороты", code="speed", unit="об/мин"
+        )
+        self._record(1, {self.temperature: 81.0, speed: 90.0})
+
+        self.assertEqual(
+            list(ParameterLayout.objects.order_by('pk').values_list(
+                'parameter_ids', flat=True
+            )),
+            [[self.temperature.pk], [self.temperature.pk, speed.pk]],
+        )
+        self.assertEqual(
+            fetch_series(self.temperature, self.filters).values.tolist(),
+            [80.0, 81.0],
+        )
+        self.assertEqual(
+            fetch_series(speed, self.filters).values.tolist(), [90.0]
+        )
+
+    def test_unpacked_measurements_fall_back_to_rows(self):
+        self._record(0, {self.temperature: 80.0})
+        with override_settings(MONITORING_PACKED_VALUES=False):
+            self._record(1, {self.temperature: 81.0})
+
+        self.assertEqual(
+            fetch_series(self.temperature, self.filters).values.tolist(),
+            [80.0, 81.0],
+        )
+        self.assertEqual(
+            pack_measurements(Measurement.objects.all(), batch_size=1), 2
+        )
+        self.assertFalse(
+            Measurement.objects.filter(packed_values__isnull=True).exists()
+        )
+        with self.assertNumQueries(1):
+            fetch_series(self.temperature, self.filters)
+
+    def test_value_changes_repack_measurement(self):
+        measurement = self._record(
+            0, {self.temperature: 80.0, self.pressure: 4.0}
+        )
+        value = measurement.parameter_values.get(
+            parameter_type=self.temperature
+        )
+        value.value = 82.0
+        value.save()
+        measurement.parameter_values.get(
+            parameter_type=self.pressure
+        ).delete()
+
+        self.assertEqual(
+            fetch_series(self.temperature, self.filters).values.tolist(),
+            [82.0],
+        )
+        self.assertEqual(len(fetch_series(self.pressure, self.filters)), 0)
+
+        # Удаление замера целиком не пытается перепаковать его
+        measurement.delete()
+        self.assertEqual(len(fetch_series(self.temperature, self.filters)), 0)
+
+
+class ArchiveTestCase(TestCase):
+    def setUp(self):
+        self.archive_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_root, ignore_errors=True)
+        archive = override_settings(MONITORING_ARCHIVE_ROOT=self.archive_root)
+        archive.enable()
+        self.addCleanup(archive.disable)
+
+        vessel = Vessel.objects.create(name="Vessel", imo_number="IMO9999999")
+        self.engine = Engine.objects.create(
+            vessel=vessel, name="ME", model="X", serial_number="SN900"
+        )
+        self.temperature = ParameterType.objects.create(
+            name="Температура", code="temperature", unit="°C"
+        )
+        self.pressure = ParameterType.objects.create(
+            name="Давление", code="pressure", unit="бар"
+        )
+        self.january = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        self.february = datetime(2024, 2, 1, tzinfo=dt_timezone.utc)
+        for day, temperature in ((5, 70.0), (20, 75.0)):
+            self._record(self.january + timedelta(days=day), {
+                self.temperature: temperature, self.pressure: 4.0,
+            })
+        self._record(self.january + timedelta(days=25), {self.pressure: 4.5})
+        self._record(self.february + timedelta(days=1), {
+            self.temperature: 80.0,
+        })
+        self.filters = {'engine_id': self.engine.pk}
+
+    def _record(self, timestamp, values):
+        return record_measurement(self.engine, timestamp, values)
+
+    def _archive(self, start):
+        with self.captureOnCommitCallbacks(execute=True):
+            return archive_month(Engine.objects.get(pk=self.engine.pk), start)
+
+    def test_archived_values_still_in_series(self):
+        before = fetch_series(self.temperature, self.filters)
+        rollups = ParameterRollup.objects.count()
+
+        self.assertEqual(self._archive(self.january), 3)
+
+        self.assertFalse(Measurement.objects.filter(
+            timestamp__lt=self.february
+        ).exists())
+        # Агрегаты и текущие значения при переносе не меняются
+        self.assertEqual(ParameterRollup.objects.count(), rollups)
+        self.assertEqual(
+            LatestValue.objects.get(parameter_type=self.pressure).value, 4.5
+        )
+        month = ArchivedMonth.objects.get()
+        self.assertEqual(
+            (month.measurement_count, month.value_count), (3, 5)
+        )
+        self.assertEqual(
+            Engine.objects.get(pk=self.engine.pk).archived_until,
+            self.february,
+        )
+
+        after = fetch_series(self.temperature, self.filters)
+        self.assertEqual(after.timestamps.tolist(), before.timestamps.tolist())
+        self.assertEqual(after.values.tolist(), [70.0, 75.0, 80.0])
+
+        middle = fetch_series(self.temperature, {
+            **self.filters,
+            'timestamp__gte': self.january + timedelta(days=10),
+            'timestamp__lt': self.february + timedelta(days=10),
+        })
+        self.assertEqual(middle.values.tolist(), [75.0, 80.0])
+
+        # Период после архива не читает его каталог
+        get_registry()
+        with self.assertNumQueries(1):
+            fetch_series(self.temperature, {
+                **self.filters, 'timestamp__gte': self.february,
+            })
+
+    def test_chart_data_api_reads_archive(self):
+        self._archive(self.january)
+        days = (timezone.now() - self.january).days + 1
+        response = self.client.get('/monitoring/api/chart-data/', {
+            'engine': self.engine.pk, 'parameter': 'temperature',
+            'days': days,
+        })
+        self.assertEqual(response.json()['values'], [70.0, 75.0, 80.0])
+
+        response = self.client.get('/monitoring/api/chart-data/', {
+            'engine': 'ME',
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_rearchive_merges_late_measurements(self):
+        self._archive(self.january)
+        first_path = ArchivedMonth.objects.get().path
+        self._record(self.january + timedelta(days=10), {
+            self.temperature: 72.0,
+        })
+
+        self.assertEqual(
+            fetch_series(self.temperature, self.filters).values.tolist(),
+            [70.0, 72.0, 75.0, 80.0],
+        )
+        self.assertEqual(self._archive(self.january), 1)
+
+        month = ArchivedMonth.objects.get()
+        self.assertEqual(month.measurement_count, 4)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.archive_root, first_path))
+        )
+        self.assertEqual(
+            fetch_series(self.temperature, self.filters).values.tolist(),
+            [70.0, 72.0, 75.0, 80.0],
+        )
+
+    def test_late_changes_keep_archived_rollups(self):
+        self._archive(self.january)
+        day = ParameterRollup.objects.filter(
+            parameter_type=self.temperature, resolution=DAY,
+            bucket=self.january + timedelta(days=20),
+        )
+        self.assertEqual(
+            list(day.values_list('count', 'sum')), [(1, 75.0)]
+        )
+
+        late = self._record(self.january + timedelta(days=20, hours=5), {
+            self.temperature: 77.0,
+        })
+        self.assertEqual(
+            list(day.values_list('count', 'sum')), [(2, 152.0)]
+        )
+        value = late.parameter_values.get()
+        value.value = 79.0
+        value.save()
+        self.assertEqual(
+            list(day.values_list('count', 'sum', 'max')), [(2, 154.0, 79.0)]
+        )
+        late.delete()
+        self.assertEqual(
+            list(day.values_list('count', 'sum', 'min', 'max')),
+            [(1, 75.0, 75.0, 75.0)],
+        )
+
+    def test_rebuild_rollups_keeps_archived_buckets(self):
+        self._archive(self.january)
+        rollups = ParameterRollup.objects.count()
+        rebuild_rollups(Engine.objects.get(pk=self.engine.pk))
+        self.assertEqual(ParameterRollup.objects.count(), rollups)
+
+    def test_archive_command(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                'archive_measurements', before='2024-02-15', stdout=StringIO()
+            )
+        self.assertEqual(Measurement.objects.count(), 1)
+
+        engine_root = os.path.join(self.archive_root, str(self.engine.pk))
+        self.assertEqual(len(os.listdir(engine_root)), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.engine.delete()
+        self.assertEqual(os.listdir(engine_root), [])
+
+
+class ExportTestCase(TestCase):
+    def setUp(self):
+        vessel = Vessel.objects.create(name="Vessel", imo_number="IMO1212121")
+        self.engine = Engine.objects.create(
+            vessel=vessel, name="ME", model="X", serial_number="SN120"
+        )
+        self.other_engine = Engine.objects.create(
+            vessel=vessel, name="AE", model="X", serial_number="SN121"
+        )
+        self.temperature = ParameterType.objects.create(
+            name="Температура", code="temperature", unit="°C"
+        )
+        self.pressure = ParameterType.objects.create(
+            name="Давление", code="pressure", unit="бар"
+        )
+        ParameterType.objects.create(
+            name="Обороты", code="speed", unit="об/мин"
+        )
+        start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        record_measurement(self.engine, start + timedelta(minutes=1), {
+            self.temperature: 80.5, self.pressure: 4.0,
+        })
+        record_measurement(self.engine, start, {self.pressure: 3.5})
+        record_measurement(self.other_engine, start, {self.temperature: 60.0})
+
+    def _export(self, **params):
+        response = self.client.get(
+            '/monitoring/measurements/export/', params
+        )
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv_export_wide_format(self):
+        content = self._export(engine=self.engine.pk).decode('utf-8-sig')
+        self.assertEqual(content.splitlines(), [
+            'timestamp,vessel,engine,temperature,pressure',
+            '2024-01-01 00:00:00,Vessel,SN120,,3.5',
+            '2024-01-01 00:01:00,Vessel,SN120,80.5,4.0',
+        ])
+
+    def test_csv_export_imports_back(self):
+        content = self._export(engine=self.engine.pk)
+        result = MeasurementImporter(
+            self.other_engine, None, '%Y-%m-%d %H:%M:%S'
+        ).import_csv(BytesIO(content), ',')
+        self.assertEqual(result.error_rows, [])
+        self.assertEqual(result.values_count, 3)
+
+    def test_xlsx_export(self):
+        workbook = load_workbook(BytesIO(self._export(format='xlsx')))
+        rows = list(workbook.active.iter_rows(values_only=True))
+        self.assertEqual(rows[0], (
+            'timestamp', 'vessel', 'engine', 'temperature', 'pressure',
+        ))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[3][2:], ('SN120', 80.5, 4.0))
+
+    def test_export_includes_archive_and_compacted_values(self):
+        archive_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_root, ignore_errors=True)
+        february = datetime(2024, 2, 1, tzinfo=dt_timezone.utc)
+        record_measurement(self.engine, february, {self.temperature: 90.0})
+        with override_settings(MONITORING_ARCHIVE_ROOT=archive_root):
+            archive_month(
+                Engine.objects.get(pk=self.engine.pk),
+                february - timedelta(days=1),
+            )
+            compact_values(
+                Engine.objects.get(pk=self.other_engine.pk),
+                [self.temperature.pk], february,
+            )
+            self.assertFalse(
+                Measurement.objects.filter(timestamp__lt=february).exists()
+            )
+            content = self._export().decode('utf-8-sig')
+            self.assertEqual(export_row_count(), 4)
+            self.assertEqual(export_row_count(limit=2), 2)
+
+        self.assertEqual(content.splitlines(), [
+            'timestamp,vessel,engine,temperature,pressure',
+            '2024-01-01 00:00:00,Vessel,SN120,,3.5',
+            '2024-01-01 00:00:00,Vessel,SN121,60.0,',
+            '2024-01-01 00:01:00,Vessel,SN120,80.5,4.0',
+            '2024-02-01 00:00:00,Vessel,SN120,90.0,',
+        ])
+
+    @override_settings(MONITORING_XLSX_EXPORT_MAX_ROWS=2)
+    def test_xlsx_export_row_limit(self):
+        # Книга собирается до отправки, поэтому большие выгрузки - в CSV
+        response = self.client.get(
+            '/monitoring/measurements/export/', {'format': 'xlsx'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('CSV', response.json()['error'])
+        self.assertEqual(len(self._export().splitlines()), 4)
+        self._export(format='xlsx', engine=self.other_engine.pk)
+
+    def test_unknown_format_rejected(self):
+        response = self.client.get(
+            '/monitoring/measurements/export/', {'format': 'pdf'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class IngestTestCase(TestCase):
+    def setUp(self):
+        vessel = Vessel.objects.create(name="Vessel", imo_number="IMO3434343")
+        self.engine = Engine.objects.create(
+            vessel=vessel, name="ME", model="X", serial_number="SN340"
+        )
+        self.other_engine = Engine.objects.create(
+            vessel=vessel, name="AE", model="X", serial_number="SN341"
+        )
+        ParameterType.objects.create(
+            name="Температура", code="temperature", unit="°C", max_value=120
+        )
+        ParameterType.objects.create(
+            name="Давление", code="pressure", unit="бар"
+        )
+        self.user = User.objects.create_user('logger', password='secret')
+        _, self.key = create_token(self.user, 'Logger')
+
+    def _post(self, body, content_type='application/json', key=None,
+              **headers):
+        return self.client.post(
+            '/monitoring/api/ingest/', body, content_type=content_type,
+            HTTP_AUTHORIZATION=f'Token {key or self.key}', **headers,
+        )
+
+    def test_token_required(self):
+        response = self._post('[]', key='wrong')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(Measurement.objects.exists())
+
+    def test_json_batch(self):
+        response = self._post(json.dumps({'measurements': [
+            {'engine': 'SN340', 'timestamp': '2024-01-01T00:00:00Z',
+             'values': {'temperature': 80.5, 'pressure': 4}},
+            {'engine': 'SN341', 'timestamp': '2024-01-01T00:00:00+03:00',
+             'values': {'temperature': 60}},
+        ]}))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['imported'], data['values']), (2, 3))
+        self.assertEqual(data['errors'], [])
+
+        measurement = self.engine.measurements.get()
+        self.assertEqual(measurement.created_by, self.user)
+        self.assertEqual(
+            self.other_engine.measurements.get().timestamp,
+            datetime(2023, 12, 31, 21, tzinfo=dt_timezone.utc),
+        )
+        self.assertEqual(LatestValue.objects.count(), 3)
+
+    def test_gzip_ndjson_with_invalid_records(self):
+        lines = [
+            '{"engine": "SN340", "timestamp": "2024-01-01T00:00:00",'
+            ' "values": {"temperature": 80}}',
+            '{"engine": "SN340", "timestamp": "2024-01-01T00:01:00",'
+            ' "values": {"temperature": 180}}',
+            '{"engine": "SN999", "timestamp": "2024-01-01T00:02:00",'
+            ' "values": {"temperature": 80}}',
+            '{"engine": "SN340", "timestamp": "yesterday",'
+            ' "values": {"temperature": 80}}',
+            '{"engine": "SN340", "timestamp": "2024-01-01T00:04:00",'
+            ' "values": {"speed": 80}}',
+            'not json',
+            '',
+            '{"engine": "SN340", "timestamp": "2024-01-01T00:05:00",'
+            ' "values": {"pressure": 4.2}}',
+        ]
+        response = self._post(
+            gzip.compress('\n'.join(lines).encode('utf-8')),
+            content_type='application/x-ndjson', HTTP_CONTENT_ENCODING='gzip',
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['records'], data['imported']), (7, 3))
+        self.assertEqual(data['error_count'], 4)
+        self.assertIn('Неизвестный двигатель', data['errors'][0])
+        self.assertIn('Неизвестный параметр: speed', data['errors'][2])
+
+    def test_plain_ndjson(self):
+        lines = [
+            '{"engine": "SN340", "timestamp": "2024-01-01T00:00:00Z",'
+            ' "values": {"temperature": 80, "pressure": 4}}',
+            '{"engine": "SN341", "timestamp": "2024-01-01T00:01:00Z",'
+            ' "values": {"temperature": 70.5}}',
+            '{"engine": "SN340", "timestamp": "2024-01-01T00:02:00Z",'
+            ' "values": {"temperature": "горячо"}}',
+        ]
+        response = self._post(
+            '\n'.join(lines) + '\n', content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            (data['records'], data['imported'], data['values']), (3, 2, 3)
+        )
+        self.assertTrue(data['errors'][0].startswith('Запись 3:'))
+
+    def test_non_finite_values_rejected(self):
+        body = (
+            '[{"engine": "SN340", "timestamp": "2024-01-01T00:00:00Z",'
+            ' "values": {"pressure": NaN}},'
+            ' {"engine": "SN340", "timestamp": "2024-01-01T00:01:00Z",'
+            ' "values": {"pressure": -Infinity}},'
+            ' {"engine": "SN340", "timestamp": "2024-01-01T00:02:00Z",'
+            ' "values": {"pressure": 1e400}},'
+            ' {"engine": "SN340", "timestamp": "2024-01-01T00:03:00Z",'
+            ' "values": {"pressure": 4.5}}]'
+        )
+        response = self._post(body)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['imported'], data['error_count']), (1, 3))
+        self.assertIn('конечным', data['errors'][0])
+        self.assertEqual(ParameterValue.objects.get().value, 4.5)
+
+    def test_out_of_range_values_stored_with_alarm(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._post(json.dumps([
+                {'engine': 'SN340', 'timestamp': '2024-01-01T00:00:00Z',
+                 'values': {'temperature': 130, 'pressure': 4.2}},
+            ]))
+        data = response.json()
+        self.assertEqual((data['imported'], data['values']), (1, 2))
+        self.assertEqual(data['errors'], [])
+        self.assertEqual(
+            list(Alarm.objects.values_list(
+                'engine__serial_number', 'parameter_type__code', 'kind',
+                'value',
+            )),
+            [('SN340', 'temperature', Alarm.KIND_HIGH, 130.0)],
+        )
+
+    def test_failed_batch_not_written_again(self):
+        def records():
+            for minute in range(3):
+                yield minute + 1, {
+                    'engine': 'SN340',
+                    'timestamp': f'2024-01-01T00:0{minute}:00Z',
+                    'values': {'temperature': 80.0},
+                }
+
+        ingestor = MeasurementIngestor(self.user, batch_size=2)
+        with mock.patch('monitoring.ingest.record_batches',
+                        side_effect=DatabaseError('disk full')) as write:
+            with self.assertRaisesMessage(DatabaseError, 'disk full'):
+                ingestor.ingest(records())
+        write.assert_called_once()
+        self.assertEqual(ingestor.result.imported_count, 0)
+
+    def test_records_before_unreadable_body_saved(self):
+        def records():
+            yield 1, {'engine': 'SN340', 'timestamp': '2024-01-01T00:00:00Z',
+                      'values': {'temperature': 80.0}}
+            raise IngestError('Обрыв соединения')
+
+        ingestor = MeasurementIngestor(self.user)
+        with self.assertRaises(IngestError):
+            ingestor.ingest(records())
+        self.assertEqual(ingestor.result.imported_count, 1)
+        self.assertEqual(ParameterValue.objects.get().value, 80.0)
+
+    def test_malformed_body_rejected(self):
+        response = self._post('{"measurements": 1}')
+        self.assertEqual(response.status_code, 400)
+        response = self._post(
+            b'[]', HTTP_CONTENT_ENCODING='br'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('br', response.json()['error'])
+
+
+class AlarmTestCase(TestCase):
+    def setUp(self):
+        vessel = Vessel.objects.create(name="Vessel", imo_number="IMO6767676")
+        self.engine = Engine.objects.create(
+            vessel=vessel, name="ME", model="X", serial_number="SN670"
+        )
+        self.temperature = ParameterType.objects.create(
+            name="Температура", code="temperature", unit="°C", max_value=120
+        )
+        self.start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+    @staticmethod
+    def _normal(count):
+        # Обычный ряд: небольшие колебания около 80
+        return [80 + (index % 5) * 0.1 for index in range(count)]
+
+    def _record(self, values, offset=0):
+        with self.captureOnCommitCallbacks(execute=True):
+            for minute, value in enumerate(values, start=offset):
+                record_measurement(
+                    self.engine, self.start + timedelta(minutes=minute),
+                    {self.temperature: value},
+                )
+
+    def test_detect_series(self):
+        values = np.array(self._normal(100))
+        values[80] = 95.0
+        values[90] = 130.0
+        timestamps = np.arange(100, dtype=np.int64) * 60_000
+
+        found = detect(timestamps, values, self.temperature)
+        self.assertIn((Alarm.KIND_HIGH, 90, 120), found)
+        self.assertEqual(
+            sorted({index for kind, index, _ in found
+                    if kind == Alarm.KIND_ZSCORE}),
+            [80, 90],
+        )
+        # Скачок вверх и возврат к обычным значениям
+        self.assertEqual(
+            [index for kind, index, _ in found if kind == Alarm.KIND_RATE],
+            [80, 81, 90, 91],
+        )
+        # Точки до start не проверяются, но служат окном
+        self.assertEqual(
+            {index for _, index, _ in detect(
+                timestamps, values, self.temperature, start=85
+            )},
+            {90, 91},
+        )
+        # Короткий кусок с тем же результатом
+        with mock.patch('monitoring.alarms.DETECT_CHUNK_SIZE', 7):
+            self.assertEqual(
+                sorted(detect(timestamps, values, self.temperature)),
+                sorted(found),
+            )
+
+    def test_new_values_checked_by_tail(self):
+        self._record(self._normal(ALARM_WINDOW + 10))
+        self.assertFalse(Alarm.objects.exists())
+
+        self._record([95.0], offset=ALARM_WINDOW + 10)
+        self.assertEqual(
+            set(Alarm.objects.values_list('kind', flat=True)),
+            {Alarm.KIND_ZSCORE, Alarm.KIND_RATE},
+        )
+        alarm = Alarm.objects.get(kind=Alarm.KIND_ZSCORE)
+        self.assertEqual(alarm.value, 95.0)
+        self.assertGreater(alarm.score, 4)
+
+        # Хвосты всех пар - одним запросом, повторная проверка
+        # не дублирует тревоги
+        get_registry()
+        row = (self.engine.pk, self.temperature.pk, alarm.timestamp, 95.0)
+        with self.assertNumQueries(2):
+            detect_new_values([row])
+        self.assertEqual(Alarm.objects.count(), 2)
+
+    def test_history_command_and_api(self):
+        self._record(self._normal(10))
+        # Пределы ужесточены после записи значений
+        self.temperature.max_value = 80.25
+        self.temperature.save()
+        call_command('detect_alarms', stdout=StringIO())
+        call_command('detect_alarms', stdout=StringIO())
+        self.assertEqual(
+            Alarm.objects.filter(kind=Alarm.KIND_HIGH).count(), 4
+        )
+
+        response = self.client.get('/monitoring/api/alarms/', {
+            'engine': self.engine.pk, 'kind': Alarm.KIND_HIGH, 'limit': 3,
+        })
+        data = response.json()
+        self.assertEqual(len(data['results']), 3)
+        self.assertEqual(data['results'][0]['timestamp'],
+                         (self.start + timedelta(minutes=9)).isoformat())
+        self.assertEqual(data['results'][0]['parameter'], 'temperature')
+        response = self.client.get('/monitoring/api/alarms/', {
+            'engine': self.engine.pk, 'after': data['next_cursor'],
+        })
+        self.assertEqual(len(response.json()['results']), 1)
+
+        response = self.client.get('/monitoring/api/alarms/', {
+            'parameter': 'speed',
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class RetentionTestCase(TestCase):
+    def setUp(self):
+        vessel = Vessel.objects.create(name="Vessel", imo_number="IMO7878787")
+        self.engine = Engine.objects.create(
+            vessel=vessel, name="ME", model="X", serial_number="SN780"
+        )
+        self.other_engine = Engine.objects.create(
+            vessel=vessel, name="AE", model="X", serial_number="SN781"
+        )
+        self.temperature = ParameterType.objects.create(
+            name="Температура", code="temperature", unit="°C"
+        )
+        self.pressure = ParameterType.objects.create(
+            name="Давление", code="pressure", unit="бар"
+        )
+        self.cutoff = retention_cutoff(1)
+        self.old = self.cutoff - timedelta(days=1)
+        # Два замера в минуту за три минуты до границы и один свежий
+        for index in range(6):
+            for engine in (self.engine, self.other_engine):
+                record_measurement(
+                    engine, self.old + timedelta(seconds=30 * index),
+                    {self.temperature: 80.0 + index, self.pressure: 4.0},
+                )
+        record_measurement(
+            self.engine, timezone.now() - timedelta(hours=1),
+            {self.temperature: 90.0, self.pressure: 5.0},
+        )
+
+        # Для пары действует самая точная политика
+        RetentionPolicy.objects.create(raw_days=30)
+        RetentionPolicy.objects.create(engine=self.engine, raw_days=365)
+        RetentionPolicy.objects.create(
+            parameter_type=self.temperature, raw_days=1
+        )
+        RetentionPolicy.objects.create(engine=self.other_engine, raw_days=1)
+
+    def _old_values(self, engine, parameter_type):
+        return ParameterValue.objects.filter(
+            measurement__engine=engine, parameter_type=parameter_type,
+            measurement__timestamp__lt=self.cutoff,
+        ).count()
+
+    def test_compaction(self):
+        call_command('apply_retention', batch_size=4, stdout=StringIO())
+
+        self.assertEqual(self._old_values(self.engine, self.temperature), 0)
+        self.assertEqual(self._old_values(self.engine, self.pressure), 6)
+        self.assertEqual(
+            self.engine.measurements.filter(timestamp__lt=self.cutoff).count(),
+            6,
+        )
+        # У второго двигателя сжаты все параметры - замеры удалены
+        self.assertFalse(self.other_engine.measurements.exists())
+
+        minutes = ParameterRollup.objects.filter(
+            engine=self.engine, parameter_type=self.temperature,
+            resolution=MINUTE,
+        ).order_by('bucket')
+        self.assertEqual([rollup.count for rollup in minutes], [2, 2, 2])
+        self.assertEqual([rollup.avg for rollup in minutes], [80.5, 82.5, 84.5])
+        self.engine.refresh_from_db()
+        self.assertEqual(self.engine.compacted_until, self.cutoff)
+
+        # Сырой ряд за сжатый период - средние минутных агрегатов
+        series = fetch_series(self.temperature, {'engine_id': self.engine.pk})
+        self.assertEqual(series.values.tolist(), [80.5, 82.5, 84.5, 90.0])
+
+        # Часовые агрегаты сжатого периода переживают пересборку
+        rebuild_rollups(self.engine)
+        hourly = ParameterRollup.objects.get(
+            engine=self.engine, parameter_type=self.temperature,
+            resolution=HOUR, bucket=self.old,
+        )
+        self.assertEqual((hourly.count, hourly.max), (6, 85.0))
+
+        # Повторный запуск ничего не меняет
+        call_command('apply_retention', stdout=StringIO())
+        self.assertEqual(minutes.count(), 3)
+        self.assertEqual(minutes.first().count, 2)
+
+    def test_compacted_period_after_late_changes(self):
+        call_command('apply_retention', stdout=StringIO())
+        hourly = ParameterRollup.objects.filter(
+            engine=self.engine, parameter_type=self.temperature,
+            resolution=HOUR, bucket=self.old,
+        )
+        late = record_measurement(
+            self.engine, self.old + timedelta(minutes=30),
+            {self.temperature: 70.0},
+        )
+        self.assertEqual(
+            list(hourly.values_list('count', 'min', 'max')), [(7, 70.0, 85.0)]
+        )
+        late.delete()
+        self.assertEqual(
+            list(hourly.values_list('count', 'min', 'max')), [(6, 80.0, 85.0)]
+        )
+
+        response = self.client.get('/monitoring/api/chart-data/', {
+            'engine': str(self.engine.pk), 'days': 3,
+        })
+        self.assertEqual(
+            response.json()['values'], [80.5, 82.5, 84.5, 90.0]
+        )
+
+    def test_general_policy_must_be_unique(self):
+        with self.assertRaises(ValidationError):
+            RetentionPolicy(raw_days=10).full_clean()
+
+
+class OverlayTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        vessel = Vessel.objects.create(name="Vessel", imo_number="IMO5656565")
+        self.port = Engine.objects.create(
+            vessel=vessel, name="ME PS", model="X", serial_number="SN560"
+        )
+        self.starboard = Engine.objects.create(
+            vessel=vessel, name="ME SB", model="X", serial_number="SN561"
+        )
+        self.temperature = ParameterType.objects.create(
+            name="Температура", code="temperature", unit="°C"
+        )
+        self.load = ParameterType.objects.create(
+            name="Нагрузка", code="load", unit="%"
+        )
+        self.start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        # Левый борт - каждые 10 минут, правый - со сдвигом на 5 минут
+        for minute in range(0, 60, 10):
+            record_measurement(
+                self.port, self.start + timedelta(minutes=minute),
+                {self.temperature: float(minute), self.load: 50.0},
+            )
+            record_measurement(
+                self.starboard, self.start + timedelta(minutes=minute + 5),
+                {self.temperature: float(minute + 5)},
+            )
+
+    def _get(self, **params):
+        return self.client.get('/monitoring/api/overlay/', {
+            'series': [f'{self.port.pk}:temperature',
+                       f'{self.starboard.pk}:temperature',
+                       f'{self.port.pk}:load'],
+            **params,
+        })
+
+    def test_series_without_grid(self):
+        data = self._get().json()
+        self.assertIsNone(data['step'])
+        self.assertEqual(
+            [(series['engine'], series['parameter'])
+             for series in data['series']],
+            [(self.port.pk, 'temperature'), (self.starboard.pk, 'temperature'),
+             (self.port.pk, 'load')],
+        )
+        self.assertEqual(data['series'][1]['values'][:2], [5.0, 15.0])
+
+    def test_aligned_series(self):
+        get_registry()
+        # Границы данных по агрегатам и один запрос на ряд
+        with self.assertNumQueries(4):
+            data = self._get(
+                step=300, date_from='2024-01-01', date_to='2024-01-01',
+            ).json()
+
+        self.assertEqual(data['resolution'], RAW)
+        self.assertEqual(len(data['timestamps']), 12)
+        self.assertEqual(data['labels'][1], '01.01.2024 00:05')
+        port, starboard, load = data['series']
+        # Узлы вне периода ряда пустые, между точками - интерполяция
+        self.assertEqual(port['values'][:3], [0.0, 5.0, 10.0])
+        self.assertEqual(port['values'][-1], None)
+        self.assertEqual(starboard['values'][:3], [None, 5.0, 10.0])
+        self.assertEqual(load['stats']['count'], 6)
+
+    def test_hourly_grid_uses_rollups(self):
+        data = self._get(step=3600).json()
+        self.assertEqual(data['resolution'], HOUR)
+        self.assertEqual(data['series'][0]['values'], [25.0])
+        self.assertEqual(data['series'][0]['stats']['count'], 6)
+
+    def test_grid_size_checked_before_fetch(self):
+        # Сетка по сырым значениям - только за ограниченный период
+        response = self._get(step=300)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date_from', response.json()['error'])
+
+        # Год по секундам отклоняется по границам из агрегатов,
+        # ряды не загружаются
+        get_registry()
+        with self.assertNumQueries(1):
+            response = self._get(
+                step=1, date_from='2023-06-01', date_to='2024-06-01',
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('увеличьте шаг', response.json()['error'])
+
+        # Период длиннее данных: сетка ограничена самими данными
+        response = self._get(
+            step=60, date_from='2023-06-01', date_to='2024-06-01',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['timestamps']), 56)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self._get(step='x').status_code, 400)
+        self.assertEqual(self._get(step=0).status_code, 400)
+        response = self.client.get('/monitoring/api/overlay/', {
+            'series': f'{self.port.pk}:speed',
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('speed', response.json()['error'])
+
+    def test_interpolate_skips_gaps(self):
+        minute = 60_000
+        series = Series(
+            np.array([0, 1, 2, 3, 20], dtype=np.int64) * minute,
+            np.array([0.0, 1.0, 2.0, 3.0, 20.0]),
+        )
+        grid = np.arange(0, 22, 2, dtype=np.int64) * minute
+        values = interpolate(series, grid)
+        self.assertEqual(values[:2].tolist(), [0.0, 2.0])
+        self.assertTrue(np.isnan(values[2:10]).all())
+        self.assertEqual(values[10], 20.0)
+
+
+class LiveTrendsTestCase(TestCase):
+    def setUp(self):
+        vessel = Vessel.objects.create(name="Vessel", imo_number="IMO4545454")
+        self.engine = Engine.objects.create(
+            vessel=vessel, name="ME", model="X", serial_number="SN450"
+        )
+        self.other_engine = Engine.objects.create(
+            vessel=vessel, name="AE", model="X", serial_number="SN451"
+        )
+        self.temperature = ParameterType.objects.create(
+            name="Температура", code="temperature", unit="°C"
+        )
+
+    def _record(self, engine, minute, value):
+        with self.captureOnCommitCallbacks(execute=True):
+            record_measurement(
+                engine, datetime(2024, 1, 1, 0, minute, tzinfo=dt_timezone.utc),
+                {self.temperature: value},
+            )
+
+    async def test_stream_receives_committed_values(self):
+        stream = event_stream(self.engine.pk, self.temperature.pk)
+        self.assertTrue((await anext(stream)).startswith('retry:'))
+        self.assertTrue(has_subscribers())
+
+        await sync_to_async(self._record)(self.other_engine, 0, 1.0)
+        await sync_to_async(self._record)(self.engine, 5, 81.5)
+        await sync_to_async(self._record)(self.engine, 6, 82.0)
+
+        # Оба замера двигателя приходят одним куском, чужой - нет
+        chunk = await asyncio.wait_for(anext(stream), 1)
+        events = [
+            json.loads(line.removeprefix('data: '))
+            for line in chunk.splitlines() if line.startswith('data: ')
+        ]
+        self.assertEqual([event['values'] for event in events],
+                         [[81.5], [82.0]])
+        self.assertEqual(events[0]['labels'], ['01.01.2024 00:05'])
+
+        await stream.aclose()
+        self.assertFalse(has_subscribers())
+
+    async def test_heartbeat(self):
+        stream = event_stream(self.engine.pk, self.temperature.pk, heartbeat=0)
+        await anext(stream)
+        self.assertEqual(await anext(stream), ': ping\n\n')
+        await stream.aclose()
+
+    def test_requires_asgi(self):
+        response = self.client.get('/monitoring/api/live/', {
+            'engine': self.engine.pk, 'parameter': 'temperature',
+        })
+        self.assertEqual(response.status_code, 501)
+
+    async def test_asgi_stream(self):
+        response = await self.async_client.get('/monitoring/api/live/', {
+            'engine': self.engine.pk, 'parameter': 'unknown',
+        })
+        self.assertEqual(response.status_code, 404)
+
+        response = await self.async_client.get('/monitoring/api/live/', {
+            'engine': self.engine.pk, 'parameter': 'temperature',
+        })
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = response.streaming_content
+        self.assertTrue((await anext(content)).startswith(b'retry:'))
+
+        # Отключение клиента: ASGI-обработчик отменяет отправку ответа
+        task = asyncio.ensure_future(anext(content))
+        await asyncio.sleep(0)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertFalse(has_subscribers())
+
+
+class ImportJobTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.vessel = Vessel.objects.create(
+            name="Vessel", imo_number="IMO2222222"
+        )
+        self.engine = Engine.objects.create(
+            vessel=self.vessel, name="ME", model="X", serial_number="SN300"
+        )
+        ParameterType.objects.create(
+            name="Температура", code="temperature", unit="°C"
+        )
+        self.user = User.objects.create_user('operator', password='secret')
+        self.client.force_login(self.user)
+        self.csv = (
+            b"timestamp,temperature\n"
+            b"2024-01-01 00:00:00,80\n"
+            b"2024-01-01 00:01:00,oops\n"
+        )
+
+    def _post(self):
+        return self.client.post('/monitoring/import-csv/', {
+            'csv_file': SimpleUploadedFile('log.csv', self.csv),
+            'vessel': self.vessel.pk,
+            'engine': self.engine.pk,
+            'timestamp_format': '%Y-%m-%d %H:%M:%S',
+            'delimiter': ',',
+        })
+
+    @override_settings(MONITORING_IMPORT_MODE='sync')
+    def test_upload_creates_job_and_reports_status(self):
+        response = self._post()
+        job = ImportJob.objects.get()
+        self.assertRedirects(
+            response, f'/monitoring/import-csv/?job={job.pk}'
+        )
+
+        status = self.client.get(
+            f'/monitoring/import-jobs/{job.pk}/status/'
+        ).json()
+        self.assertEqual(status['status'], ImportJob.STATUS_DONE)
+        self.assertTrue(status['finished'])
+        self.assertEqual(status['progress'], 100)
+        self.assertEqual(status['rows_count'], 2)
+        self.assertEqual(status['imported_count'], 1)
+        self.assertEqual(status['error_count'], 1)
+        self.assertIn("Строка 3:", status['errors'][0])
+
+        page = self.client.get(f'/monitoring/import-csv/?job={job.pk}')
+        self.assertContains(page, "Строка 3:")
+
+    def test_other_user_cannot_see_job(self):
+        self._post()
+        job = ImportJob.objects.get()
+        other = User.objects.create_user('stranger', password='secret')
+        self.client.force_login(other)
+
+        response = self.client.get(
+            f'/monitoring/import-jobs/{job.pk}/status/'
+        )
+        self.assertEqual(response.status_code, 404)
+        page = self.client.get(f'/monitoring/import-csv/?job={job.pk}')
+        self.assertNotContains(page, "Строка 3:")
+
+    @override_settings(MONITORING_IMPORT_MODE='queue')
+    def test_queue_mode_waits_for_worker(self):
+        self._post()
+        job = ImportJob.objects.get()
+        self.assertEqual(job.status, ImportJob.STATUS_PENDING)
+        self.assertEqual(Measurement.objects.count(), 0)
+
+        self.assertEqual(claim_next_job(), job.pk)
+        self.assertIsNone(claim_next_job())
+        run_import_job(job.pk, claimed=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.STATUS_DONE)
+        self.assertEqual(Measurement.objects.count(), 1)
+
+    @override_settings(
+        MONITORING_IMPORT_MODE='sync', MONITORING_UPLOAD_CHUNK_SIZE=16
+    )
+    def test_chunked_upload_resumes_and_imports(self):
+        start = self.client.post('/monitoring/uploads/', {
+            'filename': 'voyage.csv',
+            'size': 200 * 1024 * 1024,
+        })
+        # Файлы больше прежнего лимита 10MB принимаются
+        self.assertEqual(start.status_code, 201)
+
+        start = self.client.post('/monitoring/uploads/', {
+            'filename': 'log.csv', 'size': len(self.csv),
+        }).json()
+        url = f"/monitoring/uploads/{start['id']}/"
+        self.assertEqual(start['chunk_size'], 16)
+
+        response = self.client.put(
+            f'{url}?offset=0', self.csv[:16],
+            content_type='application/octet-stream',
+        )
+        self.assertEqual(response.json()['offset'], 16)
+
+        # Повтор уже принятой части - клиенту сообщается текущее смещение
+        response = self.client.put(
+            f'{url}?offset=0', self.csv[:16],
+            content_type='application/octet-stream',
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 16)
+
+        offset = 16
+        while offset < len(self.csv):
+            response = self.client.put(
+                f'{url}?offset={offset}', self.csv[offset:offset + 16],
+                content_type='application/octet-stream',
+            )
+            offset = response.json()['offset']
+        self.assertTrue(response.json()['complete'])
+
+        response = self.client.post('/monitoring/import-csv/', {
+            'upload_id': start['id'],
+            'vessel': self.vessel.pk,
+            'engine': self.engine.pk,
+            'timestamp_format': '%Y-%m-%d %H:%M:%S',
+            'delimiter': ',',
+        })
+        job = ImportJob.objects.get()
+        self.assertRedirects(
+            response, f'/monitoring/import-csv/?job={job.pk}'
+        )
+        self.assertEqual(job.status, ImportJob.STATUS_DONE)
+        self.assertEqual(job.original_name, 'log.csv')
+        self.assertEqual(job.imported_count, 1)
@@ -0,0 +1,81 @@
+"""
+Загрузка больших файлов импорта частями.
+
+Каждая часть копируется из тела запроса прямо в файл на диске небольшими
+блоками, поэтому память процесса не зависит ни от размера части, ни от
+размера файла. После обрыва связи клиент запрашивает текущее смещение
+и продолжает загрузку с него.
+"""
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from .models import ChunkedUpload
+
+# Размер блока при копировании тела запроса в файл
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Часть файла не принята; клиент должен продолжить с upload.uploaded_bytes."""
+
+
+def get_chunk_size():
+    """Рекомендуемый клиенту размер части, MONITORING_UPLOAD_CHUNK_SIZE."""
+    return getattr(settings, 'MONITORING_UPLOAD_CHUNK_SIZE', 4 * 1024 * 1024)
+
+
+def get_max_file_size():
+    """Максимальный размер файла импорта, MONITORING_IMPORT_MAX_FILE_SIZE."""
+    return getattr(
+        settings, 'MONITORING_IMPORT_MAX_FILE_SIZE', 2 * 1024 * 1024 * 1024
+    )
+
+
+def start_upload(user, filename, total_bytes):
+    """Создание пустого файла на диске и записи о загрузке."""
+    upload = ChunkedUpload(
+        created_by=user, filename=filename, total_bytes=total_bytes
+    )
+    upload.file.save(f'{filename}.part', ContentFile(b''), save=False)
+    upload.save()
+    return upload
+
+
+def append_chunk(upload, stream, offset, length):
+    """
+    Запись части файла из потока (тела запроса) по смещению offset.
+
+    Args:
+        upload: Загрузка ChunkedUpload
+        stream: Объект с методом read() - тело запроса
+        offset: Смещение части в файле
+        length: Длина части из Content-Length
+
+    Raises:
+        UploadError: Неверное смещение, размер или неполная часть
+    """
+    if offset != upload.uploaded_bytes:
+        raise UploadError('Неверное смещение части файла')
+    if length <= 0 or length > get_chunk_size():
+        raise UploadError('Неверный размер части файла')
+    if offset + length > upload.total_bytes:
+        raise UploadError('Часть выходит за пределы файла')
+
+    with open(upload.file.path, 'r+b') as file:
+        # Остаток оборванной ранее части отбрасывается
+        file.seek(offset)
+        file.truncate()
+
+        remaining = length
+        while remaining:
+            data = stream.read(min(COPY_BUFFER_SIZE, remaining))
+            if not data:
+                break
+            file.write(data)
+            remaining -= len(data)
+
+    if remaining:
+        raise UploadError('Часть файла получена не полностью')
+
+    upload.uploaded_bytes = offset + length
+    upload.save(update_fields=['uploaded_bytes', 'updated_at'])
@@ -0,0 +1,88 @@
+"""
+Вставка строк с обновлением при конфликте, вычисляемым в базе.
+
+bulk_create(update_conflicts=True) записывает в существующую строку
+значения, посчитанные в Python по прочитанной ранее строке. Два
+параллельных писателя в строку, которой еще нет, оба ничего
+не прочитают, и последний затрет результат первого. Здесь новое
+значение считается в самом INSERT ... ON CONFLICT DO UPDATE
+из текущего и вставляемого (EXCLUDED): сумма, минимум или максимум,
+а замена - только если строка не старше текущей. Оператор атомарен,
+поэтому блокировки и предварительное чтение не нужны.
+
+Как и bulk_create с unique_fields, работает на SQLite и PostgreSQL.
+"""
+from django.db import connection, transaction
+
+# Способы обновления поля при конфликте
+ADD = 'add'
+LEAST = 'least'
+GREATEST = 'greatest'
+REPLACE = 'replace'
+
+_FUNCTIONS = {
+    'sqlite': {LEAST: 'MIN', GREATEST: 'MAX'},
+    'postgresql': {LEAST: 'LEAST', GREATEST: 'GREATEST'},
+}
+
+
+def upsert(model, fields, rows, unique_fields, updates, order_field=None):
+    """
+    Вставка строк; при конфликте существующая строка обновляется в базе.
+
+    Args:
+        model: Модель
+        fields: Имена полей в порядке значений строк
+        rows: Кортежи значений
+        unique_fields: Поля уникального ограничения
+        updates: {поле: ADD, LEAST, GREATEST или REPLACE}
+        order_field: Если задано, строка обновляется, только когда
+            вставляемое значение этого поля не меньше текущего
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    functions = _FUNCTIONS[connection.vendor]
+    table = quote(model._meta.db_table)
+    model_fields = [model._meta.get_field(name) for name in fields]
+
+    def column(name):
+        return quote(model._meta.get_field(name).column)
+
+    assignments = []
+    for name, how in updates.items():
+        current, new = f'{table}.{column(name)}', f'EXCLUDED.{column(name)}'
+        if how == ADD:
+            expression = f'{current} + {new}'
+        elif how == REPLACE:
+            expression = new
+        else:
+            expression = f'{functions[how]}({current}, {new})'
+        assignments.append(f'{column(name)} = {expression}')
+
+    sql = (
+        f'INSERT INTO {table} '
+        f'({", ".join(quote(field.column) for field in model_fields)}) '
+        f'VALUES {{values}} '
+        f'ON CONFLICT ({", ".join(column(name) for name in unique_fields)}) '
+        f'DO UPDATE SET {", ".join(assignments)}'
+    )
+    if order_field is not None:
+        sql += (f' WHERE EXCLUDED.{column(order_field)} '
+                f'>= {table}.{column(order_field)}')
+
+    placeholder = f'({", ".join(["%s"] * len(fields))})'
+    batch_size = connection.ops.bulk_batch_size(model_fields, rows)
+    # Без точки сохранения: вызывается внутри транзакции записи значений
+    with transaction.atomic(savepoint=False), connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                sql.format(values=', '.join([placeholder] * len(batch))),
+                [
+                    field.get_db_prep_save(value, connection)
+                    for row in batch
+                    for field, value in zip(model_fields, row)
+                ],
+            )
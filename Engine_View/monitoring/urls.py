@@ -12,8 +12,22 @@ urlpatterns = [
     path('stats/', views.vessel_engine_stats, name='vessel_engine_stats'),
     path('measurements/create/', views.create_measurement,
          name='create_measurement'),
+    path('api/measurements/', views.measurements_api,
+         name='measurements_api'),
+    path('measurements/export/', views.export_measurements,
+         name='export_measurements'),
+    path('api/current-state/', views.current_state_api,
+         name='current_state_api'),
+    path('api/alarms/', views.alarms_api, name='alarms_api'),
+    path('api/ingest/', views.ingest_api, name='ingest_api'),
     path('api/chart-data/', views.chart_data_api, name='chart_data_api'),
+    path('api/overlay/', views.overlay_api, name='overlay_api'),
+    path('api/live/', views.live_trends, name='live_trends'),
     path('import-csv/', views.import_csv, name='import_csv'),
+    path('uploads/', views.upload_start, name='upload_start'),
+    path('uploads/<int:pk>/', views.upload_detail, name='upload_detail'),
+    path('import-jobs/<int:pk>/status/', views.import_job_status,
+         name='import_job_status'),
     path('download-template/', views.download_csv_template,
          name='download_csv_template'),
     path('measurements/<int:pk>/delete/', views.delete_measurement,
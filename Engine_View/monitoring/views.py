@@ -4,79 +4,400 @@ Views for Engine View monitoring system.
 import csv
 import json
 from datetime import datetime, timedelta
-from io import TextIOWrapper
+from urllib.parse import urlencode
 
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.db.models import Exists, OuterRef
-from django.http import HttpResponse, JsonResponse
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count, Exists, OuterRef, Prefetch, Q
+from django.http import (
+    Http404,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.utils import timezone
-
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods, require_POST
+
+from .caching import cached_chart_data
+from .downsampling import METHODS, MIN_POINTS, MINMAX
+from .export import (
+    CONTENT_TYPES,
+    CSV,
+    FORMATS,
+    XLSX,
+    export_chunks,
+    export_row_count,
+    get_xlsx_max_rows,
+)
+from .filters import filter_measurements, form_lookups
 from .forms import (
+    ChunkedUploadForm,
     CSVImportForm,
     MeasurementFilterForm,
     MeasurementWithParametersForm,
     ParameterTypeForm,
 )
-from .models import Engine, Measurement, ParameterType, ParameterValue, Vessel
+from .ingest import (
+    IngestError,
+    MeasurementIngestor,
+    authenticate_token,
+    read_records,
+)
+from .jobs import enqueue_import_job
+from .latest import current_state
+from .live import event_stream
+from .models import (
+    Alarm,
+    ChunkedUpload,
+    ImportJob,
+    Measurement,
+    ParameterType,
+    ParameterValue,
+)
+from .overlay import OverlayError, build_overlay, parse_series
+from .pagination import (
+    AFTER,
+    BEFORE,
+    InvalidCursor,
+    cursor_query,
+    paginate_keyset,
+)
+from .registry import get_registry
+from .rollups import RAW
+from .series import DEFAULT_MAX_POINTS, MAX_POINTS_LIMIT
+from .services import record_measurement
+from .stats import fleet_stats
+from .uploads import UploadError, append_chunk, get_chunk_size, start_upload
+
+# Замеров на странице списка
+MEASUREMENTS_PER_PAGE = 50
+
+# Замеров на странице API по умолчанию и максимум
+API_PAGE_SIZE = 100
+MAX_API_PAGE_SIZE = 1000
+
+# Сколько значений параметров показывается в строке списка замеров
+PREVIEW_VALUES = 4
+
+# Наибольший период API данных графика, дней
+MAX_CHART_DAYS = 100 * 366
+
+
+def get_keyset_page(queryset, params, per_page):
+    """Страница по курсору из GET-параметров after/before."""
+    return paginate_keyset(
+        queryset, per_page,
+        after=params.get(AFTER), before=params.get(BEFORE),
+    )
 
 
 def measurement_list(request):
     """
     Отображение списка всех замеров с возможностью фильтрации.
 
-    Поддерживает фильтрацию по судну, двигателю и дате.
+    Поддерживает фильтрацию по судну, двигателю и дате. Страницы
+    выбираются по курсору (timestamp, id), поэтому из базы читается только
+    текущая страница: число значений каждого замера считается аннотацией,
+    а первые PREVIEW_VALUES значений подгружаются одним запросом.
     """
-    # Получаем все замеры с оптимизацией запросов
-    measurements = Measurement.objects.select_related(
+    filter_form = MeasurementFilterForm(request.GET)
+    measurements = filter_measurements(Measurement.objects.all(), filter_form)
+
+    one_week_ago = timezone.now() - timedelta(days=7)
+    stats = measurements.aggregate(
+        total_count=Count('pk'),
+        vessels_count=Count('engine__vessel', distinct=True),
+        engines_count=Count('engine', distinct=True),
+        last_week_count=Count('pk', filter=Q(timestamp__gte=one_week_ago)),
+    )
+
+    page_queryset = measurements.select_related(
         'engine', 'engine__vessel', 'created_by'
+    ).annotate(
+        values_count=Count('parameter_values')
     ).prefetch_related(
-        'parameter_values__parameter_type'
-    ).order_by('-timestamp')
+        Prefetch(
+            'parameter_values',
+            queryset=ParameterValue.objects.select_related(
+                'parameter_type'
+            ).order_by('pk')[:PREVIEW_VALUES],
+            to_attr='preview_values',
+        )
+    )
 
-    # Применяем фильтры
-    filter_form = MeasurementFilterForm(request.GET)
+    try:
+        page_obj = get_keyset_page(
+            page_queryset, request.GET, MEASUREMENTS_PER_PAGE
+        )
+    except InvalidCursor:
+        page_obj = paginate_keyset(page_queryset, MEASUREMENTS_PER_PAGE)
 
-    if filter_form.is_valid():
-        vessel = filter_form.cleaned_data.get('vessel')
-        engine = filter_form.cleaned_data.get('engine')
-        date_from = filter_form.cleaned_data.get('date_from')
-        date_to = filter_form.cleaned_data.get('date_to')
-
-        if vessel:
-            measurements = measurements.filter(engine__vessel=vessel)
-        if engine:
-            measurements = measurements.filter(engine=engine)
-        if date_from:
-            measurements = measurements.filter(timestamp__date__gte=date_from)
-        if date_to:
-            measurements = measurements.filter(timestamp__date__lte=date_to)
-
-    # Пагинация
-    paginator = Paginator(measurements, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    one_week_ago = timezone.now() - timedelta(days=7)
+    # Выгрузка получает те же фильтры без курсоров листания
+    export_params = request.GET.copy()
+    for key in (AFTER, BEFORE, 'page'):
+        export_params.pop(key, None)
 
     context = {
-        'measurements': measurements,
-        'vessels_count': measurements.values(
-            'engine__vessel'
-        ).distinct().count(),
-        'engines_count': measurements.values('engine').distinct().count(),
-        'last_week_count': measurements.filter(
-            timestamp__gte=one_week_ago
-        ).count(),
+        **stats,
         'filter_form': filter_form,
-        'is_paginated': paginator.num_pages > 1,
+        'is_paginated': page_obj.has_next or page_obj.has_previous,
         'page_obj': page_obj,
+        'export_query': export_params.urlencode(),
     }
+    if page_obj.has_next:
+        context['next_query'] = cursor_query(
+            request.GET, AFTER, page_obj.next_cursor
+        )
+    if page_obj.has_previous:
+        context['previous_query'] = cursor_query(
+            request.GET, BEFORE, page_obj.previous_cursor
+        )
 
     return render(request, 'monitoring/measurement_list.html', context)
 
 
+def measurements_api(request):
+    """
+    API списка замеров в JSON с листанием по курсору.
+
+    Принимает фильтры MeasurementFilterForm, курсоры after/before
+    и размер страницы limit (не более MAX_API_PAGE_SIZE).
+    """
+    filter_form = MeasurementFilterForm(request.GET)
+    if not filter_form.is_valid():
+        return JsonResponse({'errors': filter_form.errors}, status=400)
+
+    try:
+        limit = int(request.GET.get('limit', API_PAGE_SIZE))
+    except ValueError:
+        limit = API_PAGE_SIZE
+    limit = min(max(limit, 1), MAX_API_PAGE_SIZE)
+
+    measurements = filter_measurements(
+        Measurement.objects.select_related('engine__vessel'), filter_form
+    ).prefetch_related(
+        Prefetch(
+            'parameter_values',
+            queryset=ParameterValue.objects.select_related('parameter_type'),
+        )
+    )
+    try:
+        page = get_keyset_page(measurements, request.GET, limit)
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'results': [
+            {
+                'id': measurement.pk,
+                'timestamp': measurement.timestamp.isoformat(),
+                'engine_id': measurement.engine_id,
+                'engine': measurement.engine.name,
+                'vessel_id': measurement.engine.vessel_id,
+                'vessel': measurement.engine.vessel.name,
+                'values': {
+                    value.parameter_type.code: value.value
+                    for value in measurement.parameter_values.all()
+                },
+            }
+            for measurement in page
+        ],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    })
+
+
+def alarms_api(request):
+    """
+    API тревог (monitoring.alarms) от новых к старым с листанием
+    по курсору.
+
+    Принимает фильтры MeasurementFilterForm, код параметра parameter,
+    вид тревоги kind, курсоры after/before и размер страницы limit.
+    """
+    filter_form = MeasurementFilterForm(request.GET)
+    if not filter_form.is_valid():
+        return JsonResponse({'errors': filter_form.errors}, status=400)
+
+    try:
+        limit = int(request.GET.get('limit', API_PAGE_SIZE))
+    except ValueError:
+        limit = API_PAGE_SIZE
+    limit = min(max(limit, 1), MAX_API_PAGE_SIZE)
+
+    registry = get_registry()
+    alarms = Alarm.objects.filter(**form_lookups(filter_form))
+    if request.GET.get('parameter'):
+        parameter_type = registry.parameters_by_code.get(
+            request.GET['parameter']
+        )
+        if parameter_type is None:
+            return JsonResponse({'error': 'Параметр не найден'}, status=400)
+        alarms = alarms.filter(parameter_type=parameter_type)
+    if request.GET.get('kind'):
+        alarms = alarms.filter(kind=request.GET['kind'])
+
+    try:
+        page = get_keyset_page(alarms, request.GET, limit)
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    results = []
+    for alarm in page:
+        engine = registry.engines_by_id[alarm.engine_id]
+        parameter_type = registry.parameters_by_id[alarm.parameter_type_id]
+        results.append({
+            'id': alarm.pk,
+            'timestamp': alarm.timestamp.isoformat(),
+            'engine_id': alarm.engine_id,
+            'engine': engine.name,
+            'vessel_id': engine.vessel_id,
+            'vessel': engine.vessel.name,
+            'parameter': parameter_type.code,
+            'kind': alarm.kind,
+            'kind_display': alarm.get_kind_display(),
+            'value': alarm.value,
+            'score': alarm.score,
+        })
+    return JsonResponse({
+        'results': results,
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    })
+
+
+def export_measurements(request):
+    """
+    Выгрузка замеров с фильтрами MeasurementFilterForm в CSV или XLSX.
+
+    Формат задается параметром format (csv по умолчанию). CSV
+    отдается потоком, память не зависит от объема выгрузки; книга xlsx
+    собирается до отправки, поэтому ее размер ограничен
+    MONITORING_XLSX_EXPORT_MAX_ROWS строками.
+    """
+    filter_form = MeasurementFilterForm(request.GET)
+    if not filter_form.is_valid():
+        return JsonResponse({'errors': filter_form.errors}, status=400)
+
+    export_format = request.GET.get('format', CSV)
+    if export_format not in FORMATS:
+        return JsonResponse(
+            {'error': f'Неизвестный формат: {export_format}'}, status=400
+        )
+
+    filters = form_lookups(filter_form)
+    if export_format == XLSX:
+        max_rows = get_xlsx_max_rows()
+        if export_row_count(filters, max_rows + 1) > max_rows:
+            return JsonResponse({'error': (
+                f'Больше {max_rows} строк для Excel: сузьте период '
+                f'или выгрузите CSV'
+            )}, status=400)
+
+    response = StreamingHttpResponse(
+        export_chunks(export_format, filters),
+        content_type=CONTENT_TYPES[export_format],
+    )
+    filename = timezone.localtime().strftime(
+        f'measurements_%Y%m%d_%H%M.{export_format}'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@csrf_exempt
+@require_POST
+def ingest_api(request):
+    """
+    Прием пачки замеров от регистратора (JSON или NDJSON, см.
+    monitoring.ingest) с авторизацией по токену.
+
+    Тело NDJSON читается потоком. Ответ содержит число сохраненных
+    замеров и значений и ошибки отдельных записей; если тело нельзя
+    дочитать, записи, проверенные до ошибки, уже сохранены.
+    """
+    token = authenticate_token(request)
+    if token is None:
+        return JsonResponse({'error': 'Неверный токен'}, status=401)
+
+    ingestor = MeasurementIngestor(token.user)
+    status = 200
+    error = None
+    try:
+        ingestor.ingest(read_records(
+            request, request.content_type,
+            request.headers.get('Content-Encoding', '').lower(),
+        ))
+    except IngestError as e:
+        status = 400
+        error = str(e)
+
+    result = ingestor.result
+    return JsonResponse({
+        'error': error,
+        'records': result.rows_count,
+        'imported': result.imported_count,
+        'values': result.values_count,
+        'error_count': result.error_count,
+        'errors': result.error_rows,
+        'elapsed': round(result.elapsed, 3),
+    }, status=status)
+
+
+def current_state_api(request):
+    """
+    API текущих показаний двигателей: последнее значение каждого параметра.
+
+    Принимает необязательные фильтры vessel и engine (id).
+    """
+    engine_filters = {}
+    try:
+        if request.GET.get('vessel'):
+            engine_filters['vessel_id'] = int(request.GET['vessel'])
+        if request.GET.get('engine'):
+            engine_filters['pk'] = int(request.GET['engine'])
+    except ValueError:
+        return JsonResponse({'error': 'Неверный идентификатор'}, status=400)
+
+    return JsonResponse({
+        'vessels': [
+            {
+                'id': vessel_state['vessel'].pk,
+                'name': vessel_state['vessel'].name,
+                'imo_number': vessel_state['vessel'].imo_number,
+                'engines': [
+                    {
+                        'id': engine_state['engine'].pk,
+                        'name': engine_state['engine'].name,
+                        'serial_number': engine_state['engine'].serial_number,
+                        'last_timestamp': (
+                            engine_state['last_timestamp'].isoformat()
+                            if engine_state['last_timestamp'] else None
+                        ),
+                        'values': {
+                            latest.parameter_type.code: {
+                                'name': latest.parameter_type.name,
+                                'unit': latest.parameter_type.unit,
+                                'value': latest.value,
+                                'timestamp': latest.timestamp.isoformat(),
+                            }
+                            for latest in engine_state['values']
+                        },
+                    }
+                    for engine_state in vessel_state['engines']
+                ],
+            }
+            for vessel_state in current_state(**engine_filters)
+        ],
+    })
+
+
 def measurement_detail(request, pk):
     """Детальная страница просмотра конкретного замера."""
     measurement = get_object_or_404(
@@ -103,31 +424,15 @@ def measurement_detail(request, pk):
 
 def trends(request):
     """Страница с графиками трендов параметров двигателей."""
-    vessels = Vessel.objects.all()
-    engines = Engine.objects.all()
+    registry = get_registry()
+    vessels = registry.vessels
+    engines = registry.engines
 
     # Фильтрация замеров
-    measurements = Measurement.objects.select_related('engine__vessel')
-
-    # Применяем фильтры
-    filters = {}
-    vessel_id = request.GET.get('vessel')
-    engine_id = request.GET.get('engine')
+    filters = form_lookups(MeasurementFilterForm(request.GET))
     date_from = request.GET.get('date_from')
     date_to = request.GET.get('date_to')
-
-    if vessel_id:
-        measurements = measurements.filter(engine__vessel_id=vessel_id)
-        filters['vessel_id'] = vessel_id
-    if engine_id:
-        measurements = measurements.filter(engine_id=engine_id)
-        filters['engine_id'] = engine_id
-    if date_from:
-        measurements = measurements.filter(timestamp__date__gte=date_from)
-        filters['date_from'] = date_from
-    if date_to:
-        measurements = measurements.filter(timestamp__date__lte=date_to)
-        filters['date_to'] = date_to
+    measurements = Measurement.objects.filter(**filters)
 
     # Эффективный поиск параметров с данными
     # Подзапрос для проверки наличия данных
@@ -136,31 +441,44 @@ def trends(request):
         measurement__in=measurements
     )
 
-    # Получаем параметры которые активны И имеют данные в выбранных замерах
-    parameters_with_data = ParameterType.objects.filter(
-        is_active=True
-    ).annotate(has_data=Exists(has_data_subquery)).filter(has_data=True)
+    # Активные параметры с данными в выбранных замерах - один запрос id,
+    # сами параметры берутся из справочника
+    ids_with_data = set(ParameterType.objects.filter(
+        Exists(has_data_subquery), is_active=True
+    ).values_list('pk', flat=True))
+    parameters_with_data = [
+        param for param in registry.active_parameters
+        if param.pk in ids_with_data
+    ]
 
     # Если после фильтрации нет параметров, показываем все активные
-    if not parameters_with_data.exists():
-        parameters_with_data = ParameterType.objects.filter(is_active=True)
+    if not parameters_with_data:
+        parameters_with_data = registry.active_parameters
 
-    # Получаем выбранный параметр
-    selected_parameter = None
+    # Получаем выбранный параметр; неизвестный код - первый из списка
     parameter_code = request.GET.get('parameter')
-
-    if parameter_code:
-        try:
-            selected_parameter = parameters_with_data.get(code=parameter_code)
-        except ParameterType.DoesNotExist:
-            selected_parameter = parameters_with_data.first()
-    else:
-        selected_parameter = parameters_with_data.first()
+    selected_parameter = next(
+        (param for param in parameters_with_data
+         if param.code == parameter_code),
+        parameters_with_data[0] if parameters_with_data else None,
+    )
 
     # Подготовка данных для графиков
     chart_data = {}
     if selected_parameter:
-        chart_data = prepare_chart_data(measurements, selected_parameter)
+        max_points, method = get_downsampling_params(request.GET)
+        chart_data = cached_chart_data(
+            selected_parameter, filters, max_points, method
+        )
+
+    # Живое обновление - для сырого ряда одного двигателя без конца периода
+    live_url = ''
+    if (chart_data.get('resolution') == RAW and 'engine_id' in filters
+            and 'timestamp__lt' not in filters):
+        live_url = reverse('monitoring:live_trends') + '?' + urlencode({
+            'engine': filters['engine_id'],
+            'parameter': selected_parameter.code,
+        })
 
     context = {
         'vessels': vessels,
@@ -169,52 +487,17 @@ def trends(request):
         'selected_parameter': selected_parameter,
         'measurements_count': measurements.count(),
         'date_range': get_date_range_display(date_from, date_to),
-        'vessels_count': vessels.count(),
-        'engines_count': engines.count(),
+        'vessels_count': len(vessels),
+        'engines_count': len(engines),
         'chart_data_json': json.dumps(chart_data),
-        'parameters_with_data_count': parameters_with_data.count(),
-        'all_parameters_count': ParameterType.objects.filter(
-            is_active=True
-        ).count(),
+        'live_url': live_url,
+        'chart_points_count': chart_data.get('stats', {}).get('count', 0),
+        'parameters_with_data_count': len(parameters_with_data),
+        'all_parameters_count': len(registry.active_parameters),
     }
     return render(request, 'monitoring/trends.html', context)
 
 
-def prepare_chart_data(measurements, parameter_type):
-    """
-    Подготовка данных для построения графиков.
-
-    Args:
-        measurements: QuerySet замеров
-        parameter_type: Тип параметра для отображения
-
-    Returns:
-        dict: Данные для графика
-    """
-    # Сортируем по времени
-    measurements = measurements.order_by('timestamp')
-
-    # Собираем значения для выбранного параметра
-    labels = []
-    values = []
-
-    for measurement in measurements:
-        # Ищем значение параметра для этого замера
-        param_value = measurement.parameter_values.filter(
-            parameter_type=parameter_type
-        ).first()
-        if param_value:
-            labels.append(measurement.timestamp.strftime('%d.%m.%Y %H:%M'))
-            values.append(float(param_value.value))
-
-    return {
-        'labels': labels,
-        'values': values,
-        'parameter_name': parameter_type.name,
-        'parameter_unit': parameter_type.unit,
-    }
-
-
 def get_date_range_display(date_from, date_to):
     """Форматирование периода для отображения в интерфейсе."""
     if date_from and date_to:
@@ -226,56 +509,151 @@ def get_date_range_display(date_from, date_to):
     return "Весь период"
 
 
+def get_downsampling_params(params):
+    """
+    Число точек и алгоритм прореживания графика из GET-параметров.
+
+    Число точек ограничивается диапазоном [MIN_POINTS, MAX_POINTS_LIMIT]:
+    ни малое, ни большое значение не отключает прореживание.
+    """
+    try:
+        max_points = int(params.get('max_points', DEFAULT_MAX_POINTS))
+    except (TypeError, ValueError):
+        max_points = DEFAULT_MAX_POINTS
+    max_points = min(max(max_points, MIN_POINTS), MAX_POINTS_LIMIT)
+
+    # По умолчанию min/max: гарантирует видимость всех выбросов
+    method = params.get('downsample', MINMAX)
+    if method not in METHODS:
+        method = MINMAX
+    return max_points, method
+
+
 def chart_data_api(request):
     """API endpoint для получения данных графиков в JSON формате."""
-    vessel_id = request.GET.get('vessel')
-    engine_id = request.GET.get('engine')
     parameter_code = request.GET.get('parameter', 'temperature')
-    days = int(request.GET.get('days', 30))
-
-    measurements = Measurement.objects.select_related(
-        'engine__vessel'
-    ).prefetch_related('parameter_values__parameter_type')
+    # Id - числами: по ним ищутся двигатели в справочниках (архив, сжатие)
+    try:
+        vessel_id = int(request.GET.get('vessel') or 0)
+        engine_id = int(request.GET.get('engine') or 0)
+        days = int(request.GET.get('days', 30))
+    except (OverflowError, ValueError):
+        return JsonResponse({'error': 'Неверные параметры запроса'},
+                            status=400)
+    days = min(max(days, 1), MAX_CHART_DAYS)
 
+    filters = {}
     if vessel_id:
-        measurements = measurements.filter(engine__vessel_id=vessel_id)
+        filters['engine__vessel_id'] = vessel_id
     if engine_id:
-        measurements = measurements.filter(engine_id=engine_id)
-
-    date_from = datetime.now() - timedelta(days=days)
-    measurements = measurements.filter(timestamp__gte=date_from)
+        filters['engine_id'] = engine_id
+    # Начало периода с точностью до минуты: одинаковые запросы в течение
+    # минуты получают один и тот же ключ кэша
+    since = timezone.now().replace(second=0, microsecond=0)
+    filters['timestamp__gte'] = since - timedelta(days=days)
 
     # Получаем параметр
-    parameter_type = get_object_or_404(ParameterType, code=parameter_code)
+    parameter_type = get_registry().parameters_by_code.get(parameter_code)
+    if parameter_type is None:
+        raise Http404('Параметр не найден')
 
-    chart_data = prepare_chart_data(measurements, parameter_type)
+    max_points, method = get_downsampling_params(request.GET)
+    chart_data = cached_chart_data(parameter_type, filters, max_points, method)
 
     return JsonResponse(chart_data)
 
 
+def overlay_api(request):
+    """
+    API наложенных рядов: несколько параметров разных двигателей.
+
+    Ряды задаются повторяющимся параметром series=<id двигателя>:<код>,
+    период - date_from и date_to. С параметром step (секунды) ряды
+    выравниваются по общей сетке, см. monitoring.overlay.
+    """
+    filter_form = MeasurementFilterForm(request.GET)
+    if not filter_form.is_valid():
+        return JsonResponse({'errors': filter_form.errors}, status=400)
+    # Двигатель задается в каждом ряду, из формы берется только период
+    period = {
+        key: value for key, value in form_lookups(filter_form).items()
+        if key.startswith('timestamp__')
+    }
+
+    step = None
+    if request.GET.get('step'):
+        try:
+            step = timedelta(seconds=int(request.GET['step']))
+        except (OverflowError, ValueError):
+            return JsonResponse({'error': 'Неверный шаг сетки'}, status=400)
+
+    max_points, method = get_downsampling_params(request.GET)
+    try:
+        data = build_overlay(
+            parse_series(request.GET.getlist('series')), period, step,
+            max_points, method,
+        )
+    except OverlayError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(data)
+
+
+async def live_trends(request):
+    """
+    Поток server-sent events с новыми значениями параметра двигателя
+    (engine - id, parameter - код) для живого графика трендов.
+
+    Доступен только под ASGI-сервером: под WSGI каждый открытый поток
+    занимал бы рабочий поток сервера.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': 'Живое обновление доступно только под ASGI-сервером'},
+            status=501,
+        )
+    registry = await sync_to_async(get_registry)()
+    try:
+        engine = registry.engines_by_id[int(request.GET.get('engine', ''))]
+    except (KeyError, ValueError):
+        raise Http404('Двигатель не найден')
+    parameter_type = registry.parameters_by_code.get(
+        request.GET.get('parameter')
+    )
+    if parameter_type is None:
+        raise Http404('Параметр не найден')
+
+    response = StreamingHttpResponse(
+        event_stream(engine.pk, parameter_type.pk),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Без буферизации в nginx события доходят сразу
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def create_measurement(request):
     """Создание нового замера с динамическими параметрами."""
     if request.method == 'POST':
         form = MeasurementWithParametersForm(request.POST)
         if form.is_valid():
-            measurement = form.save(commit=False)
-            measurement.created_by = request.user
-            measurement.save()
-
-            # Сохраняем значения параметров
-            active_parameters = ParameterType.objects.filter(is_active=True)
-            for param in active_parameters:
-                field_name = f'param_{param.code}'
-                value = form.cleaned_data.get(field_name)
-                if value is not None:  # сохраняем только если значение указано
-                    ParameterValue.objects.create(
-                        measurement=measurement,
-                        parameter_type=param,
-                        value=value,
-                    )
-
-            return redirect('monitoring:measurement_detail', pk=measurement.pk)
+            # Проверка диапазонов и запись одной транзакцией
+            try:
+                measurement = record_measurement(
+                    form.cleaned_data['engine'],
+                    form.cleaned_data['timestamp'],
+                    form.parameter_values(),
+                    user=request.user,
+                    notes=form.cleaned_data['notes'],
+                )
+            except ValidationError as e:
+                for code, errors in e.message_dict.items():
+                    form.add_error(f'param_{code}', errors)
+            else:
+                return redirect(
+                    'monitoring:measurement_detail', pk=measurement.pk
+                )
     else:
         form = MeasurementWithParametersForm()
 
@@ -285,241 +663,132 @@ def create_measurement(request):
 
 @login_required
 def import_csv(request):
-    """Импорт данных замеров из CSV файла - умная версия."""
-    parameter_types = ParameterType.objects.filter(is_active=True)
+    """
+    Импорт данных замеров из CSV файла.
+
+    Файл сохраняется в задачу ImportJob и обрабатывается вне запроса,
+    страница опрашивает статус задачи через import_job_status.
+    """
+    parameter_types = get_registry().active_parameters
     import_errors = []
+    created_parameters = []
+    job = None
 
     if request.method == 'POST':
-        form = CSVImportForm(request.POST, request.FILES)
+        form = CSVImportForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
-            csv_file = form.cleaned_data['csv_file']
-            vessel = form.cleaned_data['vessel']
-            engine = form.cleaned_data['engine']
-            timestamp_format = form.cleaned_data['timestamp_format']
-            delimiter = form.cleaned_data['delimiter']
-
-            try:
-                # Читаем CSV файл
-                csv_reader = TextIOWrapper(csv_file.file, encoding='utf-8')
-                reader = csv.DictReader(csv_reader, delimiter=delimiter)
-
-                imported_count = 0
-                error_rows = []
-                created_parameters = []  # Для отслеживания параметров
-
-                # Получаем все активные параметры для маппинга
-                parameter_mapping = {}
-                for param in parameter_types:
-                    parameter_mapping[param.code.lower()] = param
-                    parameter_mapping[param.name.lower()] = param
-
-                for row_num, row in enumerate(reader, start=2):
-                    try:
-                        # Ищем колонку с временем
-                        timestamp_str = None
-                        time_keys = [
-                            'timestamp', 'time', 'время', 'дата', 'date']
-
-                        for key in time_keys:
-                            if key in row and row.get(key):
-                                timestamp_str = row[key]
-                                break
-
-                        if not timestamp_str:
-                            error_rows.append(
-                                f"Строка {row_num}: Не найдена колонка времени"
-                            )
-                            continue
-
-                        # Парсим время
-                        timestamp = datetime.strptime(
-                            timestamp_str.strip(), timestamp_format
-                        )
-
-                        # Создаем замер
-                        measurement = Measurement(
-                            engine=engine,
-                            timestamp=timestamp,
-                            created_by=request.user,
-                        )
-                        measurement.save()
-
-                        # Обрабатываем все остальные колонки как параметры
-                        param_count = 0
-                        for header, value in row.items():
-                            # Пропускаем колонки с временем и пустые значения
-                            header_lower = header.lower().strip()
-                            if (
-                                header_lower in time_keys or
-                                not value or
-                                not str(value).strip() or
-                                str(value).strip().lower() in [
-                                    'null', 'none', '']
-                            ):
-                                continue
-
-                            value_str = str(value).strip()
-
-                            # Ищем соответствующий параметр
-                            param_type = None
-
-                            if header_lower in parameter_mapping:
-                                param_type = parameter_mapping[header_lower]
-                            else:
-                                # Определяем тип параметра по данным
-                                data_type = 'text'  # по умолчанию текст
-                                unit = ''
-
-                                # Пробуем определить числовой параметр
-                                try:
-                                    float(value_str.replace(',', '.'))
-                                    data_type = 'number'
-                                    # Пытаемся угадать единицы измерения
-                                    if any(word in header_lower for word in [
-                                        'temp', 'temperature', 'темп'
-                                    ]):
-                                        unit = '°C'
-                                    elif any(word in header_lower for word in [
-                                        'press', 'pressure', 'давлен'
-                                    ]):
-                                        unit = 'бар'
-                                    elif any(word in header_lower for word in [
-                                        'rpm', 'оборот', 'speed'
-                                    ]):
-                                        unit = 'об/мин'
-                                    elif any(word in header_lower for word in [
-                                        'fuel', 'топлив'
-                                    ]):
-                                        unit = 'л/ч'
-                                except ValueError:
-                                    data_type = 'text'
-
-                                # Создаем новый параметр
-                                param_type, created = (
-                                    ParameterType.objects.get_or_create(
-                                        name=header.title(),
-                                        code=header_lower.replace(
-                                            ' ', '_'
-                                        ).replace('-', '_'),
-                                        defaults={
-                                            'unit': unit,
-                                            'description': (
-                                                f'Авто-создание из импорта. '
-                                                f'Тип: {data_type}'
-                                            ),
-                                            'is_active': True,
-                                        }
-                                    )
-                                )
-                                parameter_mapping[header_lower] = param_type
-                                if created:
-                                    created_parameters.append(param_type)
-
-                            # Сохраняем значение в зависимости от типа
-                            try:
-                                if param_type.unit:
-                                    # Если есть единицы измерения - число
-                                    clean_value = value_str.replace(
-                                        ',', '.').strip()
-                                    param_value = float(clean_value)
-                                else:
-                                    # Пробуем число, если не получается - текст
-                                    try:
-                                        clean_value = value_str.replace(
-                                            ',', '.').strip()
-                                        param_value = float(clean_value)
-                                        # Если получилось, но без единиц
-                                        if not param_type.unit:
-                                            param_type.unit = 'ед.'
-                                            param_type.save()
-                                    except ValueError:
-                                        # Сохраняем как текст (пропускаем)
-                                        error_rows.append(
-                                            f"Строка {row_num}: Текст "
-                                            f"'{value_str}' для '{header}'"
-                                        )
-                                        continue
-
-                                ParameterValue.objects.create(
-                                    measurement=measurement,
-                                    parameter_type=param_type,
-                                    value=param_value,
-                                )
-                                param_count += 1
-
-                            except ValueError:
-                                error_rows.append(
-                                    f"Строка {row_num}: Неверное значение "
-                                    f"'{value_str}' для параметра '{header}'"
-                                )
-
-                        if param_count > 0:
-                            imported_count += 1
-
-                    except ValueError as e:
-                        error_rows.append(
-                            f"Строка {row_num}: Неправильный формат - {str(e)}"
-                        )
-                    except Exception as e:  # pylint: disable=broad-except
-                        error_rows.append(
-                            f"Строка {row_num}: Неожиданная ошибка - {str(e)}"
-                        )
-
-                # Итоговое сообщение
-                if imported_count > 0:
-                    messages.success(
-                        request,
-                        f'✅ Успешно импортировано {imported_count} замеров!'
-                    )
-                    if created_parameters:
-                        messages.info(
-                            request,
-                            f'📊 Создано новых параметров: {
-                                len(created_parameters)}'
-                        )
-                else:
-                    messages.error(
-                        request,
-                        '❌ Не удалось импортировать ни одного замера'
-                    )
-
-                if error_rows:
-                    messages.warning(
-                        request,
-                        f'⚠️ Найдено ошибок: {len(error_rows)}'
-                    )
-                    import_errors = error_rows[:10]
-
-                    return render(request, 'monitoring/import_csv.html', {
-                        'form': form,
-                        'import_errors': import_errors,
-                        'parameter_types': parameter_types,
-                        'created_parameters': created_parameters,
-                    })
-
-                return redirect('monitoring:measurement_list')
-
-            except (csv.Error, UnicodeDecodeError) as e:
-                messages.error(
-                    request, f'❌ Ошибка чтения CSV файла: {str(e)}'
-                )
-                return render(request, 'monitoring/import_csv.html', {
-                    'form': form,
-                    'import_errors': [f'Ошибка файла: {str(e)}'],
-                    'parameter_types': parameter_types,
-                })
-        else:
-            messages.error(request, '❌ Исправьте ошибки в форме')
+            job = ImportJob(
+                engine=form.cleaned_data['engine'],
+                created_by=request.user,
+                timestamp_format=form.cleaned_data['timestamp_format'],
+                delimiter=form.cleaned_data['delimiter'],
+            )
+            upload = form.cleaned_data['upload_id']
+            if upload is not None:
+                # Файл уже на диске - задача просто ссылается на него
+                job.file.name = upload.file.name
+                job.original_name = upload.filename
+                job.total_bytes = upload.total_bytes
+                job.save()
+                upload.delete()
+            else:
+                csv_file = form.cleaned_data['csv_file']
+                job.file = csv_file
+                job.original_name = csv_file.name
+                job.total_bytes = csv_file.size
+                job.save()
+            enqueue_import_job(job)
+
+            messages.info(
+                request,
+                f'⏳ Файл {job.original_name} поставлен в очередь импорта'
+            )
+            return redirect(
+                f"{reverse('monitoring:import_csv')}?job={job.pk}"
+            )
+        messages.error(request, '❌ Исправьте ошибки в форме')
     else:
         form = CSVImportForm()
+        job_id = request.GET.get('job', '')
+        if job_id.isdigit():
+            job = ImportJob.objects.filter(
+                pk=job_id, created_by=request.user
+            ).first()
+
+    if job is not None and job.is_finished:
+        import_errors = job.errors[:10]
+        if job.message:
+            import_errors = [job.message] + import_errors
+        created_parameters = job.created_parameters
 
     return render(request, 'monitoring/import_csv.html', {
         'form': form,
         'import_errors': import_errors,
         'parameter_types': parameter_types,
+        'created_parameters': created_parameters,
+        'job': job,
     })
 
 
+@login_required
+@require_POST
+def upload_start(request):
+    """Начало загрузки файла импорта частями."""
+    form = ChunkedUploadForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+
+    upload = start_upload(
+        request.user,
+        form.cleaned_data['filename'],
+        form.cleaned_data['size'],
+    )
+    return JsonResponse(_upload_state(upload), status=201)
+
+
+@login_required
+@require_http_methods(["GET", "PUT"])
+def upload_detail(request, pk):
+    """
+    Состояние загрузки (GET) и прием очередной части файла (PUT).
+
+    Смещение части передается параметром offset, тело запроса
+    записывается на диск потоком.
+    """
+    upload = get_object_or_404(ChunkedUpload, pk=pk, created_by=request.user)
+
+    if request.method == 'PUT':
+        try:
+            offset = int(request.GET.get('offset', ''))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+            append_chunk(upload, request, offset, length)
+        except ValueError:
+            return JsonResponse(
+                _upload_state(upload, error='Неверное смещение части файла'),
+                status=400,
+            )
+        except UploadError as e:
+            return JsonResponse(_upload_state(upload, error=str(e)), status=409)
+
+    return JsonResponse(_upload_state(upload))
+
+
+def _upload_state(upload, **extra):
+    """Состояние загрузки частями вместе с размером части для клиента."""
+    return {
+        **upload.as_status_dict(),
+        'chunk_size': get_chunk_size(),
+        **extra,
+    }
+
+
+@login_required
+def import_job_status(request, pk):
+    """JSON со статусом задачи импорта для опроса со страницы импорта."""
+    job = get_object_or_404(ImportJob, pk=pk, created_by=request.user)
+    return JsonResponse(job.as_status_dict())
+
+
 @login_required
 def download_csv_template(request):
     """Генерация и скачивание шаблона CSV файла для импорта."""
@@ -533,8 +802,7 @@ def download_csv_template(request):
 
     # Заголовки колонок
     headers = ['timestamp']
-    active_parameters = ParameterType.objects.filter(is_active=True)
-    for param in active_parameters:
+    for param in get_registry().active_parameters:
         headers.append(param.code)
 
     writer.writerow(headers)
@@ -547,39 +815,19 @@ def download_csv_template(request):
     return response
 
 
-def vessel_engine_stats(_request):
-    """Страница статистики по судам и двигателям."""
-    vessels = Vessel.objects.prefetch_related(
-        'engines__measurements__parameter_values__parameter_type'
-    )
-
-    stats = []
-    for vessel in vessels:
-        vessel_stats = {
-            'vessel': vessel,
-            'engines_count': vessel.engines.count(),
-            'measurements_count': Measurement.objects.filter(
-                engine__vessel=vessel
-            ).count(),
-            'engines': [],
-        }
-
-        for engine in vessel.engines.all():
-            engine_measurements = engine.measurements.all()
-            last_measurement = engine_measurements.order_by(
-                '-timestamp').first()
-
-            engine_stats = {
-                'engine': engine,
-                'measurements_count': engine_measurements.count(),
-                'last_measurement': last_measurement,
-            }
-            vessel_stats['engines'].append(engine_stats)
-
-        stats.append(vessel_stats)
+def vessel_engine_stats(request):
+    """
+    Страница статистики по судам и двигателям.
 
-    return render(_request, 'monitoring/vessel_engine_stats.html', {
-        'stats': stats,
+    Период задается полями date_from и date_to MeasurementFilterForm.
+    """
+    filter_form = MeasurementFilterForm(request.GET)
+    filters = form_lookups(filter_form)
+    return render(request, 'monitoring/vessel_engine_stats.html', {
+        'stats': fleet_stats(
+            filters.get('timestamp__gte'), filters.get('timestamp__lt')
+        ),
+        'filter_form': filter_form,
     })
 
 
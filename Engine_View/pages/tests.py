@@ -1,3 +1,57 @@
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
 
-# Create your tests here.
+from monitoring.models import (
+    Engine,
+    Measurement,
+    ParameterType,
+    ParameterValue,
+    Vessel,
+)
+
+
+class HomeViewTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        parameter = ParameterType.objects.create(
+            name="Температура", code="temperature", unit="°C"
+        )
+        self.timestamp = timezone.now().replace(microsecond=0)
+        for number in range(20):
+            vessel = Vessel.objects.create(
+                name=f"Vessel {number}", imo_number=f"IMO{number:07d}"
+            )
+            engine = Engine.objects.create(
+                vessel=vessel, name="ME", model="X",
+                serial_number=f"SN{number}",
+            )
+            measurement = Measurement.objects.create(
+                engine=engine, timestamp=self.timestamp
+            )
+            ParameterValue.objects.create(
+                measurement=measurement, parameter_type=parameter, value=80.0
+            )
+
+    def test_home_query_count_independent_of_fleet(self):
+        # Суда с последним замером и сводка флота (три счетчика)
+        with self.assertNumQueries(4):
+            response = self.client.get('/')
+        self.assertEqual(response.context['vessels_count'], 20)
+        self.assertEqual(response.context['measurements_count'], 20)
+        self.assertEqual(
+            response.context['vessels'][0].last_measurement_at, self.timestamp
+        )
+
+        # Сводка берется из кэша
+        with self.assertNumQueries(1):
+            self.client.get('/')
+
+    def test_summary_invalidated_on_write(self):
+        self.client.get('/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Measurement.objects.create(
+                engine=Engine.objects.first(), timestamp=timezone.now()
+            )
+        response = self.client.get('/')
+        self.assertEqual(response.context['measurements_count'], 21)
@@ -2,32 +2,24 @@
 from django.views.decorators.http import require_http_methods
 from django.shortcuts import render, redirect
 from django.contrib.auth import logout
+from django.db.models import Count, Max
 
-from monitoring.models import Vessel, Engine, Measurement
+from monitoring.models import Vessel
+from monitoring.stats import fleet_summary
 
 
 def home_view(request):
     """Главная страница"""
-    vessels = Vessel.objects.prefetch_related('engines').all()
-    engines_count = Engine.objects.count()
-    measurements_count = Measurement.objects.count()
-
-    # Получаем дату последнего замера
-    last_measurement = Measurement.objects.order_by('-timestamp').first()
-    last_measurement_date = last_measurement.timestamp if last_measurement else None
-
-    # Добавляем последний замер для каждого судна
-    for vessel in vessels:
-        vessel.last_measurement = Measurement.objects.filter(
-            engine__vessel=vessel
-        ).order_by('-timestamp').first()
+    # Время последнего замера судна - по текущим значениям двигателей,
+    # без просмотра истории замеров
+    vessels = Vessel.objects.annotate(
+        engines_count=Count('engines', distinct=True),
+        last_measurement_at=Max('engines__latest_values__timestamp'),
+    )
 
     context = {
         'vessels': vessels,
-        'vessels_count': vessels.count(),
-        'engines_count': engines_count,
-        'measurements_count': measurements_count,
-        'last_measurement_date': last_measurement_date,
+        **fleet_summary(),
     }
 
     return render(request, 'pages/home.html', context)